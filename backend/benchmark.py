@@ -0,0 +1,217 @@
+# repeatable API benchmark; results are written as JSON so runs can be compared between commits
+#
+#   python generate_data.py --incidents 1000000          # once, to have data worth measuring
+#   python benchmark.py                                   # in-process through the Flask test client
+#   python benchmark.py --url http://localhost:5000 -c 8  # against a running server
+#   python benchmark.py --compare bench-results/<earlier>.json
+#
+# Each scenario runs --requests times after --warmup untimed requests. POST scenarios
+# write real incidents, so run them against a scratch database.
+
+import argparse
+import json
+import os
+import subprocess
+import threading
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime, timezone
+
+SCENARIOS = {
+    "honeypots_list": ("GET", "/HoneyPots/", None),
+    "incidents_first_page": ("GET", "/IncidentLogs/?limit=500", None),
+    "incidents_next_pages": ("GET", "/IncidentLogs/?limit=500&cursor={cursor}", None),
+    "incidents_by_honeypot": ("GET", "/IncidentLogs/?limit=100&honeypot_id={honeypot_id}", None),
+    "incidents_by_severity": ("GET", "/IncidentLogs/?limit=100&severity=critical", None),
+    "incidents_delta": ("GET", "/IncidentLogs/?since_id={since_id}", None),
+    "analytics_counts": ("GET", "/analytics/counts?dimension=family", None),
+    "analytics_timeseries": ("GET", "/analytics/timeseries?resolution=1h", None),
+    "incident_post": ("POST", "/IncidentLogs/", "single"),
+    "incident_bulk_post_500": ("POST", "/IncidentLogs/bulk", "bulk"),
+}
+READ_ONLY = [name for name, (method, _, _) in SCENARIOS.items() if method == "GET"]
+
+
+def alert(i):
+    return {
+        "title": "Benchmark connection",
+        "honeypot_id": 1,
+        "severity": "low",
+        "severity_number": 3,
+        "source": {"ip": f"203.0.113.{i % 250 + 1}", "port": 40000 + i % 20000},
+        "destination": {"ip": "192.0.2.1", "port": 22},
+        "network": {"bytes": 32},
+        "ssh": {"client": {"ident": "SSH-2.0-Go"}},
+        "classification": {"family": "Go", "reason": "ssh_ident"},
+        "rate": {"count_last_min": 1, "rate_limited": False},
+    }
+
+
+class TestClientTransport:
+    """Requests through the Flask test client: no network, measures the app itself."""
+
+    def __init__(self):
+        from main import app
+        self.app = app
+        self._local = threading.local()
+
+    def request(self, method, path, body=None):
+        client = getattr(self._local, "client", None)
+        if client is None:
+            client = self._local.client = self.app.test_client()
+        response = client.open(path, method=method, json=body)
+        return response.status_code, response.headers, response.get_data()
+
+
+class HTTPTransport:
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+
+    def request(self, method, path, body=None):
+        data = json.dumps(body).encode() if body is not None else None
+        req = urllib.request.Request(self.url + path, data=data, method=method,
+                                     headers={"Content-Type": "application/json"} if data else {})
+        try:
+            with urllib.request.urlopen(req, timeout=60) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def discover(transport):
+    """Parameters for the scenarios taken from the data itself."""
+    status, headers, body = transport.request("GET", "/IncidentLogs/?limit=500")
+    page = json.loads(body) if status == 200 else []
+    honeypot_id = page[0]["honeypot_id"] if page and page[0].get("honeypot_id") else 1
+    since_id = max((item["id"] for item in page), default=0) - 100
+    return {"cursor": headers.get("X-Next-Cursor", ""), "honeypot_id": honeypot_id, "since_id": max(since_id, 0)}
+
+
+def run_scenario(transport, name, params, requests, warmup, concurrency):
+    method, path, body_kind = SCENARIOS[name]
+    latencies = []
+    errors = 0
+    statuses = {}
+    lock = threading.Lock()
+    counter = iter(range(warmup + requests))
+
+    def worker():
+        nonlocal errors
+        cursor = params["cursor"]
+        while True:
+            with lock:
+                i = next(counter, None)
+            if i is None:
+                return
+            if body_kind == "single":
+                body = alert(i)
+            elif body_kind == "bulk":
+                body = [alert(i * 500 + j) for j in range(500)]
+            else:
+                body = None
+            target = path.format(**{**params, "cursor": cursor})
+            started = time.perf_counter()
+            status, headers, _ = transport.request(method, target, body)
+            elapsed = (time.perf_counter() - started) * 1000.0
+            if name == "incidents_next_pages":
+                # walk the pages; start over at the end of the log
+                cursor = headers.get("X-Next-Cursor") or params["cursor"]
+            if i < warmup:
+                continue
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+                if status >= 400:
+                    errors += 1
+
+    started = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    wall = time.perf_counter() - started
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": {str(k): v for k, v in sorted(statuses.items())},
+        "throughput_rps": round(len(latencies) / wall, 1) if wall else None,
+        "latency_ms": {p: round(percentile(latencies, n), 2) if latencies else None
+                       for p, n in (("p50", 50), ("p90", 90), ("p99", 99), ("max", 100))},
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def compare(current, previous_path):
+    with open(previous_path) as f:
+        previous = json.load(f)
+    print(f"\ncompared with {previous_path} ({previous.get('commit')}):")
+    for name, result in current["scenarios"].items():
+        before = previous.get("scenarios", {}).get(name)
+        if not before or not before["latency_ms"]["p50"] or not result["latency_ms"]["p50"]:
+            continue
+        p50 = result["latency_ms"]["p50"] / before["latency_ms"]["p50"] - 1
+        p99 = result["latency_ms"]["p99"] / before["latency_ms"]["p99"] - 1
+        print(f"  {name:26} p50 {p50:+7.1%}  p99 {p99:+7.1%}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the backend API")
+    parser.add_argument("--url", help="benchmark a running server instead of the in-process test client")
+    parser.add_argument("-n", "--requests", type=int, default=200, help="timed requests per scenario")
+    parser.add_argument("--warmup", type=int, default=10)
+    parser.add_argument("-c", "--concurrency", type=int, default=1, help="client threads")
+    parser.add_argument("-s", "--scenario", action="append", choices=sorted(SCENARIOS),
+                        help="run only these scenarios (repeatable)")
+    parser.add_argument("--read-only", action="store_true", help="skip the POST scenarios")
+    parser.add_argument("-o", "--output", help="result file (default bench-results/<time>-<commit>.json)")
+    parser.add_argument("--compare", help="print the change against an earlier result file")
+    args = parser.parse_args()
+
+    transport = HTTPTransport(args.url) if args.url else TestClientTransport()
+    names = args.scenario or (READ_ONLY if args.read_only else list(SCENARIOS))
+    params = discover(transport)
+    commit = git_commit()
+    results = {
+        "commit": commit,
+        "started_at": datetime.now(timezone.utc).isoformat(),
+        "target": args.url or "flask-test-client",
+        "database": os.getenv("DATABASE_URL", "sqlite:///mydatabase.db").split("@")[-1],
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "scenarios": {},
+    }
+    for name in names:
+        result = run_scenario(transport, name, params, args.requests, args.warmup, args.concurrency)
+        results["scenarios"][name] = result
+        latency = result["latency_ms"]
+        print(f"{name:26} {result['throughput_rps']:>9} req/s  p50 {latency['p50']:>8} ms  "
+              f"p99 {latency['p99']:>8} ms  errors {result['errors']}")
+
+    output = args.output or os.path.join(
+        "bench-results", f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{commit}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w") as f:
+        json.dump(results, f, indent=2)
+    print(f"results written to {output}")
+    if args.compare:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
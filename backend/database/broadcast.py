@@ -0,0 +1,74 @@
+"""
+In-process fan-out of freshly committed rows to live subscribers (server-sent events).
+
+Every subscriber gets a bounded buffer. publish never blocks: a subscriber whose
+buffer is full is dropped, its stream ends and the client reconnects with
+Last-Event-ID to catch up from the database.
+"""
+import queue
+import threading
+
+
+class Subscription:
+    def __init__(self, buffer_size):
+        self.queue = queue.Queue(maxsize=buffer_size)
+        self.dropped = False
+
+
+class Broadcaster:
+    def __init__(self, buffer_size=1024):
+        self.buffer_size = buffer_size
+        self._subscribers = set()
+        self._lock = threading.Lock()
+
+    def subscribe(self):
+        subscription = Subscription(self.buffer_size)
+        with self._lock:
+            self._subscribers.add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            self._subscribers.discard(subscription)
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def publish(self, messages):
+        """Hands each (event_id, frame) pair to every subscriber; slow subscribers are dropped."""
+        if not self._subscribers or not messages:
+            return
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for subscription in subscribers:
+            try:
+                for message in messages:
+                    subscription.queue.put_nowait(message)
+            except queue.Full:
+                subscription.dropped = True
+                self.unsubscribe(subscription)
+
+    def stream(self, subscription, backlog=(), heartbeat=15.0):
+        """
+        Generator of SSE frames: the backlog first, then live messages not already covered by it.
+        A comment line is sent every heartbeat seconds so dead connections are noticed.
+        """
+        last_id = 0
+        try:
+            for event_id, frame in backlog:
+                last_id = event_id
+                yield frame
+            while not subscription.dropped:
+                try:
+                    event_id, frame = subscription.queue.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+                    continue
+                if event_id > last_id:
+                    yield frame
+        finally:
+            self.unsubscribe(subscription)
+
+
+def sse_frame(event, event_id, data):
+    return f"id: {event_id}\nevent: {event}\ndata: {data}\n\n"
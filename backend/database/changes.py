@@ -0,0 +1,79 @@
+"""
+Per-table change counters, bumped whenever a commit touches a table.
+
+List endpoints derive their ETag from the counter, so a poll that finds nothing
+new is answered with 304 before any query runs. Counters live in this process:
+run a single worker (see the dockerfile) or every worker must see every write.
+"""
+import threading
+import uuid
+import zlib
+from functools import wraps
+
+from flask import Response, request
+from flask_restx.utils import unpack
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+_boot_id = uuid.uuid4().hex[:8]
+_versions = {}
+_lock = threading.Lock()
+
+
+@event.listens_for(Session, "after_flush")
+def _collect_changed_tables(session, flush_context):
+    changed = session.info.setdefault("changed_tables", set())
+    for obj in (*session.new, *session.dirty, *session.deleted):
+        table = getattr(obj, "__table__", None)
+        if table is not None:
+            changed.add(table.name)
+
+
+@event.listens_for(Session, "after_commit")
+def _bump_versions(session):
+    changed = session.info.pop("changed_tables", None)
+    if not changed:
+        return
+    with _lock:
+        for table in changed:
+            _versions[table] = _versions.get(table, 0) + 1
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_changes(session):
+    session.info.pop("changed_tables", None)
+
+
+def mark_changed(session, table):
+    """For writes the ORM does not see (Core statements): bumps table's counter when session commits."""
+    session.info.setdefault("changed_tables", set()).add(table)
+
+
+def version(table):
+    return _versions.get(table, 0)
+
+
+def etag_for(table):
+    """ETag for the current request's view of table: changes with the data and the query string."""
+    query = zlib.crc32(request.query_string)
+    return f"{_boot_id}-{version(table)}-{query:08x}"
+
+
+def conditional(table):
+    """Answers If-None-Match with 304 while table is unchanged; tags fresh responses with an ETag."""
+    def decorator(f):
+        @wraps(f)
+        def wrapper(*args, **kwargs):
+            tag = etag_for(table)
+            if request.if_none_match.contains(tag):
+                response = Response(status=304)
+                response.set_etag(tag)
+                return response
+            data, code, headers = unpack(f(*args, **kwargs))
+            headers = dict(headers or {})
+            headers["ETag"] = f'"{tag}"'
+            # let browsers keep the body but revalidate on every poll
+            headers["Cache-Control"] = "no-cache"
+            return data, code, headers
+        return wrapper
+    return decorator
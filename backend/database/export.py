@@ -0,0 +1,55 @@
+"""
+Streaming exports.
+
+Rows come from a server-side cursor in chunks of EXPORT_CHUNK_ROWS, are encoded as
+NDJSON or CSV, optionally gzipped, and written to the response as they arrive, so
+memory stays flat however many rows match. The export reads on its own connection
+in one read transaction: PostgreSQL (MVCC) and SQLite in WAL mode keep accepting
+writes meanwhile, so ingest is not blocked. On SQLite the WAL cannot be checkpointed
+until the export finishes and grows in the meantime.
+"""
+import csv
+import io
+import json
+import os
+import zlib
+
+from database.db import db
+
+EXPORT_CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "5000"))
+EXPORT_FORMATS = {"ndjson": "application/x-ndjson", "csv": "text/csv"}
+
+
+def _ndjson(items, names):
+    return "".join(json.dumps(item) + "\n" for item in items)
+
+
+def _csv(items, names):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerows([item[name] for name in names] for item in items)
+    return buffer.getvalue()
+
+
+def export_rows(statement, serialize, names, fmt="ndjson", compress=False, chunk_rows=EXPORT_CHUNK_ROWS):
+    """
+    Yields the encoded export of statement, one chunk of rows at a time.
+    serialize turns a list of rows into dicts keyed by names (the CSV columns).
+    """
+    encode = _csv if fmt == "csv" else _ndjson
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31) if compress else None  # wbits 31: gzip container
+
+    def output(text):
+        data = text.encode()
+        return compressor.compress(data) if compressor is not None else data
+
+    with db.engine.connect() as connection:
+        result = connection.execution_options(yield_per=chunk_rows).execute(statement)
+        if fmt == "csv":
+            yield output(",".join(names) + "\r\n")
+        for rows in result.partitions():
+            data = output(encode(serialize(rows), names))
+            if data:
+                yield data
+    if compressor is not None:
+        yield compressor.flush()
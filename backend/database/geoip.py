@@ -0,0 +1,237 @@
+"""
+Offline GeoIP/ASN enrichment.
+
+GEOIP_DB names one or more comma-separated CSV files, loaded once into sorted integer
+ranges (one index per file and IP version) and searched with bisect. Supported files:
+
+- MaxMind GeoLite2 CSV: the Country or City blocks files (network, geoname_id, ...; the
+  matching *-Locations-en.csv next to them supplies the country code) and the ASN
+  blocks files (network, autonomous_system_number, autonomous_system_organization)
+- range CSV with a header naming start and end (or network) plus any of country,
+  asn and as_org
+- range files without a header: start,end,country[,asn[,as_org]] (CSV, e.g. DB-IP lite)
+  or start<TAB>end<TAB>asn<TAB>country<TAB>as_org (iptoasn.com)
+
+Addresses may be written as IPs or as integers. Results for the GEOIP_CACHE_SIZE most
+recently seen addresses are kept in an LRU cache, since a few scanners account for
+most incidents. Nothing here touches the network.
+"""
+import bisect
+import csv
+import functools
+import ipaddress
+import logging
+import os
+import socket
+import threading
+from array import array
+
+GEOIP_DB = os.getenv("GEOIP_DB", "")
+GEOIP_CACHE_SIZE = int(os.getenv("GEOIP_CACHE_SIZE", "65536"))
+
+NO_MATCH = (None, None, None)  # (country, asn, as_org)
+
+logger = logging.getLogger("geoip")
+
+_START = ("start", "ip_start", "range_start", "network_start")
+_END = ("end", "ip_end", "range_end", "network_end")
+_COUNTRY = ("country", "country_code", "country_iso_code")
+_ASN = ("asn", "autonomous_system_number", "as_number")
+_AS_ORG = ("as_org", "autonomous_system_organization", "as_description", "organization")
+
+
+def _address(text):
+    text = text.strip()
+    if text.isdigit():
+        value = int(text)
+        return value, 4 if value < 1 << 32 else 6
+    try:
+        # far cheaper than ipaddress for the IPv4 rows that make up most files
+        return int.from_bytes(socket.inet_pton(socket.AF_INET, text), "big"), 4
+    except OSError:
+        pass
+    address = ipaddress.ip_address(text)
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return int(address), address.version
+
+
+def _network(text):
+    network = ipaddress.ip_network(text.strip(), strict=False)
+    first, last = network.network_address, network.broadcast_address
+    if first.version == 6 and first.ipv4_mapped is not None:
+        return int(first.ipv4_mapped), int(last.ipv4_mapped), 4
+    return int(first), int(last), first.version
+
+
+def _asn(text):
+    text = (text or "").strip().upper()
+    if text.startswith("AS"):
+        text = text[2:]
+    try:
+        asn = int(text)
+    except ValueError:
+        return None
+    return asn or None  # iptoasn uses AS0 for unrouted space
+
+
+def _pick(row, names):
+    for name in names:
+        value = row.get(name)
+        if value:
+            return value.strip()
+    return None
+
+
+class RangeIndex:
+    """Sorted, non-overlapping address ranges of one IP version with a value each."""
+
+    def __init__(self, version):
+        # IPv4 bounds fit an unsigned 32-bit array; IPv6 bounds stay Python ints
+        self._starts = array("I") if version == 4 else []
+        self._ends = array("I") if version == 4 else []
+        self._values = []
+        self._pending = []
+
+    def add(self, start, end, value):
+        self._pending.append((start, end, value))
+
+    def build(self):
+        self._pending.sort(key=lambda entry: entry[0])
+        for start, end, value in self._pending:
+            self._starts.append(start)
+            self._ends.append(end)
+            self._values.append(value)
+        self._pending = []
+        return self
+
+    def __len__(self):
+        return len(self._values)
+
+    def find(self, address):
+        i = bisect.bisect_right(self._starts, address) - 1
+        if i >= 0 and address <= self._ends[i]:
+            return self._values[i]
+        return None
+
+
+class GeoIPDatabase:
+    def __init__(self, paths, cache_size=GEOIP_CACHE_SIZE):
+        self.paths = paths
+        # one (ipv4 index, ipv6 index) pair per file; earlier files take precedence field by field
+        self._indexes = [self._load(path) for path in paths]
+        self.lookup = functools.lru_cache(maxsize=cache_size)(self._lookup)
+
+    def _lookup(self, packed):
+        """(country, asn, as_org) for a packed address (see database.netutil.pack_ip)."""
+        if packed is None or len(packed) not in (4, 16):
+            return NO_MATCH
+        address = int.from_bytes(packed, "big")
+        version = 4 if len(packed) == 4 else 6
+        found = NO_MATCH
+        for ipv4, ipv6 in self._indexes:
+            value = (ipv4 if version == 4 else ipv6).find(address)
+            if value is not None:
+                found = tuple(old if old is not None else new for old, new in zip(found, value))
+                if None not in found:
+                    break
+        return found
+
+    def _load(self, path):
+        indexes = {4: RangeIndex(4), 6: RangeIndex(6)}
+        # identical tuples are shared; large files repeat a few thousand distinct values
+        values = {}
+        with open(path, newline="", encoding="utf-8") as f:
+            first = f.readline()
+            f.seek(0)
+            delimiter = "\t" if "\t" in first else ","
+            if _is_address(first.split(delimiter)[0]):
+                rows = self._positional_rows(csv.reader(f, delimiter=delimiter), delimiter)
+            else:
+                rows = self._header_rows(csv.DictReader(f, delimiter=delimiter), path)
+            for start, end, version, value in rows:
+                if value == NO_MATCH:
+                    continue
+                indexes[version].add(start, end, values.setdefault(value, value))
+        ipv4, ipv6 = indexes[4].build(), indexes[6].build()
+        logger.info("Loaded %d IPv4 and %d IPv6 ranges from %s", len(ipv4), len(ipv6), path)
+        return ipv4, ipv6
+
+    @staticmethod
+    def _positional_rows(reader, delimiter):
+        for row in reader:
+            if len(row) < 3:
+                continue
+            start, version = _address(row[0])
+            end, _ = _address(row[1])
+            if delimiter == "\t":  # iptoasn: start, end, asn, country, as_org
+                asn = _asn(row[2])
+                country = row[3].strip().upper() if len(row) > 3 else ""
+                as_org = row[4].strip() if len(row) > 4 else ""
+            else:
+                country = row[2].strip().upper()
+                asn = _asn(row[3]) if len(row) > 3 else None
+                as_org = row[4].strip() if len(row) > 4 else ""
+            country = country if len(country) == 2 and country != "ZZ" else None  # ZZ: unknown
+            yield start, end, version, (country, asn, (as_org or None) if asn else None)
+
+    @staticmethod
+    def _header_rows(reader, path):
+        fieldnames = set(reader.fieldnames or [])
+        countries = _load_locations(path) if "geoname_id" in fieldnames else {}
+        for row in reader:
+            if row.get("network"):
+                start, end, version = _network(row["network"])
+            else:
+                start, version = _address(_pick(row, _START) or "")
+                end, _ = _address(_pick(row, _END) or "")
+            country = _pick(row, _COUNTRY)
+            if country is None and countries:
+                country = countries.get(row.get("geoname_id") or row.get("registered_country_geoname_id"))
+            asn = _asn(_pick(row, _ASN))
+            as_org = _pick(row, _AS_ORG) if asn else None
+            yield start, end, version, (country.upper() if country else None, asn, as_org)
+
+
+def _is_address(text):
+    try:
+        _address(text)
+    except ValueError:
+        return False
+    return True
+
+
+def _load_locations(blocks_path):
+    """geoname_id -> country code from the Locations file next to a GeoLite2 blocks file."""
+    directory, name = os.path.split(blocks_path)
+    prefix = name.split("-Blocks-")[0]
+    path = os.path.join(directory, f"{prefix}-Locations-en.csv")
+    if not os.path.exists(path):
+        logger.warning("No %s; countries from %s stay empty", path, blocks_path)
+        return {}
+    with open(path, newline="", encoding="utf-8") as f:
+        return {row["geoname_id"]: row["country_iso_code"] for row in csv.DictReader(f) if row.get("country_iso_code")}
+
+
+_database = None
+_load_lock = threading.Lock()
+
+
+def geoip_database():
+    """The database named by GEOIP_DB, loaded on first use; None if GEOIP_DB is not set."""
+    global _database
+    if not GEOIP_DB:
+        return None
+    if _database is None:
+        with _load_lock:
+            if _database is None:
+                _database = GeoIPDatabase([path.strip() for path in GEOIP_DB.split(",") if path.strip()])
+    return _database
+
+
+def lookup(packed):
+    """(country, asn, as_org) for a packed address; all None without a database or a match."""
+    database = geoip_database()
+    if database is None:
+        return NO_MATCH
+    return database.lookup(packed)
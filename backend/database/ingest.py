@@ -0,0 +1,197 @@
+"""
+Write-behind ingest: requests append validated payloads to a bounded in-process queue
+and return 202; a background writer stores them in group commits.
+
+With INGEST_SPOOL_PATH set, every accepted payload is first appended to an NDJSON spool
+file. The offset of the last committed payload is kept next to it, so payloads that were
+accepted but not yet committed are replayed when the process starts again.
+"""
+import atexit
+import collections
+import json
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from database.db import db
+
+INGEST_MODE = os.getenv("INGEST_MODE", "sync").lower()  # "sync" or "async"
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", "100000"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "1000"))
+INGEST_FLUSH_MS = float(os.getenv("INGEST_FLUSH_MS", "200"))
+INGEST_SPOOL_PATH = os.getenv("INGEST_SPOOL_PATH", "")
+
+
+class WriteBehindQueue:
+    def __init__(self, flush, maxsize=INGEST_QUEUE_SIZE, batch_size=INGEST_BATCH_SIZE,
+                 flush_interval=INGEST_FLUSH_MS / 1000.0, spool_path=INGEST_SPOOL_PATH):
+        self.flush = flush
+        self.maxsize = maxsize
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spool_path = spool_path
+        self._items = collections.deque()  # (payload, spool offset after the payload)
+        self._cond = threading.Condition()
+        self._spool = None
+        self._thread = None
+        self._stopping = False
+        self._stats = {
+            "accepted": 0, "rejected_full": 0, "flushed": 0, "dropped": 0, "batches": 0, "retries": 0,
+            "last_batch_size": 0, "last_flush_ms": 0.0, "avg_flush_ms": 0.0, "max_flush_ms": 0.0,
+        }
+
+    @property
+    def running(self):
+        return self._thread is not None
+
+    def start(self, app):
+        if self._thread is not None:
+            return
+        if self.spool_path:
+            self._replay_spool()
+        self._thread = threading.Thread(target=self._run, args=(app,), name="ingest-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self, timeout=10.0):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def submit(self, payloads):
+        """Queues payloads as one unit; returns False (nothing queued) if they don't fit."""
+        with self._cond:
+            if len(self._items) + len(payloads) > self.maxsize:
+                self._stats["rejected_full"] += len(payloads)
+                return False
+            for payload in payloads:
+                offset = self._append_to_spool(payload) if self.spool_path else 0
+                self._items.append((payload, offset))
+            if self._spool is not None:
+                # survives a crash of this process; fsync happens once per group commit
+                self._spool.flush()
+            self._stats["accepted"] += len(payloads)
+            if len(self._items) >= self.batch_size:
+                self._cond.notify()
+        return True
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queue_depth"] = len(self._items)
+        stats["queue_capacity"] = self.maxsize
+        stats["spool_bytes"] = self._spool.tell() if self._spool is not None else 0
+        return stats
+
+    def _next_batch(self):
+        with self._cond:
+            deadline = time.monotonic() + self.flush_interval
+            while len(self._items) < self.batch_size and not self._stopping:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            count = min(len(self._items), self.batch_size)
+            return [self._items.popleft() for _ in range(count)]
+
+    def _run(self, app):
+        with app.app_context():
+            while True:
+                batch = self._next_batch()
+                if batch:
+                    self._write(batch)
+                    self._commit_spool(batch[-1][1])
+                elif self._stopping:
+                    return
+
+    def _write(self, batch):
+        payloads = [payload for payload, _ in batch]
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                self.flush(payloads)
+                self._record_flush(len(payloads), time.perf_counter() - started)
+                return
+            except OperationalError as e:
+                # database unavailable or locked: keep the batch and try again
+                db.session.rollback()
+                attempt += 1
+                self._stats["retries"] += 1
+                logging.warning("Ingest flush failed (attempt %d), retrying: %s", attempt, e)
+                time.sleep(min(5.0, 0.1 * 2 ** attempt))
+            except Exception:
+                db.session.rollback()
+                break
+        # a payload the database refuses: store the rest one by one, drop the offenders
+        for payload in payloads:
+            try:
+                self.flush([payload])
+                self._record_flush(1, 0.0)
+            except Exception as e:
+                db.session.rollback()
+                self._stats["dropped"] += 1
+                logging.warning("Dropping incident the database rejected: %s", e)
+
+    def _record_flush(self, count, seconds):
+        ms = seconds * 1000.0
+        stats = self._stats
+        stats["flushed"] += count
+        stats["batches"] += 1
+        stats["last_batch_size"] = count
+        stats["last_flush_ms"] = ms
+        stats["avg_flush_ms"] = ms if stats["batches"] == 1 else 0.9 * stats["avg_flush_ms"] + 0.1 * ms
+        stats["max_flush_ms"] = max(stats["max_flush_ms"], ms)
+
+    # spool file
+
+    def _append_to_spool(self, payload):
+        if self._spool is None:
+            self._spool = open(self.spool_path, "ab")
+        self._spool.write(json.dumps(payload, separators=(",", ":")).encode() + b"\n")
+        return self._spool.tell()
+
+    def _commit_spool(self, offset):
+        if self._spool is None:
+            return
+        with self._cond:
+            self._spool.flush()
+        os.fsync(self._spool.fileno())
+        with self._cond:
+            if not self._items and offset == self._spool.tell():
+                # everything accepted so far is in the database: start a fresh spool
+                self._spool.truncate(0)
+                self._spool.seek(0)
+                offset = 0
+            with open(self.spool_path + ".offset", "w") as f:
+                f.write(str(offset))
+
+    def _replay_spool(self):
+        if not os.path.exists(self.spool_path):
+            return
+        try:
+            with open(self.spool_path + ".offset") as f:
+                committed = int(f.read().strip() or 0)
+        except (OSError, ValueError):
+            committed = 0
+        end = committed
+        with open(self.spool_path, "rb") as f:
+            f.seek(committed)
+            for line in iter(f.readline, b""):
+                if not line.endswith(b"\n"):
+                    break  # torn write from a crash
+                end = f.tell()
+                try:
+                    self._items.append((json.loads(line), end))
+                except ValueError:
+                    continue
+        # cut a torn tail so new payloads start on a line of their own
+        os.truncate(self.spool_path, end)
+        self._spool = open(self.spool_path, "ab")
+        if self._items:
+            logging.info("Replaying %d spooled incidents from %s", len(self._items), self.spool_path)
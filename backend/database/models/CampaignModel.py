@@ -0,0 +1,396 @@
+from database.db import db
+from database.changes import conditional, mark_changed
+from database.netutil import parse_ip, unpack_ip
+from database.timeutil import parse_time
+from database.models.DictionaryModel import lookup_id, lookup_value, prefetch_values
+from database.serialize import RowSerializer, marshal_rows_with
+from flask_restx import Resource, fields, inputs
+from sqlalchemy import bindparam, event
+from sqlalchemy.orm import Session
+from collections import OrderedDict
+from datetime import datetime, timedelta
+import base64
+import os
+import threading
+
+
+# a campaign ends once its source has been quiet for this long
+CAMPAIGN_GAP_SECONDS = float(os.getenv("CAMPAIGN_GAP_SECONDS", "1800"))
+# open campaigns kept in memory; the least recently active are evicted (and reloaded on demand)
+CAMPAIGN_MAX_ACTIVE = int(os.getenv("CAMPAIGN_MAX_ACTIVE", "100000"))
+# distinct honeypots remembered per campaign
+CAMPAIGN_MAX_HONEYPOTS = int(os.getenv("CAMPAIGN_MAX_HONEYPOTS", "256"))
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+SEVERITY_RANK = {"low": 1, "moderate": 2, "critical": 3}
+
+
+class CampaignModel(db.Model):
+    """Incidents from one source IP and client, with no gap longer than CAMPAIGN_GAP_SECONDS between them."""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    source_ip = db.Column(db.LargeBinary(16), nullable=False)
+    family_id = db.Column(db.Integer, db.ForeignKey('dictionary_entry_model.id'), nullable=True)
+    client_ident_id = db.Column(db.Integer, db.ForeignKey('dictionary_entry_model.id'), nullable=True)
+    country = db.Column(db.String(2), nullable=True)
+    asn = db.Column(db.Integer, nullable=True)
+    first_seen = db.Column(db.DateTime, nullable=False)
+    last_seen = db.Column(db.DateTime, nullable=False)
+    incident_count = db.Column(db.Integer, nullable=False, default=0)
+    honeypot_count = db.Column(db.Integer, nullable=False, default=0)
+    honeypot_ids = db.Column(db.Text, nullable=True)  # comma-separated, at most CAMPAIGN_MAX_HONEYPOTS
+    severity = db.Column(db.String(20), nullable=True)  # the most severe incident
+
+    __table_args__ = (
+        db.Index("ix_campaign_last_seen_id", "last_seen", "id"),
+        db.Index("ix_campaign_source_ip_last_seen", "source_ip", "last_seen"),
+    )
+
+    def __repr__(self):
+        return f"<Campaign {self.id} {unpack_ip(self.source_ip)} x{self.incident_count}>"
+
+
+def campaign_key(item):
+    return item.source_ip, item.family_id, item.client_ident_id
+
+
+class _Open:
+    """In-memory state of an open campaign."""
+    __slots__ = ("id", "first_seen", "last_seen", "incident_count", "honeypots", "severity", "origin")
+
+    def __init__(self, campaign_id, first_seen, last_seen, incident_count, honeypots, severity, origin):
+        self.id = campaign_id
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+        self.incident_count = incident_count
+        self.honeypots = honeypots
+        self.severity = severity
+        self.origin = origin  # (country, asn) of the first incident
+
+
+class CampaignCorrelator:
+    """
+    Groups incidents into campaigns as they are stored. Open campaigns are kept in an
+    LRU of at most max_active entries; campaigns quiet for longer than the gap are
+    dropped from it first. A source that is not in memory (evicted, or after a restart)
+    is looked up in the campaign table, so eviction costs a query, not a split campaign.
+    """
+
+    def __init__(self, gap_seconds=CAMPAIGN_GAP_SECONDS, max_active=CAMPAIGN_MAX_ACTIVE,
+                 max_honeypots=CAMPAIGN_MAX_HONEYPOTS):
+        self.gap = timedelta(seconds=gap_seconds)
+        self.max_active = max_active
+        self.max_honeypots = max_honeypots
+        # held by save_incidents until its commit, so no writer sees a campaign row it cannot update yet
+        self.lock = threading.RLock()
+        self._open = OrderedDict()  # campaign key -> _Open, least recently active first
+        self.stats = {"created": 0, "extended": 0, "reloaded": 0, "expired": 0, "evicted": 0}
+
+    def open_count(self):
+        return len(self._open)
+
+    def correlate(self, items):
+        """Sets campaign_id on items, creating and updating campaigns in the caller's transaction."""
+        pairs = sorted(
+            ((campaign_key(item), item) for item in items if item.source_ip is not None),
+            key=lambda pair: pair[1].timestamp,
+        )
+        if not pairs:
+            return
+        self._reload({key for key, _ in pairs if key not in self._open}, pairs[0][1].timestamp)
+        touched = {}  # campaign -> key; one key can start two campaigns if a batch spans the gap
+        assigned = []
+        for key, item in pairs:
+            timestamp = item.timestamp
+            campaign = self._open.get(key)
+            if campaign is not None and campaign.first_seen - timestamp > self.gap:
+                # a late or replayed incident from well before the open campaign: a campaign of its
+                # own, kept out of the LRU so it does not replace the open one
+                campaign = _Open(None, timestamp, timestamp, 0, set(), None, (item.country, item.asn))
+                self.stats["created"] += 1
+            elif campaign is None or timestamp - campaign.last_seen > self.gap:
+                campaign = _Open(None, timestamp, timestamp, 0, set(), None, (item.country, item.asn))
+                self._open[key] = campaign
+                self.stats["created"] += 1
+            else:
+                campaign.first_seen = min(campaign.first_seen, timestamp)
+                campaign.last_seen = max(campaign.last_seen, timestamp)
+                if campaign not in touched:
+                    self.stats["extended"] += 1
+            campaign.incident_count += 1
+            if item.honeypot_id is not None and len(campaign.honeypots) < self.max_honeypots:
+                campaign.honeypots.add(item.honeypot_id)
+            if SEVERITY_RANK.get(item.severity, 0) > SEVERITY_RANK.get(campaign.severity, 0):
+                campaign.severity = item.severity
+            if self._open.get(key) is campaign:
+                self._open.move_to_end(key)
+            touched[campaign] = key
+            assigned.append((item, campaign))
+        self._write(touched)
+        for item, campaign in assigned:
+            item.campaign_id = campaign.id
+        db.session.info.setdefault("campaign_keys", set()).update(touched.values())
+        self._evict(pairs[-1][1].timestamp)
+
+    def forget(self, keys):
+        """Drops keys whose changes were rolled back; they are reloaded from the table when seen again."""
+        with self.lock:
+            for key in keys:
+                self._open.pop(key, None)
+
+    def reset(self):
+        with self.lock:
+            self._open.clear()
+
+    def _reload(self, keys, since):
+        if not keys:
+            return
+        table = CampaignModel.__table__
+        ips = sorted({key[0] for key in keys})
+        for offset in range(0, len(ips), 500):
+            rows = db.session.query(table).filter(
+                table.c.source_ip.in_(ips[offset:offset + 500]),
+                table.c.last_seen >= since - self.gap,
+            ).order_by(table.c.last_seen)
+            for row in rows:
+                key = campaign_key(row)
+                if key not in keys:
+                    continue
+                honeypots = {int(i) for i in row.honeypot_ids.split(",")} if row.honeypot_ids else set()
+                self._open[key] = _Open(row.id, row.first_seen, row.last_seen, row.incident_count, honeypots,
+                                        row.severity, (row.country, row.asn))
+                self.stats["reloaded"] += 1
+
+    def _write(self, touched):
+        new = []
+        updates = []
+        for campaign, key in touched.items():
+            values = {
+                "first_seen": campaign.first_seen,
+                "last_seen": campaign.last_seen,
+                "incident_count": campaign.incident_count,
+                "honeypot_count": len(campaign.honeypots),
+                "honeypot_ids": ",".join(str(i) for i in sorted(campaign.honeypots)),
+                "severity": campaign.severity,
+            }
+            if campaign.id is None:
+                source_ip, family_id, client_ident_id = key
+                country, asn = campaign.origin
+                new.append((campaign, CampaignModel(
+                    source_ip=source_ip, family_id=family_id, client_ident_id=client_ident_id, country=country,
+                    asn=asn, **values,
+                )))
+            else:
+                # bind names must differ from the column names in an UPDATE
+                updates.append(dict({f"new_{name}": value for name, value in values.items()}, campaign_id=campaign.id))
+        if updates:
+            table = CampaignModel.__table__
+            columns = ("first_seen", "last_seen", "incident_count", "honeypot_count", "honeypot_ids", "severity")
+            db.session.execute(
+                table.update().where(table.c.id == bindparam("campaign_id")).values(
+                    {name: bindparam(f"new_{name}") for name in columns}
+                ),
+                updates,
+            )
+            mark_changed(db.session, table.name)
+        if new:
+            db.session.add_all([row for _, row in new])
+            db.session.flush()
+            for campaign, row in new:
+                campaign.id = row.id
+
+    def _evict(self, now):
+        horizon = now - self.gap
+        while self._open:
+            key, campaign = next(iter(self._open.items()))
+            if campaign.last_seen >= horizon:
+                break
+            del self._open[key]
+            self.stats["expired"] += 1
+        while len(self._open) > self.max_active:
+            self._open.popitem(last=False)
+            self.stats["evicted"] += 1
+
+
+correlator = CampaignCorrelator()
+
+
+@event.listens_for(Session, "after_commit")
+def _committed(session):
+    session.info.pop("campaign_keys", None)
+
+
+@event.listens_for(Session, "after_rollback")
+def _rolled_back(session):
+    keys = session.info.pop("campaign_keys", None)
+    if keys:
+        correlator.forget(keys)
+
+
+def correlate_incidents(items):
+    """Assigns items to campaigns inside the caller's transaction (hold correlator.lock until the commit)."""
+    correlator.correlate(items)
+
+
+def rebuild_campaigns(incident_model, batch_size=10000):
+    """Recomputes all campaigns from the raw log, e.g. after generating or restoring a database."""
+    incidents = incident_model.__table__
+    db.session.query(incident_model).update({incident_model.campaign_id: None})
+    db.session.query(CampaignModel).delete()
+    db.session.commit()
+    correlator.reset()
+    columns = [incidents.c.id, incidents.c.timestamp, incidents.c.source_ip, incidents.c.family_id,
+               incidents.c.client_ident_id, incidents.c.honeypot_id, incidents.c.severity,
+               incidents.c.country, incidents.c.asn]
+    last = (datetime.min, 0)
+    with correlator.lock:
+        while True:
+            rows = db.session.query(*columns).filter(
+                incidents.c.source_ip.isnot(None),
+                db.or_(incidents.c.timestamp > last[0], db.and_(incidents.c.timestamp == last[0], incidents.c.id > last[1])),
+            ).order_by(incidents.c.timestamp, incidents.c.id).limit(batch_size).all()
+            if not rows:
+                break
+            items = [_Row(row) for row in rows]
+            correlator.correlate(items)
+            db.session.execute(
+                incidents.update().where(incidents.c.id == bindparam("incident_id")).values(campaign_id=bindparam("campaign")),
+                [{"incident_id": item.id, "campaign": item.campaign_id} for item in items],
+            )
+            mark_changed(db.session, incidents.name)
+            db.session.commit()
+            last = (rows[-1].timestamp, rows[-1].id)
+
+
+class _Row:
+    """A selected incident row that correlate() can set campaign_id on."""
+    __slots__ = ("id", "timestamp", "source_ip", "family_id", "client_ident_id", "honeypot_id", "severity",
+                 "country", "asn", "campaign_id")
+
+    def __init__(self, row):
+        for name in self.__slots__[:-1]:
+            setattr(self, name, getattr(row, name))
+        self.campaign_id = None
+
+
+def encode_cursor(row):
+    raw = f"{row.last_seen.isoformat()}|{row.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    padded = token + "=" * (-len(token) % 4)
+    last_seen, campaign_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+    return datetime.fromisoformat(last_seen), int(campaign_id)
+
+
+campaign_fields = {
+    "id": fields.Integer(readonly=True),
+    "source_ip": fields.String(attribute="source_address", description="The attacker IP address"),
+    "family": fields.String(description="The attacker client family, e.g. Paramiko"),
+    "client_ident": fields.String(description="The client identification line"),
+    "country": fields.String(description="ISO 3166 country code of the attacker IP"),
+    "asn": fields.Integer(description="Autonomous system number of the attacker IP"),
+    "first_seen": fields.DateTime(description="Time of the first incident"),
+    "last_seen": fields.DateTime(description="Time of the latest incident"),
+    "incident_count": fields.Integer(description="Number of incidents"),
+    "honeypot_count": fields.Integer(description=f"Number of distinct honeypots hit (exact up to {CAMPAIGN_MAX_HONEYPOTS})"),
+    "honeypot_ids": fields.List(fields.Integer, description="The honeypots hit"),
+    "severity": fields.String(description="Severity of the most severe incident"),
+}
+campaign_columns = list(CampaignModel.__table__.columns)
+_campaign_serializer = RowSerializer(campaign_fields, campaign_columns, {
+    "source_address": ("source_ip", unpack_ip),
+    "family": ("family_id", lookup_value),
+    "client_ident": ("client_ident_id", lookup_value),
+    "honeypot_ids": ("honeypot_ids", lambda ids: [int(i) for i in ids.split(",")] if ids else []),
+})
+
+
+def serialize_campaigns(rows):
+    prefetch_values(entry_id for row in rows for entry_id in (row.family_id, row.client_ident_id))
+    return _campaign_serializer(rows)
+
+
+def setup_routes(api):
+    ns = api.namespace("campaigns", description="Incidents grouped by source, client and time")
+
+    campaign_model = api.model("Campaign", campaign_fields)
+    correlator_model = api.model("CampaignCorrelator", {
+        "gap_seconds": fields.Float(description="Quiet time after which a source's next incident starts a new campaign"),
+        "open": fields.Integer(description="Open campaigns held in memory"),
+        "max_open": fields.Integer,
+        "created": fields.Integer,
+        "extended": fields.Integer(description="Batches that added incidents to an existing campaign"),
+        "reloaded": fields.Integer(description="Open campaigns read back from the table after eviction or a restart"),
+        "expired": fields.Integer(description="Campaigns dropped from memory after the gap"),
+        "evicted": fields.Integer(description="Campaigns dropped from memory to stay within max_open"),
+    })
+
+    list_parser = ns.parser()
+    list_parser.add_argument("limit", type=inputs.int_range(1, MAX_PAGE_SIZE), location="args", help=f"Page size (default {DEFAULT_PAGE_SIZE})")
+    list_parser.add_argument("cursor", type=str, location="args", help="Opaque cursor from the X-Next-Cursor header of the previous page")
+    list_parser.add_argument("source_ip", type=str, location="args", help="Only campaigns from this attacker IP")
+    list_parser.add_argument("family", type=str, location="args", help="Only campaigns of this client family")
+    list_parser.add_argument("country", type=str, location="args", help="Only campaigns from this country (ISO code)")
+    list_parser.add_argument("min_incidents", type=inputs.positive, location="args", help="Only campaigns with at least this many incidents")
+    list_parser.add_argument("active", type=inputs.boolean, location="args", help="Only campaigns whose source was seen within the gap")
+    list_parser.add_argument("start", type=str, location="args", help="Only campaigns still going at or after this time (unix timestamp or ISO 8601)")
+    list_parser.add_argument("end", type=str, location="args", help="Only campaigns that started before this time (unix timestamp or ISO 8601)")
+
+    @ns.route("/")
+    class CampaignList(Resource):
+        @conditional(CampaignModel.__tablename__)
+        @ns.doc(description="Campaigns, most recently active first, one page at a time. Incidents of a campaign are listed by "
+                            "/IncidentLogs/?campaign_id=<id>. The next page's cursor is returned in the X-Next-Cursor header.")
+        @ns.expect(list_parser)
+        @marshal_rows_with(ns, campaign_model)
+        def get(self):
+            args = list_parser.parse_args()
+            query = db.session.query(*campaign_columns)
+            if args.get("family"):
+                family_id = lookup_id("family", args["family"])
+                query = query.filter(CampaignModel.family_id == family_id if family_id is not None else db.false())
+            if args.get("country"):
+                query = query.filter(CampaignModel.country == args["country"].upper())
+            if args.get("min_incidents"):
+                query = query.filter(CampaignModel.incident_count >= args["min_incidents"])
+            if args.get("active"):
+                query = query.filter(CampaignModel.last_seen >= datetime.utcnow() - correlator.gap)
+            try:
+                if args.get("source_ip"):
+                    query = query.filter(CampaignModel.source_ip == parse_ip(args["source_ip"]))
+                if args.get("start"):
+                    query = query.filter(CampaignModel.last_seen >= parse_time(args["start"]))
+                if args.get("end"):
+                    query = query.filter(CampaignModel.first_seen < parse_time(args["end"]))
+                if args.get("cursor"):
+                    last_seen, campaign_id = decode_cursor(args["cursor"])
+                    query = query.filter(
+                        CampaignModel.last_seen <= last_seen,
+                        db.or_(CampaignModel.last_seen < last_seen, CampaignModel.id < campaign_id),
+                    )
+            except ValueError as e:
+                api.abort(400, f"Invalid source_ip, cursor or time range: {e}")
+            limit = args.get("limit") or DEFAULT_PAGE_SIZE
+            page = query.order_by(CampaignModel.last_seen.desc(), CampaignModel.id.desc()).limit(limit + 1).all()
+            headers = {}
+            if len(page) > limit:
+                headers["X-Next-Cursor"] = encode_cursor(page[limit - 1])
+            return serialize_campaigns(page[:limit]), 200, headers
+
+    @ns.route("/<int:campaign_id>")
+    class Campaign(Resource):
+        @ns.response(200, "Success", campaign_model)
+        def get(self, campaign_id):
+            row = db.session.query(*campaign_columns).filter(CampaignModel.id == campaign_id).first()
+            if row is None:
+                api.abort(404, "Campaign not found")
+            return serialize_campaigns([row])[0]
+
+    @ns.route("/correlator")
+    class CampaignCorrelatorStats(Resource):
+        @ns.doc(description="State of the in-memory correlator")
+        @ns.marshal_with(correlator_model)
+        def get(self):
+            return dict(correlator.stats, gap_seconds=correlator.gap.total_seconds(),
+                        open=correlator.open_count(), max_open=correlator.max_active)
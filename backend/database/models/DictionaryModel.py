@@ -0,0 +1,100 @@
+from database.db import db
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+
+class DictionaryEntryModel(db.Model):
+    """Interned strings (attacker families, reasons, client idents) referenced by id from incident rows."""
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    kind = db.Column(db.String(20), nullable=False)
+    value = db.Column(db.String(255), nullable=False)
+
+    __table_args__ = (
+        db.UniqueConstraint("kind", "value", name="uq_dictionary_entry_kind_value"),
+    )
+
+    def __repr__(self):
+        return f"<DictionaryEntry {self.kind}={self.value}>"
+
+
+# (kind, value) -> id and id -> value of committed entries; both tables are tiny, so they are
+# cached for the process lifetime. Entries a transaction inserts are kept in its session's
+# info until the commit, so no other thread sees an id that may still be rolled back.
+_ids = {}
+_values = {}
+
+
+def _pending(session):
+    return session.info.setdefault("dictionary_pending", ({}, {}))
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_committed(session):
+    pending = session.info.pop("dictionary_pending", None)
+    if pending:
+        _ids.update(pending[0])
+        _values.update(pending[1])
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _forget_uncommitted(session, transaction):
+    # rolled back or closed without a commit: the entries may not exist
+    if transaction.parent is None:
+        session.info.pop("dictionary_pending", None)
+
+
+def intern_value(kind, value):
+    """Returns the id for (kind, value), inserting the entry on first use; None stays None."""
+    if value is None or value == "":
+        return None
+    value = str(value)[:255]
+    entry_id = _ids.get((kind, value))
+    if entry_id is not None:
+        return entry_id
+    pending_ids, pending_values = _pending(db.session())
+    entry_id = pending_ids.get((kind, value))
+    if entry_id is not None:
+        return entry_id
+    table = DictionaryEntryModel.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        db.session.execute(insert(table).values(kind=kind, value=value).on_conflict_do_nothing())
+    elif not db.session.query(DictionaryEntryModel.id).filter_by(kind=kind, value=value).first():
+        db.session.execute(table.insert().values(kind=kind, value=value))
+    entry_id = db.session.query(DictionaryEntryModel.id).filter_by(kind=kind, value=value).scalar()
+    pending_ids[(kind, value)] = entry_id
+    pending_values[entry_id] = value
+    return entry_id
+
+
+def lookup_value(entry_id):
+    if entry_id is None:
+        return None
+    value = _values.get(entry_id)
+    if value is None:
+        value = db.session.info.get("dictionary_pending", ({}, {}))[1].get(entry_id)
+    if value is None:
+        value = db.session.query(DictionaryEntryModel.value).filter_by(id=entry_id).scalar()
+        if value is not None:
+            _values[entry_id] = value
+    return value
+
+
+def prefetch_values(entry_ids):
+    """Loads the uncached values among entry_ids in one query, so lookup_value over a page is not N+1."""
+    missing = {entry_id for entry_id in entry_ids if entry_id is not None and entry_id not in _values}
+    if not missing:
+        return
+    rows = db.session.query(DictionaryEntryModel.id, DictionaryEntryModel.value).filter(DictionaryEntryModel.id.in_(missing))
+    for entry_id, value in rows:
+        _values[entry_id] = value
+
+
+def lookup_id(kind, value):
+    """Id of an existing entry without creating it (for filters); None if unknown."""
+    entry_id = _ids.get((kind, value))
+    if entry_id is None:
+        entry_id = db.session.query(DictionaryEntryModel.id).filter_by(kind=kind, value=value).scalar()
+    return entry_id
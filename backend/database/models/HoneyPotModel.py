@@ -1,4 +1,7 @@
 from database.db import db
+from database.changes import conditional
+from database.serialize import RowSerializer, marshal_rows_with
+from database.timeutil import parse_time
 from sqlalchemy.types import TypeDecorator, String
 from flask_restx import fields, Resource
 from datetime import datetime
@@ -6,6 +9,7 @@ from datetime import datetime
 
 class ServerCategoryType(TypeDecorator):
     impl = String(20)
+    cache_ok = True
 
     def process_bind_param(self, value, dialect):
         allowed = {'web', 'database', 'dns', 'telnet', 'rdp', 'iot', 'email', 'api', 'sftp', 'ssh', 'scada', 'ftp', 'other'}
@@ -48,12 +52,31 @@ def setup_routes(api):
     ns = api.namespace("HoneyPots", description="HoneyPots operations")
 
     honey_pot_model = api.model("HoneyPot",  HoneyPotModel.json_schema())
+    columns = list(HoneyPotModel.__table__.columns)
+    serialize_honeypots = RowSerializer(honey_pot_model, columns)
+
+    list_parser = ns.parser()
+    list_parser.add_argument("since_id", type=int, location="args", help="Delta mode: only honeypots with a higher id")
+    list_parser.add_argument("since", type=str, location="args", help="Delta mode: only honeypots created after this time (unix timestamp or ISO 8601)")
 
     @ns.route("/")
     class HoneyPotList(Resource):
-        @ns.marshal_list_with(honey_pot_model)
+        @conditional(HoneyPotModel.__tablename__)
+        @ns.doc(description="Responses carry an ETag; If-None-Match is answered with 304 while nothing changed.")
+        @ns.expect(list_parser)
+        @marshal_rows_with(ns, honey_pot_model)
         def get(self):
-            return HoneyPotModel.query.all()
+            args = list_parser.parse_args()
+            query = db.session.query(*columns)
+            if args.get("since_id") is not None:
+                query = query.filter(HoneyPotModel.id > args["since_id"])
+            if args.get("since"):
+                try:
+                    since = parse_time(args["since"])
+                except ValueError as e:
+                    api.abort(400, f"Invalid time: {e}")
+                query = query.filter(HoneyPotModel.creation_date > since)
+            return serialize_honeypots(query.order_by(HoneyPotModel.id).all())
 
         @ns.expect(honey_pot_model)
         @ns.marshal_with(honey_pot_model, code=201)
@@ -1,14 +1,48 @@
 from database.db import db
+from database.changes import conditional
+from database.broadcast import Broadcaster, sse_frame
+from database.export import EXPORT_FORMATS, export_rows
+from database.ingest import WriteBehindQueue
+from database.timeutil import parse_time
+from database.netutil import pack_ip, parse_ip, unpack_ip
+from database.geoip import lookup as geoip_lookup
+from database.models.DictionaryModel import intern_value, lookup_id, lookup_value, prefetch_values
+from database.serialize import RowSerializer, marshal_rows_with
+from database.models.IncidentRollupModel import record_incidents
+from database.models.CampaignModel import correlate_incidents, correlator
 from sqlalchemy.types import TypeDecorator, String
-from flask_restx import Resource, fields
+from flask import Response, request, stream_with_context
+from werkzeug.exceptions import TooManyRequests
+from flask_restx import Resource, fields, inputs
 from datetime import datetime
+from urllib.parse import urlencode
+import base64
+import collections
+import json
+
+
+SEVERITIES = {'critical', 'moderate', 'low'}
+# severities used by sensors (pot.py sends "high") mapped onto the stored ones
+SEVERITY_ALIASES = {
+    'critical': 'critical', 'high': 'critical',
+    'moderate': 'moderate', 'medium': 'moderate',
+    'low': 'low', 'info': 'low', 'informational': 'low',
+}
+MAX_BULK_ITEMS = 5000
+DEFAULT_PAGE_SIZE = 500
+MAX_PAGE_SIZE = 5000
+
+incident_stream = Broadcaster()
+# started by create_app when INGEST_MODE=async
+ingest_queue = WriteBehindQueue(lambda payloads: save_incidents([IncidentLogModel.from_payload(data) for data in payloads]))
 
 
 class SeverityType(TypeDecorator):
     impl = String(20)
+    cache_ok = True
 
     def process_bind_param(self, value, dialect):
-        allowed = {'critical', 'moderate', 'low'}
+        allowed = SEVERITIES
         if value is not None and value not in allowed:
             raise ValueError(f"Invalid severity: {value}")
         return value
@@ -24,7 +58,45 @@ class IncidentLogModel(db.Model):
     timestamp = db.Column(db.DateTime, nullable=True, default=db.func.current_timestamp())
     severity = db.Column(SeverityType, nullable=True, default='low')
     honeypot_id = db.Column(db.Integer, db.ForeignKey('honey_pot_model.id'), nullable=True)
+    # structured alert fields; IPs are packed (4/16 bytes), strings are interned in DictionaryEntryModel
+    severity_number = db.Column(db.SmallInteger, nullable=True)
+    source_ip = db.Column(db.LargeBinary(16), nullable=True)
+    source_port = db.Column(db.Integer, nullable=True)
+    destination_port = db.Column(db.Integer, nullable=True)
+    network_bytes = db.Column(db.Integer, nullable=True)
+    family_id = db.Column(db.Integer, db.ForeignKey('dictionary_entry_model.id'), nullable=True)
+    reason_id = db.Column(db.Integer, db.ForeignKey('dictionary_entry_model.id'), nullable=True)
+    client_ident_id = db.Column(db.Integer, db.ForeignKey('dictionary_entry_model.id'), nullable=True)
+    count_last_min = db.Column(db.Integer, nullable=True)
+    rate_limited = db.Column(db.Boolean, nullable=True)
+    # attacker origin: sent by the sensor or looked up in GEOIP_DB on ingest
+    country = db.Column(db.String(2), nullable=True)
+    asn = db.Column(db.Integer, nullable=True)
+    as_org_id = db.Column(db.Integer, db.ForeignKey('dictionary_entry_model.id'), nullable=True)
+    campaign_id = db.Column(db.Integer, db.ForeignKey('campaign_model.id'), nullable=True)
 
+    # Keyset pagination walks (timestamp, id) newest first; every filter gets
+    # its own composite index so a page is a single index range scan.
+    __table_args__ = (
+        db.Index("ix_incident_log_timestamp_id", "timestamp", "id"),
+        db.Index("ix_incident_log_honeypot_timestamp_id", "honeypot_id", "timestamp", "id"),
+        db.Index("ix_incident_log_severity_timestamp_id", "severity", "timestamp", "id"),
+        db.Index("ix_incident_log_category_timestamp_id", "category", "timestamp", "id"),
+        db.Index("ix_incident_log_source_ip_timestamp_id", "source_ip", "timestamp", "id"),
+        db.Index("ix_incident_log_family_timestamp_id", "family_id", "timestamp", "id"),
+        db.Index("ix_incident_log_campaign_timestamp_id", "campaign_id", "timestamp", "id"),
+    )
+
+    # packed and interned columns are exposed under a readable name instead
+    readable_fields = {
+        "source_ip": ("source_ip", fields.String(attribute="source_address", description="The attacker IP address")),
+        "family_id": ("family", fields.String(attribute="family", description="The attacker client family, e.g. Paramiko")),
+        "reason_id": ("reason", fields.String(attribute="reason", description="Why the connection was classified as it was")),
+        "client_ident_id": ("client_ident", fields.String(attribute="client_ident", description="The client identification line")),
+        "country": ("country", fields.String(description="ISO 3166 country code of the attacker IP")),
+        "asn": ("asn", fields.Integer(description="Autonomous system number of the attacker IP")),
+        "as_org_id": ("as_org", fields.String(attribute="as_org", description="Organization of the autonomous system")),
+    }
 
     def __repr__(self):
         return f"<IncidentLog {self.title}>"
@@ -33,9 +105,15 @@ class IncidentLogModel(db.Model):
     def json_schema(cls):
         schema = {}
         for column in cls.__table__.columns:
+            if column.name in cls.readable_fields:
+                name, field = cls.readable_fields[column.name]
+                schema[name] = field
+                continue
             col_type = type(column.type).__name__
-            if col_type == "Integer":
+            if col_type in ("Integer", "SmallInteger"):
                 field = fields.Integer(readonly=column.primary_key)
+            elif col_type == "Boolean":
+                field = fields.Boolean(description=f"The incident {column.name}")
             elif col_type == "String":
                 field = fields.String(required=not column.nullable, description=f"The incident {column.name}")
             elif col_type == "DateTime":
@@ -45,36 +123,478 @@ class IncidentLogModel(db.Model):
             schema[column.name] = field
         return schema
 
+    @property
+    def source_address(self):
+        return unpack_ip(self.source_ip)
+
+    @property
+    def family(self):
+        return lookup_value(self.family_id)
+
+    @property
+    def reason(self):
+        return lookup_value(self.reason_id)
+
+    @property
+    def client_ident(self):
+        return lookup_value(self.client_ident_id)
+
+    @property
+    def as_org(self):
+        return lookup_value(self.as_org_id)
+
+    @classmethod
+    def from_payload(cls, data):
+        """Accepts the flat API fields as well as the nested alert pot.py sends (source.ip, classification.family, ...)."""
+        severity = data.get("severity")
+        category = data.get("category")
+        description = data.get("description")
+        title = data.get("title")
+        timestamp = _timestamp_or_none(data.get("@timestamp")) or _timestamp_or_none(data.get("timestamp")) or datetime.utcnow()
+        honeypot_id = data.get("honeypot_id")
+        severity_number = _int_or_none(data.get("severity_number"))
+        severity = normalize_severity(severity, severity_number)
+        source = data.get("source") or {}
+        destination = data.get("destination") or {}
+        network = data.get("network") or {}
+        classification = data.get("classification") or {}
+        rate = data.get("rate") or {}
+        ssh_client = (data.get("ssh") or {}).get("client") or {}
+        source_as = source.get("as") or {}
+        return cls(
+            title=title, timestamp=timestamp, severity=severity, category=category, description=description, honeypot_id=honeypot_id,
+            severity_number=severity_number,
+            source_ip=pack_ip(data.get("source_ip", source.get("ip"))),
+            source_port=_int_or_none(data.get("source_port", source.get("port"))),
+            destination_port=_int_or_none(data.get("destination_port", destination.get("port"))),
+            network_bytes=_int_or_none(data.get("network_bytes", network.get("bytes"))),
+            family_id=intern_value("family", data.get("family", classification.get("family"))),
+            reason_id=intern_value("reason", data.get("reason", classification.get("reason"))),
+            client_ident_id=intern_value("client_ident", data.get("client_ident", ssh_client.get("ident"))),
+            count_last_min=_int_or_none(data.get("count_last_min", rate.get("count_last_min"))),
+            rate_limited=_bool_or_none(data.get("rate_limited", rate.get("rate_limited"))),
+            country=_country_or_none(data.get("country", (source.get("geo") or {}).get("country_iso_code"))),
+            asn=_asn_or_none(data.get("asn", source_as.get("number"))),
+            as_org_id=intern_value("as_org", data.get("as_org", (source_as.get("organization") or {}).get("name"))),
+        )
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _timestamp_or_none(value):
+    """Naive UTC for a unix timestamp or an ISO 8601 string (see parse_time)."""
+    if value is None:
+        return None
+    try:
+        return parse_time(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _bool_or_none(value):
+    return None if value is None else bool(value)
+
+
+def _country_or_none(value):
+    value = str(value or "").strip().upper()
+    return value if len(value) == 2 else None
+
+
+def _asn_or_none(value):
+    """Accepts 12345 as well as "AS12345"."""
+    value = str(value or "").strip().upper()
+    return _int_or_none(value[2:] if value.startswith("AS") else value)
+
+
+def enrich_incidents(items):
+    """Fills country, asn and as_org from GEOIP_DB for items whose sensor did not send them."""
+    for item in items:
+        if item.country is not None and item.asn is not None:
+            continue
+        country, asn, as_org = geoip_lookup(item.source_ip)
+        if item.country is None:
+            item.country = country
+        if item.asn is None and asn is not None:
+            item.asn = asn
+            item.as_org_id = intern_value("as_org", as_org)
+
+
+def normalize_severity(severity, severity_number=None):
+    """Maps sensor severities onto SEVERITIES; falls back to severity_number (1..10) for unknown names."""
+    if severity is not None:
+        normalized = SEVERITY_ALIASES.get(str(severity).lower())
+        if normalized is not None:
+            return normalized
+    if severity_number is None:
+        return None
+    if severity_number >= 8:
+        return 'critical'
+    if severity_number >= 4:
+        return 'moderate'
+    return 'low'
+
+
+incident_fields = IncidentLogModel.json_schema()
+# list responses select these columns instead of loading ORM objects
+incident_columns = list(IncidentLogModel.__table__.columns)
+_incident_serializer = RowSerializer(incident_fields, incident_columns, {
+    "source_address": ("source_ip", unpack_ip),
+    "family": ("family_id", lookup_value),
+    "reason": ("reason_id", lookup_value),
+    "client_ident": ("client_ident_id", lookup_value),
+    "as_org": ("as_org_id", lookup_value),
+})
+
+
+def serialize_incidents(rows):
+    """Rows of incident_columns as the dicts marshal(item, incident_fields) would return."""
+    prefetch_values(entry_id for row in rows for entry_id in (row.family_id, row.reason_id, row.client_ident_id, row.as_org_id))
+    return _incident_serializer(rows)
+
+
+_IncidentRow = collections.namedtuple("IncidentRow", [IncidentLogModel.__mapper__.get_property_by_column(column).key for column in incident_columns])
+
+
+def incident_frame(item):
+    """(event id, SSE frame) for an incident serialized by serialize_incidents."""
+    return item["id"], sse_frame("incident", item["id"], json.dumps(item))
+
+
+def incident_row(item):
+    """The incident_columns of a flushed (not yet expired) item, shaped like a query row."""
+    return _IncidentRow._make([getattr(item, key) for key in _IncidentRow._fields])
+
+
+def encode_cursor(item):
+    raw = f"{item.timestamp.isoformat()}|{item.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token):
+    padded = token + "=" * (-len(token) % 4)
+    timestamp, item_id = base64.urlsafe_b64decode(padded.encode()).decode().split("|")
+    return datetime.fromisoformat(timestamp), int(item_id)
+
+
+def filter_incidents(query, args):
+    """
+    Applies the honeypot_id, campaign_id, severity, category, source_ip, family and start/end filters in args.
+    Raises ValueError for an invalid source_ip or time.
+    """
+    if args.get("honeypot_id") is not None:
+        query = query.filter(IncidentLogModel.honeypot_id == args["honeypot_id"])
+    if args.get("campaign_id") is not None:
+        query = query.filter(IncidentLogModel.campaign_id == args["campaign_id"])
+    if args.get("severity"):
+        query = query.filter(IncidentLogModel.severity == args["severity"])
+    if args.get("category"):
+        query = query.filter(IncidentLogModel.category == args["category"])
+    if args.get("source_ip"):
+        query = query.filter(IncidentLogModel.source_ip == parse_ip(args["source_ip"]))
+    if args.get("family"):
+        family_id = lookup_id("family", args["family"])
+        query = query.filter(IncidentLogModel.family_id == family_id if family_id is not None else db.false())
+    if args.get("start"):
+        query = query.filter(IncidentLogModel.timestamp >= parse_time(args["start"]))
+    if args.get("end"):
+        query = query.filter(IncidentLogModel.timestamp < parse_time(args["end"]))
+    return query
+
+
+def query_incidents(args):
+    """
+    Returns (rows, next_cursor) for the filters and cursor in args, newest first; rows hold incident_columns.
+    With since_id/since only newer incidents are returned, oldest first and without a cursor;
+    clients pass the highest id they have seen on the next poll.
+    """
+    query = filter_incidents(db.session.query(*incident_columns), args)
+    limit = min(args.get("limit") or DEFAULT_PAGE_SIZE, MAX_PAGE_SIZE)
+    if args.get("since_id") is not None or args.get("since"):
+        if args.get("since_id") is not None:
+            query = query.filter(IncidentLogModel.id > args["since_id"])
+        if args.get("since"):
+            query = query.filter(IncidentLogModel.timestamp > parse_time(args["since"]))
+        return query.order_by(IncidentLogModel.id.asc()).limit(limit).all(), None
+    if args.get("cursor"):
+        timestamp, item_id = decode_cursor(args["cursor"])
+        # written as a range plus a tie-breaker so the index range scan still applies
+        query = query.filter(
+            IncidentLogModel.timestamp <= timestamp,
+            db.or_(IncidentLogModel.timestamp < timestamp, IncidentLogModel.id < item_id),
+        )
+    page = query.order_by(IncidentLogModel.timestamp.desc(), IncidentLogModel.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(page[limit - 1]) if len(page) > limit else None
+    return page[:limit], next_cursor
+
+
+def _with_cursor(cursor):
+    args = request.args.to_dict()
+    args["cursor"] = cursor
+    return urlencode(args)
+
+
+def parse_bulk_payload(body, content_type):
+    """Returns the list of alert dicts in a bulk request body (JSON array or NDJSON)."""
+    text = body.decode("utf-8", errors="replace").strip()
+    if not text:
+        return []
+    if "ndjson" not in (content_type or "") and text.startswith("["):
+        items = json.loads(text)
+        if not isinstance(items, list):
+            raise ValueError("Expected a JSON array")
+        return items
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+# nested objects from_payload reads fields from (parents before children)
+_PAYLOAD_OBJECTS = (
+    ("source",), ("destination",), ("network",), ("classification",), ("rate",), ("ssh",),
+    ("ssh", "client"), ("source", "geo"), ("source", "as"), ("source", "as", "organization"),
+)
+# flat fields from_payload reads; anything but a JSON scalar would reach the database as is
+_PAYLOAD_SCALARS = (
+    "title", "category", "description", "severity", "severity_number", "honeypot_id", "timestamp", "@timestamp",
+    "source_ip", "source_port", "destination_port", "network_bytes", "family", "reason", "client_ident",
+    "count_last_min", "rate_limited", "country", "asn", "as_org",
+)
+_SCALAR_TYPES = (str, int, float, bool)
+
+
+def _payload_value(data, path):
+    for key in path:
+        data = data.get(key)
+        if data is None:
+            return None
+    return data
+
+
+def validate_incident_payload(data):
+    """False unless data has a title, a known severity and the shapes from_payload expects."""
+    if not isinstance(data, dict):
+        return False
+    if not data.get("title"):
+        return False
+    for path in _PAYLOAD_OBJECTS:
+        value = _payload_value(data, path)
+        if value is not None and not isinstance(value, dict):
+            return False
+    if any(data.get(name) is not None and not isinstance(data[name], _SCALAR_TYPES) for name in _PAYLOAD_SCALARS):
+        return False
+    severity = data.get("severity")
+    if severity is None:
+        return True
+    return normalize_severity(severity, _int_or_none(data.get("severity_number"))) is not None
+
+
+def save_incidents(items, serialize=False):
+    """
+    Inserts all items, their rollup counts and campaign updates in a single transaction
+    and pushes them to live subscribers. Returns the items serialized by serialize_incidents
+    if serialize is set or someone is subscribed, else None.
+
+    The rows are taken after the flush, before the commit expires the objects; reading an
+    expired object would cost one SELECT per incident.
+    """
+    enrich_incidents(items)
+    rows = None
+    with correlator.lock:
+        try:
+            correlate_incidents(items)
+            db.session.add_all(items)
+            record_incidents(items)
+            if serialize or incident_stream.subscriber_count():
+                db.session.flush()
+                rows = [incident_row(item) for item in items]
+            db.session.commit()
+        except Exception:
+            # roll back while still holding the lock: after_rollback makes the correlator forget the
+            # uncommitted campaigns before another writer can see them (session.close() would not)
+            db.session.rollback()
+            raise
+    if rows is None:
+        return None
+    serialized = serialize_incidents(rows)
+    publish_incidents(serialized)
+    return serialized
+
+
+def queue_incidents(payloads):
+    """Hands validated payloads to the background writer; answers 429 if its queue is full."""
+    if not ingest_queue.submit(payloads):
+        raise TooManyRequests("Ingest queue full, retry later", retry_after=1)
+
+
+def publish_incidents(serialized):
+    if incident_stream.subscriber_count():
+        incident_stream.publish([incident_frame(item) for item in serialized])
+
+
+def incident_backlog(since_id):
+    """
+    (event id, SSE frame) for every incident after since_id, read MAX_PAGE_SIZE at a time until
+    caught up. The session is closed after each page, so no transaction stays open while streaming.
+    """
+    while True:
+        rows = db.session.query(*incident_columns).filter(IncidentLogModel.id > since_id).order_by(IncidentLogModel.id).limit(MAX_PAGE_SIZE).all()
+        frames = [incident_frame(item) for item in serialize_incidents(rows)]
+        db.session.close()
+        yield from frames
+        if len(rows) < MAX_PAGE_SIZE:
+            return
+        since_id = rows[-1].id
 
 
 def setup_routes(api):
     ns = api.namespace("IncidentLogs", description="IncidentLogs operations")
 
-    incident_log_model = api.model("IncidentLog",  IncidentLogModel.json_schema())
+    incident_log_model = api.model("IncidentLog",  incident_fields)
+    bulk_result_model = api.model("IncidentLogBulkResult", {
+        "inserted": fields.Integer(description="Number of incidents stored"),
+        "rejected": fields.Integer(description="Number of invalid items skipped"),
+        "queued": fields.Integer(description="Number of incidents accepted for the background writer (INGEST_MODE=async)"),
+    })
+    ingest_stats_model = api.model("IngestStats", {
+        "mode": fields.String(description="sync or async"),
+        "queue_depth": fields.Integer(description="Incidents accepted but not yet committed"),
+        "queue_capacity": fields.Integer,
+        "accepted": fields.Integer,
+        "rejected_full": fields.Integer(description="Incidents refused with 429 because the queue was full"),
+        "flushed": fields.Integer(description="Incidents committed by the background writer"),
+        "dropped": fields.Integer(description="Incidents the database refused"),
+        "batches": fields.Integer,
+        "retries": fields.Integer(description="Group commits retried because the database was unavailable"),
+        "last_batch_size": fields.Integer,
+        "last_flush_ms": fields.Float,
+        "avg_flush_ms": fields.Float(description="Exponential moving average of the group commit time"),
+        "max_flush_ms": fields.Float,
+        "spool_bytes": fields.Integer,
+    })
+
+    list_parser = ns.parser()
+    list_parser.add_argument("limit", type=inputs.int_range(1, MAX_PAGE_SIZE), location="args", help=f"Page size (default {DEFAULT_PAGE_SIZE})")
+    list_parser.add_argument("cursor", type=str, location="args", help="Opaque cursor from the X-Next-Cursor header of the previous page")
+    list_parser.add_argument("honeypot_id", type=int, location="args")
+    list_parser.add_argument("campaign_id", type=int, location="args", help="Only incidents of this campaign (see /campaigns/)")
+    list_parser.add_argument("severity", type=str, choices=sorted(SEVERITIES), location="args")
+    list_parser.add_argument("category", type=str, location="args")
+    list_parser.add_argument("source_ip", type=str, location="args", help="Only incidents from this attacker IP")
+    list_parser.add_argument("family", type=str, location="args", help="Only incidents of this client family, e.g. Paramiko")
+    list_parser.add_argument("start", type=str, location="args", help="Only incidents at or after this time (unix timestamp or ISO 8601)")
+    list_parser.add_argument("end", type=str, location="args", help="Only incidents before this time (unix timestamp or ISO 8601)")
+    list_parser.add_argument("since_id", type=int, location="args", help="Delta mode: only incidents with a higher id, oldest first")
+    list_parser.add_argument("since", type=str, location="args", help="Delta mode: only incidents after this time (unix timestamp or ISO 8601)")
 
     @ns.route("/")
     class IncidentLogList(Resource):
-        @ns.marshal_list_with(incident_log_model)
+        @conditional(IncidentLogModel.__tablename__)
+        @ns.doc(description="Incidents newest first, one page at a time. The next page's cursor is returned in the X-Next-Cursor header. "
+                            "Responses carry an ETag; If-None-Match is answered with 304 while nothing changed.")
+        @ns.expect(list_parser)
+        @marshal_rows_with(ns, incident_log_model)
         def get(self):
-            return IncidentLogModel.query.all()
+            args = list_parser.parse_args()
+            try:
+                page, next_cursor = query_incidents(args)
+            except ValueError as e:
+                api.abort(400, f"Invalid source_ip, cursor or time range: {e}")
+            headers = {}
+            if next_cursor:
+                headers["X-Next-Cursor"] = next_cursor
+                headers["Link"] = f'<{request.base_url}?{_with_cursor(next_cursor)}>; rel="next"'
+            return serialize_incidents(page), 200, headers
 
         @ns.expect(incident_log_model)
-        @ns.marshal_with(incident_log_model, code=201)
+        @ns.response(201, "Success", incident_log_model)
+        @ns.response(202, "Queued for the background writer (INGEST_MODE=async)")
         def post(self):
             data = api.payload
+            if not validate_incident_payload(data):
+                api.abort(400, "An incident needs a title, a known severity and well-formed fields")
+            if ingest_queue.running:
+                queue_incidents([data])
+                return {"queued": 1}, 202
+            return save_incidents([IncidentLogModel.from_payload(data)], serialize=True)[0], 201
+
+    export_parser = list_parser.copy()
+    for name in ("limit", "cursor", "since_id", "since"):
+        export_parser.remove_argument(name)
+    export_parser.add_argument("format", type=str, choices=sorted(EXPORT_FORMATS), default="ndjson", location="args")
+    export_parser.add_argument("gzip", type=inputs.boolean, default=False, location="args", help="gzip the body (Content-Encoding: gzip)")
+
+    @ns.route("/export")
+    class IncidentLogExport(Resource):
+        @ns.doc(description="Every matching incident, oldest first, as NDJSON (one incident per line, with the list fields) or CSV. "
+                            "The body is streamed from a server-side cursor in chunks, so exports of any size use constant memory.")
+        @ns.expect(export_parser)
+        @ns.produces(sorted(EXPORT_FORMATS.values()))
+        def get(self):
+            args = export_parser.parse_args()
             try:
-                if "timestamp" in data:
-                    timestamp = datetime.fromtimestamp(int(data.get("timestamp")))
-            except Exception as e:
-                timestamp = datetime.utcnow()
-            severity = data.get("severity")
-            category = data.get("category")
-            description = data.get("description")
-            title = data.get("title")
-            timestamp = datetime.utcnow()
-            honeypot_id = data.get("honeypot_id")
-            new_item = IncidentLogModel(title=title, timestamp=timestamp, severity=severity, category=category, description=description, honeypot_id=honeypot_id)
-            db.session.add(new_item)
-            db.session.commit()
-            return new_item, 201
+                query = filter_incidents(db.session.query(*incident_columns), args)
+            except ValueError as e:
+                api.abort(400, f"Invalid source_ip or time range: {e}")
+            statement = query.order_by(IncidentLogModel.id).statement
+            headers = {
+                "Content-Disposition": f'attachment; filename="incidents.{args["format"]}"',
+                "X-Accel-Buffering": "no",
+            }
+            if args["gzip"]:
+                headers["Content-Encoding"] = "gzip"
+            body = export_rows(statement, serialize_incidents, list(incident_fields), args["format"], args["gzip"])
+            return Response(stream_with_context(body), mimetype=EXPORT_FORMATS[args["format"]], headers=headers)
+
+    stream_parser = ns.parser()
+    stream_parser.add_argument("since_id", type=int, location="args", help="Replay incidents after this id before going live (the Last-Event-ID header takes precedence)")
+
+    @ns.route("/stream")
+    class IncidentLogStream(Resource):
+        @ns.doc(description="Server-sent events: one 'incident' event per stored incident, pushed as soon as it is committed. "
+                            "With Last-Event-ID or since_id every incident after it is replayed first, however far behind the client is.")
+        @ns.expect(stream_parser)
+        @ns.produces(["text/event-stream"])
+        def get(self):
+            args = stream_parser.parse_args()
+            since_id = request.headers.get("Last-Event-ID", type=int)
+            if since_id is None:
+                since_id = args.get("since_id")
+            # subscribe before reading the backlog so nothing committed in between is missed
+            subscription = incident_stream.subscribe()
+            backlog = incident_backlog(since_id) if since_id is not None else ()
+            return Response(
+                stream_with_context(incident_stream.stream(subscription, backlog)),
+                mimetype="text/event-stream",
+                headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+            )
+
+    @ns.route("/bulk")
+    class IncidentLogBulk(Resource):
+        @ns.doc(description="Insert a batch of incidents (JSON array or NDJSON) in one transaction")
+        @ns.expect([incident_log_model])
+        @ns.marshal_with(bulk_result_model, code=201)
+        def post(self):
+            try:
+                payloads = parse_bulk_payload(request.get_data(), request.content_type)
+            except ValueError as e:
+                api.abort(400, f"Invalid bulk payload: {e}")
+            if len(payloads) > MAX_BULK_ITEMS:
+                api.abort(413, f"At most {MAX_BULK_ITEMS} items per request")
+            valid = [data for data in payloads if validate_incident_payload(data)]
+            if ingest_queue.running:
+                queue_incidents(valid)
+                return {"inserted": 0, "rejected": len(payloads) - len(valid), "queued": len(valid)}, 202
+            items = [IncidentLogModel.from_payload(data) for data in valid]
+            save_incidents(items)
+            return {"inserted": len(items), "rejected": len(payloads) - len(items), "queued": 0}, 201
+
+    @ns.route("/ingest")
+    class IncidentLogIngest(Resource):
+        @ns.doc(description="Write-behind queue depth and group commit latency")
+        @ns.marshal_with(ingest_stats_model)
+        def get(self):
+            return dict(ingest_queue.stats(), mode="async" if ingest_queue.running else "sync")
 
@@ -0,0 +1,173 @@
+from database.db import db
+from database.timeutil import parse_time
+from flask_restx import Resource, fields, inputs
+from sqlalchemy.dialects import postgresql, sqlite
+from collections import Counter
+from datetime import datetime, timedelta
+
+
+# bucket name -> (truncation, bucket length)
+RESOLUTIONS = {
+    "1m": (lambda ts: ts.replace(second=0, microsecond=0), timedelta(minutes=1)),
+    "1h": (lambda ts: ts.replace(minute=0, second=0, microsecond=0), timedelta(hours=1)),
+    "1d": (lambda ts: ts.replace(hour=0, minute=0, second=0, microsecond=0), timedelta(days=1)),
+}
+# dimension -> incident attribute counted under it ("total" counts everything under key "")
+DIMENSIONS = {
+    "total": None,
+    "honeypot": "honeypot_id",
+    "severity": "severity",
+    "category": "category",
+    "family": "family",
+    "country": "country",
+}
+MAX_SERIES_POINTS = 10000
+
+
+class IncidentRollupModel(db.Model):
+    """Incident counts per time bucket, kept up to date on ingest so analytics never scan the raw log."""
+    resolution = db.Column(db.String(2), primary_key=True)
+    dimension = db.Column(db.String(20), primary_key=True)
+    key = db.Column(db.String(80), primary_key=True)
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (
+        db.Index("ix_incident_rollup_resolution_dimension_bucket", "resolution", "dimension", "bucket_start"),
+    )
+
+    def __repr__(self):
+        return f"<IncidentRollup {self.resolution} {self.dimension}={self.key} {self.bucket_start}: {self.count}>"
+
+
+def rollup_keys(item):
+    """Yields every (resolution, bucket_start, dimension, key) an incident counts towards."""
+    timestamp = item.timestamp or datetime.utcnow()
+    for resolution, (truncate, _) in RESOLUTIONS.items():
+        bucket_start = truncate(timestamp)
+        for dimension, attribute in DIMENSIONS.items():
+            value = getattr(item, attribute) if attribute else ""
+            yield resolution, bucket_start, dimension, "" if value is None else str(value)
+
+
+def record_incidents(items):
+    """Adds items to the rollups inside the caller's transaction, one upsert per touched bucket."""
+    counts = Counter(key for item in items for key in rollup_keys(item))
+    if not counts:
+        return
+    rows = [
+        {"resolution": resolution, "bucket_start": bucket_start, "dimension": dimension, "key": key, "count": count}
+        for (resolution, bucket_start, dimension, key), count in counts.items()
+    ]
+    _upsert_counts(rows)
+
+
+def _upsert_counts(rows):
+    table = IncidentRollupModel.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        insert = sqlite.insert if dialect == "sqlite" else postgresql.insert
+        stmt = insert(table)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[column.name for column in table.primary_key.columns],
+            set_={"count": table.c.count + stmt.excluded["count"]},
+        )
+        db.session.execute(stmt, rows)
+        return
+    for row in rows:
+        existing = db.session.get(IncidentRollupModel, (row["resolution"], row["dimension"], row["key"], row["bucket_start"]))
+        if existing is None:
+            db.session.add(IncidentRollupModel(**row))
+        else:
+            existing.count += row["count"]
+
+
+def rebuild_rollups(incident_model):
+    """Recomputes all rollups from the raw log, e.g. after seeding or restoring a database."""
+    db.session.query(IncidentRollupModel).delete()
+    counts = Counter()
+    for item in db.session.query(incident_model).yield_per(10000):
+        counts.update(rollup_keys(item))
+    rows = [
+        {"resolution": resolution, "bucket_start": bucket_start, "dimension": dimension, "key": key, "count": count}
+        for (resolution, bucket_start, dimension, key), count in counts.items()
+    ]
+    if rows:
+        db.session.execute(IncidentRollupModel.__table__.insert(), rows)
+    db.session.commit()
+
+
+def setup_routes(api):
+    ns = api.namespace("analytics", description="Aggregated incident statistics")
+
+    count_model = api.model("AnalyticsCount", {
+        "key": fields.String(description="Honeypot id, severity, category, family or country depending on the dimension"),
+        "count": fields.Integer(description="Number of incidents"),
+    })
+    point_model = api.model("AnalyticsPoint", {
+        "bucket_start": fields.DateTime(description="Start of the time bucket"),
+        "count": fields.Integer(description="Number of incidents in the bucket"),
+    })
+
+    counts_parser = ns.parser()
+    counts_parser.add_argument("dimension", type=str, choices=sorted(DIMENSIONS), default="honeypot", location="args")
+    counts_parser.add_argument("limit", type=inputs.positive, location="args", help="Only the top N keys")
+    counts_parser.add_argument("resolution", type=str, choices=sorted(RESOLUTIONS), default="1d", location="args",
+                               help="Bucket size used to apply start/end; finer is more precise, coarser is faster")
+    counts_parser.add_argument("start", type=str, location="args", help="Buckets starting at or after this time (unix timestamp or ISO 8601)")
+    counts_parser.add_argument("end", type=str, location="args", help="Buckets starting before this time (unix timestamp or ISO 8601)")
+
+    series_parser = ns.parser()
+    series_parser.add_argument("resolution", type=str, choices=sorted(RESOLUTIONS), default="1m", location="args")
+    series_parser.add_argument("dimension", type=str, choices=sorted(DIMENSIONS), default="total", location="args")
+    series_parser.add_argument("key", type=str, default="", location="args", help="Value of the dimension, e.g. a honeypot id")
+    series_parser.add_argument("start", type=str, location="args", help="Defaults to 60 buckets before end")
+    series_parser.add_argument("end", type=str, location="args", help="Defaults to now")
+
+    @ns.route("/counts")
+    class AnalyticsCounts(Resource):
+        @ns.doc(description="Incident counts per key of a dimension, highest first")
+        @ns.expect(counts_parser)
+        @ns.marshal_list_with(count_model)
+        def get(self):
+            args = counts_parser.parse_args()
+            total = db.func.sum(IncidentRollupModel.count).label("count")
+            query = db.session.query(IncidentRollupModel.key, total).filter(
+                IncidentRollupModel.resolution == args["resolution"],
+                IncidentRollupModel.dimension == args["dimension"],
+            )
+            try:
+                if args.get("start"):
+                    query = query.filter(IncidentRollupModel.bucket_start >= parse_time(args["start"]))
+                if args.get("end"):
+                    query = query.filter(IncidentRollupModel.bucket_start < parse_time(args["end"]))
+            except ValueError as e:
+                api.abort(400, f"Invalid time range: {e}")
+            query = query.group_by(IncidentRollupModel.key).order_by(total.desc(), IncidentRollupModel.key)
+            if args.get("limit"):
+                query = query.limit(args["limit"])
+            return [{"key": key, "count": count} for key, count in query.all()]
+
+    @ns.route("/timeseries")
+    class AnalyticsTimeseries(Resource):
+        @ns.doc(description="Incident counts per time bucket for one key of a dimension; empty buckets are omitted")
+        @ns.expect(series_parser)
+        @ns.marshal_list_with(point_model)
+        def get(self):
+            args = series_parser.parse_args()
+            truncate, length = RESOLUTIONS[args["resolution"]]
+            try:
+                end = parse_time(args["end"]) if args.get("end") else datetime.utcnow()
+                start = parse_time(args["start"]) if args.get("start") else truncate(end) - 59 * length
+            except ValueError as e:
+                api.abort(400, f"Invalid time range: {e}")
+            if (end - start) / length > MAX_SERIES_POINTS:
+                api.abort(400, f"At most {MAX_SERIES_POINTS} buckets per request; use a coarser resolution")
+            query = db.session.query(IncidentRollupModel.bucket_start, IncidentRollupModel.count).filter(
+                IncidentRollupModel.resolution == args["resolution"],
+                IncidentRollupModel.dimension == args["dimension"],
+                IncidentRollupModel.key == args["key"],
+                IncidentRollupModel.bucket_start >= truncate(start),
+                IncidentRollupModel.bucket_start < end,
+            ).order_by(IncidentRollupModel.bucket_start)
+            return [{"bucket_start": bucket_start, "count": count} for bucket_start, count in query.all()]
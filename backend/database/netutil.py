@@ -0,0 +1,28 @@
+import ipaddress
+
+
+def pack_ip(value):
+    """Packs an IP address into 4 (IPv4, including IPv4-mapped IPv6) or 16 bytes; None if it isn't one."""
+    if not value:
+        return None
+    try:
+        address = ipaddress.ip_address(value)
+    except ValueError:
+        return None
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.packed
+
+
+def parse_ip(value):
+    """pack_ip for query arguments; raises ValueError for anything that isn't an IP address."""
+    packed = pack_ip(value)
+    if packed is None:
+        raise ValueError(f"Invalid IP address: {value}")
+    return packed
+
+
+def unpack_ip(packed):
+    if packed is None:
+        return None
+    return str(ipaddress.ip_address(bytes(packed)))
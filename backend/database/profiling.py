@@ -0,0 +1,253 @@
+"""
+Opt-in request profiling (PROFILING=true).
+
+Every request is timed in three parts: SQL (cursor execute time, summed over all
+queries), marshalling (flask-restx marshal_with, or RowSerializer on the list
+endpoints) and JSON encoding. The split is sent back in a Server-Timing header,
+so it shows up in the browser's network panel.
+Statements that run PROFILING_N_PLUS_ONE times or more within one request are
+logged as likely N+1 patterns. Queries slower than PROFILING_SLOW_QUERY_MS go to
+a bounded slow-query log, including those from the ingest writer thread.
+GET /debug/perf summarizes all of it per endpoint; DELETE resets it.
+
+Profiling wraps flask_restx.marshalling.marshal and RowSerializer.__call__ and
+listens on every engine, so leave it off in production unless you are chasing
+something.
+"""
+import collections
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+
+import flask_restx.marshalling
+from flask import g, has_request_context, request
+from flask_restx import Resource
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from database.serialize import RowSerializer
+
+PROFILING = os.getenv("PROFILING", "false").strip().lower() in {"1", "true", "yes"}
+PROFILING_SLOW_QUERY_MS = float(os.getenv("PROFILING_SLOW_QUERY_MS", "100"))
+PROFILING_N_PLUS_ONE = int(os.getenv("PROFILING_N_PLUS_ONE", "10"))
+PROFILING_SLOW_LOG_SIZE = int(os.getenv("PROFILING_SLOW_LOG_SIZE", "200"))
+# request latencies kept per endpoint for the percentiles in /debug/perf
+PROFILING_SAMPLES = int(os.getenv("PROFILING_SAMPLES", "1000"))
+
+logger = logging.getLogger("perf")
+_whitespace = re.compile(r"\s+")
+
+
+def _statement_text(statement):
+    return _whitespace.sub(" ", statement).strip()[:1000]
+
+
+class RequestStats:
+    """Timings of the current request, kept on flask.g."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.db = 0.0
+        self.marshal = 0.0
+        self.encode = 0.0
+        self.queries = 0
+        self.statements = collections.Counter()
+        self.marshal_depth = 0
+
+
+class PerfCollector:
+    """Aggregates finished requests and slow queries; shared by all request threads."""
+
+    def __init__(self, slow_query_ms=PROFILING_SLOW_QUERY_MS, n_plus_one=PROFILING_N_PLUS_ONE,
+                 slow_log_size=PROFILING_SLOW_LOG_SIZE, samples=PROFILING_SAMPLES):
+        self.slow_query_ms = slow_query_ms
+        self.n_plus_one = n_plus_one
+        self.slow_log_size = slow_log_size
+        self.samples = samples
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self._endpoints = {}
+            self._slow_queries = collections.deque(maxlen=self.slow_log_size)
+            self._n_plus_one = {}
+            self._since = datetime.now(timezone.utc)
+
+    def record_query(self, statement, elapsed):
+        stats = g.get("perf") if has_request_context() else None
+        if stats is not None:
+            stats.db += elapsed
+            stats.queries += 1
+            stats.statements[statement] += 1
+        ms = elapsed * 1000.0
+        if ms >= self.slow_query_ms:
+            endpoint = _endpoint() if has_request_context() else "background"
+            logger.warning("Slow query (%.1f ms, %s): %s", ms, endpoint, _statement_text(statement))
+            with self._lock:
+                self._slow_queries.append({
+                    "at": datetime.now(timezone.utc).isoformat(),
+                    "endpoint": endpoint,
+                    "ms": round(ms, 2),
+                    "statement": _statement_text(statement),
+                })
+
+    def record_request(self, endpoint, stats, total):
+        repeated = [(statement, n) for statement, n in stats.statements.items() if n >= self.n_plus_one]
+        with self._lock:
+            entry = self._endpoints.get(endpoint)
+            if entry is None:
+                entry = self._endpoints[endpoint] = {
+                    "requests": 0, "total_ms": 0.0, "db_ms": 0.0, "marshal_ms": 0.0, "encode_ms": 0.0,
+                    "queries": 0, "max_queries": 0, "latencies": collections.deque(maxlen=self.samples),
+                }
+            entry["requests"] += 1
+            entry["total_ms"] += total * 1000.0
+            entry["db_ms"] += stats.db * 1000.0
+            entry["marshal_ms"] += stats.marshal * 1000.0
+            entry["encode_ms"] += stats.encode * 1000.0
+            entry["queries"] += stats.queries
+            entry["max_queries"] = max(entry["max_queries"], stats.queries)
+            entry["latencies"].append(total * 1000.0)
+            for statement, n in repeated:
+                key = (endpoint, statement)
+                seen = self._n_plus_one.get(key)
+                if seen is None:
+                    logger.warning("Possible N+1 in %s: statement ran %d times in one request: %s",
+                                   endpoint, n, _statement_text(statement))
+                    seen = self._n_plus_one[key] = {"requests": 0, "max_repeats": 0}
+                seen["requests"] += 1
+                seen["max_repeats"] = max(seen["max_repeats"], n)
+
+    def summary(self):
+        with self._lock:
+            endpoints = {}
+            for endpoint, entry in self._endpoints.items():
+                n = entry["requests"]
+                latencies = sorted(entry["latencies"])
+                endpoints[endpoint] = {
+                    "requests": n,
+                    "avg_ms": round(entry["total_ms"] / n, 2),
+                    "p50_ms": round(_percentile(latencies, 50), 2),
+                    "p95_ms": round(_percentile(latencies, 95), 2),
+                    "max_ms": round(latencies[-1], 2),
+                    "avg_db_ms": round(entry["db_ms"] / n, 2),
+                    "avg_marshal_ms": round(entry["marshal_ms"] / n, 2),
+                    "avg_encode_ms": round(entry["encode_ms"] / n, 2),
+                    "avg_queries": round(entry["queries"] / n, 2),
+                    "max_queries": entry["max_queries"],
+                }
+            return {
+                "since": self._since.isoformat(),
+                "slow_query_ms": self.slow_query_ms,
+                "n_plus_one_threshold": self.n_plus_one,
+                "endpoints": endpoints,
+                "n_plus_one": [
+                    dict(endpoint=endpoint, statement=_statement_text(statement), **seen)
+                    for (endpoint, statement), seen in self._n_plus_one.items()
+                ],
+                "slow_queries": list(self._slow_queries),
+            }
+
+
+def _percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def _endpoint():
+    rule = request.url_rule
+    return f"{request.method} {rule.rule if rule is not None else request.path}"
+
+
+collector = PerfCollector()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("perf_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["perf_started"].pop()
+    collector.record_query(statement, time.perf_counter() - started)
+
+
+def _timed_marshal(marshal):
+    def wrapper(*args, **kwargs):
+        stats = g.get("perf") if has_request_context() else None
+        if stats is None or stats.marshal_depth:
+            # nested fields marshal recursively; only the outermost call is timed
+            return marshal(*args, **kwargs)
+        stats.marshal_depth += 1
+        started = time.perf_counter()
+        db_before = stats.db
+        try:
+            return marshal(*args, **kwargs)
+        finally:
+            stats.marshal_depth -= 1
+            # lazy loads triggered by fields count as db, not marshal
+            stats.marshal += time.perf_counter() - started - (stats.db - db_before)
+    wrapper.__wrapped__ = marshal
+    return wrapper
+
+
+def _timed_representation(output_json):
+    def output(data, code, headers=None):
+        stats = g.get("perf")
+        started = time.perf_counter()
+        response = output_json(data, code, headers)
+        if stats is not None:
+            stats.encode += time.perf_counter() - started
+        return response
+    return output
+
+
+def _start_request():
+    g.perf = RequestStats()
+
+
+def _finish_request(response):
+    stats = g.pop("perf", None)
+    if stats is None or request.path.startswith("/debug/"):
+        return response
+    total = time.perf_counter() - stats.started
+    app_time = max(0.0, total - stats.db - stats.marshal - stats.encode)
+    response.headers["Server-Timing"] = ", ".join([
+        f'db;dur={stats.db * 1000.0:.2f};desc="{stats.queries} queries"',
+        f"marshal;dur={stats.marshal * 1000.0:.2f}",
+        f"encode;dur={stats.encode * 1000.0:.2f}",
+        f"app;dur={app_time * 1000.0:.2f}",
+        f"total;dur={total * 1000.0:.2f}",
+    ])
+    collector.record_request(_endpoint(), stats, total)
+    return response
+
+
+def setup_profiling(app, api):
+    """Registers the request hooks, the SQL listeners and /debug/perf."""
+    # create_app() may run more than once per process (setup_database.py imports main); count each query once
+    if not event.contains(Engine, "before_cursor_execute", _before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
+    if not hasattr(flask_restx.marshalling.marshal, "__wrapped__"):
+        flask_restx.marshalling.marshal = _timed_marshal(flask_restx.marshalling.marshal)
+    if not hasattr(RowSerializer.__call__, "__wrapped__"):
+        RowSerializer.__call__ = _timed_marshal(RowSerializer.__call__)
+    api.representations["application/json"] = _timed_representation(api.representations["application/json"])
+    app.before_request(_start_request)
+    app.after_request(_finish_request)
+
+    ns = api.namespace("debug", description="Profiling (PROFILING=true only)")
+
+    @ns.route("/perf")
+    class PerfSummary(Resource):
+        @ns.doc(description="Per-endpoint timing split (db, marshal, encode), query counts, N+1 suspects and the slow-query log")
+        def get(self):
+            return collector.summary()
+
+        @ns.doc(description="Clear the collected timings")
+        def delete(self):
+            collector.reset()
+            return "", 204
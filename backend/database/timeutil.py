@@ -0,0 +1,17 @@
+from datetime import datetime, timezone
+
+
+def parse_time(value):
+    """
+    Accepts a unix timestamp or an ISO 8601 string; returns naive UTC like the stored timestamps.
+    Raises ValueError for anything else, including timestamps out of datetime's range.
+    """
+    try:
+        return datetime.fromtimestamp(float(value), timezone.utc).replace(tzinfo=None)
+    except (OverflowError, OSError) as e:
+        raise ValueError(f"timestamp out of range: {value}") from e
+    except ValueError:
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is not None:
+            parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+        return parsed
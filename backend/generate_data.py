@@ -0,0 +1,182 @@
+# fills the database (DATABASE_URL) with synthetic honeypots and incidents for load testing
+#
+#   python generate_data.py --honeypots 1000 --incidents 10000000 --days 30
+#
+# Distributions roughly follow what the sensors see: a few honeypots and a few
+# source IPs account for most incidents, scanners and SSH libraries dominate the
+# client families, and most incidents are low or moderate severity.
+
+import argparse
+import ipaddress
+import random
+import time
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from database.db import db
+from database.netutil import pack_ip
+from database.geoip import lookup as geoip_lookup
+from database.models.HoneyPotModel import HoneyPotModel
+from database.models.IncidentLogModel import IncidentLogModel
+from database.models.DictionaryModel import intern_value
+from database.models.IncidentRollupModel import IncidentRollupModel, record_incidents
+from database.models.CampaignModel import CampaignModel, rebuild_campaigns
+from main import create_app
+
+CATEGORIES = {  # honeypot server category -> (weight, incident category, typical destination port)
+    "ssh": (30, "network", 22), "sftp": (5, "network", 22), "web": (20, "software", 80),
+    "api": (5, "api", 443), "telnet": (10, "network", 23), "iot": (8, "iot", 1883),
+    "scada": (4, "network", 502), "ftp": (5, "network", 21), "database": (5, "software", 5432),
+    "rdp": (4, "network", 3389), "email": (2, "email", 25), "dns": (2, "network", 53),
+}
+FAMILIES = [  # (family, weight, client ident)
+    ("Go", 25, "SSH-2.0-Go"), ("libssh", 15, "SSH-2.0-libssh_0.9.6"), ("OpenSSH", 15, "SSH-2.0-OpenSSH_8.9p1"),
+    ("Paramiko", 10, "SSH-2.0-paramiko_2.11.0"), ("ZGrab", 8, "SSH-2.0-ZGrab ZGrab SSH Survey"),
+    ("libssh2", 6, "SSH-2.0-libssh2_1.10.0"), ("Botnet", 6, "SSH-2.0-MGLNDD_1.2.3.4_22"),
+    ("Nmap", 3, "SSH-2.0-Nmap-SSH2-Hostkey"), ("PuTTY", 2, "SSH-2.0-PuTTY_Release_0.78"),
+    ("http", 4, None), ("tls", 3, None), ("generic", 3, "SSH-2.0-Test"),
+]
+REASONS = {"http": "wrong_protocol_http", "tls": "wrong_protocol_tls"}
+SEVERITIES = [("low", 50, 3), ("moderate", 40, 5), ("critical", 10, 8)]
+CITIES = [
+    ("Berlin", "52.5200,13.4050"), ("Warsaw", "52.2297,21.0122"), ("Frankfurt", "50.1109,8.6821"),
+    ("Amsterdam", "52.3676,4.9041"), ("Paris", "48.8566,2.3522"), ("Stockholm", "59.3293,18.0686"),
+    ("Madrid", "40.4168,-3.7038"), ("Vienna", "48.2082,16.3738"), ("Prague", "50.0755,14.4378"),
+    ("Singapore", "1.3521,103.8198"), ("Virginia", "38.9072,-77.0369"), ("Tokyo", "35.6762,139.6503"),
+]
+
+
+def zipf_weights(n, s=1.1):
+    return [1.0 / (rank ** s) for rank in range(1, n + 1)]
+
+
+def random_public_ip(rng):
+    while True:
+        ip = ipaddress.IPv4Address(rng.getrandbits(32))
+        if ip.is_global:
+            return str(ip)
+
+
+def generate_honeypots(count, rng):
+    names = list(CATEGORIES)
+    weights = [CATEGORIES[name][0] for name in names]
+    rows = []
+    for i in range(count):
+        category = rng.choices(names, weights)[0]
+        city, geolocation = rng.choice(CITIES)
+        rows.append({
+            "name": f"{city} {category.upper()} Honeypot {i + 1}",
+            "server_category": category,
+            "description": f"Synthetic {category} honeypot",
+            "creation_date": datetime.utcnow() - timedelta(days=rng.randint(0, 365)),
+            "status": rng.choices(["open", "closed"], [9, 1])[0],
+            "geolocation": geolocation,
+            "behaviors": category,
+        })
+    db.session.execute(HoneyPotModel.__table__.insert(), rows)
+    db.session.commit()
+    return db.session.query(HoneyPotModel.id, HoneyPotModel.server_category).order_by(HoneyPotModel.id).all()
+
+
+def generate_incidents(count, honeypots, days, source_pool, batch_size, rng):
+    honeypot_weights = zipf_weights(len(honeypots), 0.9)
+    rng.shuffle(honeypot_weights)  # the busiest honeypots are not simply the first ones
+    sources = [pack_ip(random_public_ip(rng)) for _ in range(source_pool)]
+    # (country, asn, as_org id) per source; all None unless GEOIP_DB is set
+    origins = {}
+    for source in sources:
+        country, asn, as_org = geoip_lookup(source)
+        origins[source] = (country, asn, intern_value("as_org", as_org))
+    source_weights = zipf_weights(source_pool)
+    families = [(family, weight, ident, intern_value("family", family),
+                 intern_value("reason", REASONS.get(family, "ssh_ident")),
+                 intern_value("client_ident", ident)) for family, weight, ident in FAMILIES]
+    family_weights = [family[1] for family in families]
+    severity_weights = [severity[1] for severity in SEVERITIES]
+    db.session.commit()
+
+    end = datetime.utcnow()
+    step = timedelta(days=days) / max(count, 1)
+    started = time.monotonic()
+    table = IncidentLogModel.__table__
+    for offset in range(0, count, batch_size):
+        n = min(batch_size, count - offset)
+        honeypot_picks = rng.choices(honeypots, honeypot_weights, k=n)
+        source_picks = rng.choices(sources, source_weights, k=n)
+        family_picks = rng.choices(families, family_weights, k=n)
+        severity_picks = rng.choices(SEVERITIES, severity_weights, k=n)
+        rows = []
+        rollup_items = []
+        for i in range(n):
+            # ids grow with time, as they do on live ingest
+            timestamp = end - timedelta(days=days) + step * (offset + i)
+            honeypot_id, server_category = honeypot_picks[i]
+            family, _, ident, family_id, reason_id, ident_id = family_picks[i]
+            severity, _, severity_number = severity_picks[i]
+            _, category, port = CATEGORIES[server_category]
+            country, asn, as_org_id = origins[source_picks[i]]
+            rows.append({
+                "title": f"{server_category.upper()} honeypot connection",
+                "category": category,
+                "description": f"{family} client connected",
+                "timestamp": timestamp,
+                "severity": severity,
+                "honeypot_id": honeypot_id,
+                "severity_number": severity_number,
+                "source_ip": source_picks[i],
+                "source_port": rng.randint(1024, 65535),
+                "destination_port": port,
+                "network_bytes": rng.randint(0, 1024),
+                "family_id": family_id,
+                "reason_id": reason_id,
+                "client_ident_id": ident_id,
+                "count_last_min": rng.randint(1, 90),
+                "rate_limited": severity == "critical",
+                "country": country,
+                "asn": asn,
+                "as_org_id": as_org_id,
+            })
+            rollup_items.append(SimpleNamespace(
+                timestamp=timestamp, honeypot_id=honeypot_id, severity=severity, category=category, family=family,
+                country=country,
+            ))
+        db.session.execute(table.insert(), rows)
+        record_incidents(rollup_items)
+        db.session.commit()
+        done = offset + n
+        rate = done / max(time.monotonic() - started, 1e-9)
+        print(f"\r{done}/{count} incidents ({rate:,.0f}/s)", end="", flush=True)
+    print()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fill the database with synthetic honeypots and incidents")
+    parser.add_argument("--honeypots", type=int, default=1000)
+    parser.add_argument("--incidents", type=int, default=1000000)
+    parser.add_argument("--days", type=float, default=30, help="incidents are spread over the last N days")
+    parser.add_argument("--sources", type=int, default=50000, help="distinct attacker IPs")
+    parser.add_argument("--batch-size", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=42, help="same seed, same data")
+    parser.add_argument("--reset", action="store_true", help="delete existing honeypots, incidents and rollups first")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    app = create_app()
+    with app.app_context():
+        db.create_all()
+        if args.reset:
+            db.session.query(IncidentRollupModel).delete()
+            db.session.query(IncidentLogModel).delete()
+            db.session.query(CampaignModel).delete()
+            db.session.query(HoneyPotModel).delete()
+            db.session.commit()
+        honeypots = generate_honeypots(args.honeypots, rng)
+        print(f"{len(honeypots)} honeypots")
+        generate_incidents(args.incidents, honeypots, args.days, args.sources, args.batch_size, rng)
+        started = time.monotonic()
+        rebuild_campaigns(IncidentLogModel)
+        print(f"{db.session.query(CampaignModel).count()} campaigns ({time.monotonic() - started:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,13 @@
 from flask import Flask
 from flask_restx import Api
-from database.db import db
-from database.models.IncidentLogModel import setup_routes as setup_incident_routes
+from database.db import db, DATABASE_URL, engine_options
+from database.ingest import INGEST_MODE
+from database.geoip import geoip_database
+from database.profiling import PROFILING, setup_profiling
+from database.models.IncidentLogModel import setup_routes as setup_incident_routes, ingest_queue
 from database.models.HoneyPotModel import setup_routes as setup_honeypot_routes
+from database.models.IncidentRollupModel import setup_routes as setup_analytics_routes
+from database.models.CampaignModel import setup_routes as setup_campaign_routes
 from flask_cors import CORS
 from werkzeug.middleware.proxy_fix import ProxyFix
 
@@ -12,8 +17,9 @@ def create_app():
     app.wsgi_app = ProxyFix(
         app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1
     )
-    CORS(app, origins=["http://localhost:5173"])
-    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///mydatabase.db"
+    CORS(app, origins=["http://localhost:5173"], expose_headers=["X-Next-Cursor", "Link", "Server-Timing"])
+    app.config["SQLALCHEMY_DATABASE_URI"] = DATABASE_URL
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options(DATABASE_URL)
     app.config["SQLALCHEMY_TRACK_MODIFICATIONS"] = False
 
     db.init_app(app)
@@ -23,6 +29,17 @@ def create_app():
 
     setup_incident_routes(api)
     setup_honeypot_routes(api)
+    setup_analytics_routes(api)
+    setup_campaign_routes(api)
+
+    if PROFILING:
+        setup_profiling(app, api)
+
+    # load GEOIP_DB now rather than stalling the first ingest
+    geoip_database()
+
+    if INGEST_MODE == "async":
+        ingest_queue.start(app)
 
     return app
 
@@ -3,6 +3,7 @@
 from database.db import db
 from database.models.HoneyPotModel import HoneyPotModel
 from database.models.IncidentLogModel import IncidentLogModel
+from database.models.IncidentRollupModel import rebuild_rollups
 from main import create_app
 
 app = create_app()
@@ -309,4 +310,7 @@ with app.app_context():
         honeypot_id=3
     ))
     db.session.commit()
-    print("Added initial incident logs.")
\ No newline at end of file
+    print("Added initial incident logs.")
+
+    rebuild_rollups(IncidentLogModel)
+    print("Built incident rollups.")
\ No newline at end of file
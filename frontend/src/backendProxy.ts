@@ -7,8 +7,10 @@ export async function getHoneypots() {
     return json as HoneypotType[]
 }
 
-export async function getIncidentLogs() {
-    const res = await fetch(BACKEND_ROOT_URL + "/IncidentLogs")
+// without sinceId this returns the newest page; with it only incidents with a higher id
+export async function getIncidentLogs(sinceId?: number) {
+    const query = sinceId === undefined ? "" : `?since_id=${sinceId}`
+    const res = await fetch(BACKEND_ROOT_URL + "/IncidentLogs/" + query)
     const json = await res.json()
     return json as IncidentLogType[]
 }
@@ -16,5 +16,19 @@ export interface IncidentLogType {
     description: string,
     timestamp: string,
     severity: string,
-    honeypot_id: number
+    honeypot_id: number,
+    severity_number?: number,
+    source_ip?: string,
+    source_port?: number,
+    destination_port?: number,
+    network_bytes?: number,
+    family?: string,
+    reason?: string,
+    client_ident?: string,
+    count_last_min?: number,
+    rate_limited?: boolean,
+    country?: string,
+    asn?: number,
+    as_org?: string,
+    campaign_id?: number
 }
\ No newline at end of file
@@ -0,0 +1,58 @@
+"""
+Slot accounting for concurrent connections.
+
+Every admitted connection holds one slot until handle_client returns. Past the
+global cap (MAX_CONNECTIONS) or the per-IP cap (MAX_CONN_PER_IP) a connection is
+refused straight away, before any read or classification. Tarpitting holds a
+connection open for TARPIT_SECONDS, so tarpitted connections draw from a smaller
+budget of their own (TARPIT_SLOTS) and are simply closed once it is spent.
+
+All of this runs on one event loop, so the counters are plain ints and a dict.
+In WORKERS mode every worker keeps its own counts.
+"""
+from __future__ import annotations
+
+from typing import Dict, Optional
+
+
+class Admission:
+    def __init__(self, max_connections: int = 0, max_per_ip: int = 0, tarpit_slots: int = 0):
+        """A limit of 0 disables that check."""
+        self.max_connections = max_connections
+        self.max_per_ip = max_per_ip
+        self.tarpit_slots = tarpit_slots
+        self.active = 0
+        self.tarpitted = 0
+        self.per_ip: Dict[str, int] = {}
+        self.stats = {"rejected_global": 0, "rejected_per_ip": 0, "tarpit_skipped": 0}
+
+    def admit(self, ip: str) -> Optional[str]:
+        """Takes a slot for ip; returns why the connection is refused instead ("global" or "per_ip")."""
+        if self.max_connections and self.active >= self.max_connections:
+            self.stats["rejected_global"] += 1
+            return "global"
+        count = self.per_ip.get(ip, 0)
+        if self.max_per_ip and count >= self.max_per_ip:
+            self.stats["rejected_per_ip"] += 1
+            return "per_ip"
+        self.per_ip[ip] = count + 1
+        self.active += 1
+        return None
+
+    def release(self, ip: str) -> None:
+        self.active -= 1
+        count = self.per_ip.get(ip, 0) - 1
+        if count > 0:
+            self.per_ip[ip] = count
+        else:
+            self.per_ip.pop(ip, None)
+
+    def acquire_tarpit(self) -> bool:
+        if self.tarpit_slots and self.tarpitted >= self.tarpit_slots:
+            self.stats["tarpit_skipped"] += 1
+            return False
+        self.tarpitted += 1
+        return True
+
+    def release_tarpit(self) -> None:
+        self.tarpitted -= 1
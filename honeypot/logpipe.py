@@ -0,0 +1,257 @@
+"""
+Log pipeline: the event loop only appends records to a queue; a writer thread formats
+them and writes each batch with a single write().
+
+Connection records are plain tuples (no LogRecord, no string formatting on the hot
+path). Each second the writer logs at most LOG_SAMPLE_PER_IP connections per source
+IP and LOG_MAX_PER_SECOND in total. The rest are folded into one summary line per
+second ("N connections from M sources not logged individually"), so a scan flood
+cannot turn into a log flood. Ordinary logging calls go through the same queue via
+LogPipe.handler() and are never sampled.
+
+Output is JSON lines (LOG_STYLE=json) or the classic text lines (LOG_STYLE=text).
+"""
+from __future__ import annotations
+
+import collections
+import datetime as _dt
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from typing import Dict, List, Optional, TextIO
+
+_CONNECTION = 0
+_RECORD = 1
+
+_TEXT_CONNECTION = "Handled %s:%d -> %s:%d | %s %s/%s bytes=%d count/min=%d%s"
+
+
+def _iso(ts: float) -> str:
+    return _dt.datetime.fromtimestamp(ts, _dt.timezone.utc).isoformat(timespec="milliseconds").replace("+00:00", "Z")
+
+
+class _PipeHandler(logging.Handler):
+    def __init__(self, pipe: "LogPipe"):
+        super().__init__()
+        self.pipe = pipe
+
+    def emit(self, record: logging.LogRecord) -> None:
+        # like QueueHandler: resolve the message now, the arguments may change later
+        try:
+            record.message = record.getMessage()
+            if record.exc_info and not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.msg, record.args, record.exc_info = record.message, None, None
+        except Exception:
+            self.handleError(record)
+            return
+        self.pipe.push_record(record)
+
+
+class LogPipe:
+    def __init__(
+        self,
+        style: str = "json",
+        sample_per_ip: int = 10,
+        max_per_second: int = 1000,
+        flush_ms: float = 200,
+        max_queue: int = 100000,
+        stream: Optional[TextIO] = None,
+    ):
+        """
+        sample_per_ip / max_per_second - connection lines per second written in full
+          (0 disables that limit)
+        flush_ms - how long the writer sleeps between batches
+        max_queue - records waiting for the writer; connection records beyond it are dropped
+        """
+        self.style = style
+        self.sample_per_ip = sample_per_ip
+        self.max_per_second = max_per_second
+        self.flush_interval = flush_ms / 1000.0
+        self.max_queue = max_queue
+        self.stream = stream
+        self.stats = {"written": 0, "suppressed": 0, "dropped": 0}
+        self._handler = _PipeHandler(self)
+        self._reset()
+
+    def _reset(self) -> None:
+        self._queue: collections.deque = collections.deque()
+        self._wake = threading.Event()
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+        self._pid = os.getpid()
+        # sampling state of the current one-second window (writer thread only)
+        self._window = 0
+        self._window_written = 0
+        self._per_ip: Dict[str, int] = {}
+        self._suppressed: Dict[str, int] = {}
+        self._dropped = 0
+
+    def handler(self) -> logging.Handler:
+        """A logging handler that sends ordinary log records through the pipe."""
+        return self._handler
+
+    def start(self) -> None:
+        """Starts the writer thread; in a forked child, starts over with an empty queue."""
+        if self._pid != os.getpid():
+            self._reset()  # the parent writes what was queued before the fork
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="log-writer", daemon=True)
+            self._thread.start()
+
+    def close(self, timeout: float = 2.0) -> None:
+        """Writes what is still queued and stops the writer."""
+        if self._thread is None:
+            self._write_batch()
+            return
+        self._stopping = True
+        self._wake.set()
+        self._thread.join(timeout)
+        self._thread = None
+
+    # hot path (event loop)
+
+    def connection(
+        self,
+        client_ip: str,
+        client_port: int,
+        local_ip: str,
+        local_port: int,
+        protocol: str,
+        family: str,
+        reason: str,
+        bytes_received: int,
+        count_last_min: int,
+        rate_limited: bool,
+    ) -> None:
+        if len(self._queue) >= self.max_queue:
+            self.stats["dropped"] += 1
+            return
+        self._queue.append((time.time(), _CONNECTION, (
+            client_ip, client_port, local_ip, local_port, protocol, family, reason,
+            bytes_received, count_last_min, rate_limited,
+        )))
+
+    def push_record(self, record: logging.LogRecord) -> None:
+        self._queue.append((record.created, _RECORD, record))
+        if record.levelno >= logging.ERROR:
+            self._wake.set()
+
+    # writer thread
+
+    def _run(self) -> None:
+        while not self._stopping:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            self._write_batch()
+        self._write_batch()
+
+    def _write_batch(self) -> None:
+        lines: List[str] = []
+        queue = self._queue
+        while queue:
+            ts, kind, payload = queue.popleft()
+            if kind == _RECORD:
+                lines.append(self._format_record(payload))
+                continue
+            second = int(ts)
+            if second != self._window:
+                self._close_window(lines, second)
+            if self._sampled(payload[0]):
+                lines.append(self._format_connection(ts, payload))
+        if int(time.time()) > self._window:
+            self._close_window(lines, int(time.time()))
+        if lines:
+            self.stats["written"] += len(lines)
+            stream = self.stream or sys.stdout
+            try:
+                stream.write("".join(lines))
+                stream.flush()
+            except (OSError, ValueError):
+                pass
+
+    def _sampled(self, client_ip: str) -> bool:
+        count = self._per_ip.get(client_ip, 0) + 1
+        self._per_ip[client_ip] = count
+        if (self.sample_per_ip and count > self.sample_per_ip) or (
+            self.max_per_second and self._window_written >= self.max_per_second
+        ):
+            self._suppressed[client_ip] = self._suppressed.get(client_ip, 0) + 1
+            return False
+        self._window_written += 1
+        return True
+
+    def _close_window(self, lines: List[str], next_window: int) -> None:
+        dropped = self.stats["dropped"] - self._dropped
+        if self._suppressed or dropped:
+            lines.append(self._format_summary(self._window, dropped))
+            self.stats["suppressed"] += sum(self._suppressed.values())
+            self._dropped = self.stats["dropped"]
+        self._window = next_window
+        self._window_written = 0
+        self._per_ip = {}
+        self._suppressed = {}
+
+    # formatting
+
+    def _format_connection(self, ts: float, c: tuple) -> str:
+        client_ip, client_port, local_ip, local_port, protocol, family, reason, nbytes, count, rate_limited = c
+        if self.style == "text":
+            message = _TEXT_CONNECTION % (
+                client_ip, client_port, local_ip, local_port, protocol, family, reason, nbytes, count,
+                " [RL]" if rate_limited else "",
+            )
+            return self._text_line(ts, "INFO", message)
+        return json.dumps({
+            "@timestamp": _iso(ts),
+            "level": "INFO",
+            "event": "connection",
+            "source": {"ip": client_ip, "port": client_port},
+            "destination": {"ip": local_ip, "port": local_port},
+            "protocol": protocol,
+            "classification": {"family": family, "reason": reason},
+            "bytes": nbytes,
+            "rate": {"count_last_min": count, "rate_limited": rate_limited},
+        }) + "\n"
+
+    def _format_summary(self, window: int, dropped: int) -> str:
+        total = sum(self._suppressed.values())
+        top = sorted(self._suppressed.items(), key=lambda kv: -kv[1])[:5]
+        ts = float(window + 1)
+        if self.style == "text":
+            message = "%d connections from %d sources not logged individually in the last second (top: %s)" % (
+                total, len(self._suppressed), ", ".join(f"{ip}={n}" for ip, n in top) or "-",
+            )
+            if dropped:
+                message += "; %d dropped, log queue full" % dropped
+            return self._text_line(ts, "INFO", message)
+        return json.dumps({
+            "@timestamp": _iso(ts),
+            "level": "INFO",
+            "event": "connections_suppressed",
+            "window_seconds": 1,
+            "suppressed": total,
+            "sources": len(self._suppressed),
+            "top_sources": [{"ip": ip, "connections": n} for ip, n in top],
+            "dropped": dropped,
+        }) + "\n"
+
+    def _format_record(self, record: logging.LogRecord) -> str:
+        if self.style == "text":
+            return self._handler.format(record) + "\n"
+        entry = {
+            "@timestamp": _iso(record.created),
+            "level": record.levelname,
+            "event": "log",
+            "message": record.message,
+        }
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry) + "\n"
+
+    def _text_line(self, ts: float, level: str, message: str) -> str:
+        local = time.localtime(ts)
+        return "%s,%03d %s %s\n" % (time.strftime("%Y-%m-%d %H:%M:%S", local), int(ts * 1000) % 1000, level, message)
@@ -3,12 +3,43 @@
 Environment variables (all optional):
   LISTEN_HOST="0.0.0.0" (use "::" for dual-stack on many distros)
   LISTEN_PORT="2222"
+  LISTENERS="ssh:2222"     (comma-separated protocol:port[:honeypot_id]; protocols: ssh, http, telnet, ftp, mqtt, modbus;
+                            defaults to ssh on LISTEN_PORT, honeypot_id defaults to HONEYPOT_ID)
   CENTRAL_ALERT_URL="https://alerts.example.com/honeypot"
   READ_TIMEOUT="3.0"       (seconds)
   READ_LIMIT="1024"        (bytes, pre-auth only)
   ALERT_TIMEOUT="2.0"      (seconds for HTTP POST timeout)
+  ALERT_BATCH_SIZE="500"   (max alerts per bulk POST; 1 posts each alert to CENTRAL_ALERT_URL)
+  ALERT_BATCH_MS="250"     (max time an alert waits for its batch to fill)
+  CENTRAL_BULK_URL=""      (defaults to CENTRAL_ALERT_URL + "/bulk")
+  ALERT_CONCURRENCY="4"    (alert POSTs in flight at once, each on its own keep-alive connection)
+  ALERT_STATS_SECONDS="60" (interval of the sent/failed/dropped alert log line; 0 disables)
+  ALERT_SPOOL_DIR=""       (directory for the on-disk alert spool; empty disables it)
+  ALERT_SPOOL_MAX_MB="256" (spool size cap; the oldest segments are evicted beyond it)
+  ALERT_SPOOL_SEGMENT_MB="16"
+  ALERT_SPOOL_FSYNC_MS="1000" (spooled alerts are fsynced at most this often)
   MAX_CONN_PER_MIN="60"    (per source IP; 0 disables rate limiting)
-  TARPIT_SECONDS="0"       (extra delay applied to abusers; 0 disables)
+  WORKERS="1"              (>1 forks that many listener processes sharing the listener ports via SO_REUSEPORT)
+  RATE_MAX_IPS="65536"     (source IPs the rate limiter tracks at once; fixed memory, idle/LRU IPs evicted)
+  TARPIT_SECONDS="0"       (how long abusers are held before the connection is closed; 0 disables)
+  TARPIT_MODE="delay"      ("delay" holds abusers after the exchange; "drip" skips the exchange and drips
+                            endless pre-banner lines (SSH), header lines (HTTP) or greeting lines (FTP) instead)
+  TARPIT_DRIP_SECONDS="10" (interval between drip lines)
+  MAX_CONNECTIONS="-1"     (connections handled at once per process; -1 uses the open file limit minus 128, 0 disables)
+  MAX_CONN_PER_IP="32"     (connections handled at once per source IP; 0 disables)
+  TARPIT_SLOTS="256"       (abusers held in the tarpit at once; beyond that they are closed without delay)
+  REJECT_MODE="rst"        (connections over a cap are reset; "banner" sends a busy reply, e.g. HTTP 503, then closes)
+  LISTEN_BACKLOG="1024"    (accept queue per listener; the kernel caps it at net.core.somaxconn)
+  SIGNATURES_FILE="signatures.json" (extra client ident signatures; empty uses the built-in ones only)
+  METRICS_PORT=""          (serve Prometheus metrics on http://METRICS_HOST:METRICS_PORT/metrics; empty disables.
+                            With WORKERS>1 the parent serves alert delivery metrics on this port and
+                            worker i its connection metrics on METRICS_PORT+1+i)
+  METRICS_HOST="127.0.0.1"
+  LOG_STYLE="json"         (log output on stdout: "json" lines or "text")
+  LOG_SAMPLE_PER_IP="10"   (connection lines per source IP per second; the rest are summarized; 0 logs all)
+  LOG_MAX_PER_SECOND="1000" (connection lines per second in total; the rest are summarized; 0 disables)
+  LOG_FLUSH_MS="200"       (the log writer thread writes a batch this often)
+  LOG_QUEUE_MAX="100000"   (log records waiting for the writer; connection lines beyond it are dropped)
   BANNER="SSH-2.0-OpenSSH_8.9p1 Ubuntu-3"
   BANNER_ROTATE="false"    ("true" rotates through BANNERS per connection)
   BANNERS="SSH-2.0-OpenSSH_8.9p1 Ubuntu-3;SSH-2.0-OpenSSH_8.4p1 Debian-5;SSH-2.0-OpenSSH_7.6p1 Ubuntu-4ubuntu0.3"
@@ -17,19 +48,30 @@ from __future__ import annotations
 
 import asyncio
 import datetime as _dt
+import functools
 import logging
+import multiprocessing
 import os
 import queue
 import random
+import resource
 import signal
 import socket
+import struct
 import sys
 import threading
 import time
-from collections import defaultdict, deque
-from typing import Deque, Dict, Tuple
-
-import requests
+from typing import List, NamedTuple, Optional, Tuple, Union
+
+from protocols import PROTOCOLS, Exchange, Protocol, SSHProtocol
+from admission import Admission
+from logpipe import LogPipe
+from metrics import DURATION_BUCKETS, LATENCY_BUCKETS, Registry
+from ratelimit import BoundedRateLimiter, SharedRateTable
+from sender import AlertSender
+from signatures import IdentClassifier
+from spool import AlertSpool
+from tarpit import Held, Tarpit
 
 __version__ = "0.4.0"
 
@@ -37,6 +79,7 @@ __version__ = "0.4.0"
 LISTEN_HOST = os.getenv("LISTEN_HOST", "0.0.0.0")
 LISTEN_PORT = int(os.getenv("LISTEN_PORT", "2222"))
 HONEYPOT_ID = int(os.getenv("HONEYPOT_ID", "1"))
+LISTENERS = os.getenv("LISTENERS", "") or f"ssh:{LISTEN_PORT}"
 CENTRAL_ALERT_URL = os.getenv(
     "CENTRAL_ALERT_URL", ""
 )  # e.g. https://alerts.example.com/honeypot
@@ -44,8 +87,38 @@ CENTRAL_ALERT_URL = os.getenv(
 READ_TIMEOUT = float(os.getenv("READ_TIMEOUT", "3.0"))
 READ_LIMIT = int(os.getenv("READ_LIMIT", "1024"))
 ALERT_TIMEOUT = float(os.getenv("ALERT_TIMEOUT", "2.0"))
+ALERT_BATCH_SIZE = max(1, int(os.getenv("ALERT_BATCH_SIZE", "500")))
+ALERT_BATCH_MS = float(os.getenv("ALERT_BATCH_MS", "250"))
+ALERT_CONCURRENCY = max(1, int(os.getenv("ALERT_CONCURRENCY", "4")))
+ALERT_STATS_SECONDS = float(os.getenv("ALERT_STATS_SECONDS", "60"))
+ALERT_SPOOL_DIR = os.getenv("ALERT_SPOOL_DIR", "")
+ALERT_SPOOL_MAX_MB = float(os.getenv("ALERT_SPOOL_MAX_MB", "256"))
+ALERT_SPOOL_SEGMENT_MB = float(os.getenv("ALERT_SPOOL_SEGMENT_MB", "16"))
+ALERT_SPOOL_FSYNC_MS = float(os.getenv("ALERT_SPOOL_FSYNC_MS", "1000"))
+CENTRAL_BULK_URL = os.getenv("CENTRAL_BULK_URL", "") or (
+    CENTRAL_ALERT_URL.rstrip("/") + "/bulk" if CENTRAL_ALERT_URL else ""
+)
 MAX_CONN_PER_MIN = int(os.getenv("MAX_CONN_PER_MIN", "60"))
 TARPIT_SECONDS = float(os.getenv("TARPIT_SECONDS", "0"))
+TARPIT_MODE = os.getenv("TARPIT_MODE", "delay").strip().lower()
+TARPIT_DRIP_SECONDS = float(os.getenv("TARPIT_DRIP_SECONDS", "10"))
+MAX_CONNECTIONS = int(os.getenv("MAX_CONNECTIONS", "-1"))
+MAX_CONN_PER_IP = int(os.getenv("MAX_CONN_PER_IP", "32"))
+TARPIT_SLOTS = int(os.getenv("TARPIT_SLOTS", "256"))
+REJECT_MODE = os.getenv("REJECT_MODE", "rst").strip().lower()
+LISTEN_BACKLOG = int(os.getenv("LISTEN_BACKLOG", "1024"))
+WORKERS = max(1, int(os.getenv("WORKERS", "1")))
+RATE_MAX_IPS = int(os.getenv("RATE_MAX_IPS", "65536"))
+SIGNATURES_FILE = os.getenv(
+    "SIGNATURES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "signatures.json")
+)
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "") or "0")
+LOG_STYLE = os.getenv("LOG_STYLE", "json").strip().lower()
+LOG_SAMPLE_PER_IP = int(os.getenv("LOG_SAMPLE_PER_IP", "10"))
+LOG_MAX_PER_SECOND = int(os.getenv("LOG_MAX_PER_SECOND", "1000"))
+LOG_FLUSH_MS = float(os.getenv("LOG_FLUSH_MS", "200"))
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "100000"))
 
 _DEFAULT_BANNER = os.getenv("BANNER", "SSH-2.0-OpenSSH_8.9p1 Ubuntu-3")
 BANNER_ROTATE = os.getenv("BANNER_ROTATE", "false").strip().lower() in {
@@ -60,40 +133,112 @@ _BANNERS = os.getenv(
 BANNERS = [b.strip() for b in _BANNERS if b.strip()] or [_DEFAULT_BANNER]
 
 LOG_FORMAT = "%(asctime)s %(levelname)s %(message)s"
-logging.basicConfig(level=logging.INFO, format=LOG_FORMAT)
+# records are queued here and written in batches by a thread; see logpipe.py
+log_pipe = LogPipe(LOG_STYLE, LOG_SAMPLE_PER_IP, LOG_MAX_PER_SECOND, LOG_FLUSH_MS, LOG_QUEUE_MAX)
+logging.basicConfig(level=logging.INFO, format=LOG_FORMAT, handlers=[log_pipe.handler()])
 
 
 shutdown_event = asyncio.Event()
-alert_q: "queue.Queue[Tuple[str, dict]]" = queue.Queue(maxsize=10000)
-ip_hits: Dict[str, Deque[float]] = defaultdict(deque)
-
-
-def _post_alert_worker():
-    """Background worker to POST alerts with basic retries and timeouts."""
-    session = requests.Session()
-    while True:
-        item = alert_q.get()
-        if item is None:
-            break
-        url, payload = item
-        if not url:
-            continue
-        for attempt in range(3):
-            try:
-                session.post(url, json=payload, timeout=ALERT_TIMEOUT)
-                break
-            except Exception as e:
-                if attempt == 2:
-                    logging.warning("Alert POST failed (giving up): %s", e)
-                time.sleep(0.5 * (2**attempt))
+# batched HTTP sender on the event loop of the process that posts alerts
+alert_sender: Optional[AlertSender] = None
+# WORKERS mode: workers hand alerts to the parent process through this queue
+alert_q: "Optional[multiprocessing.Queue]" = None
+# per-IP connection counts over the last minute; a shared-memory table in WORKERS mode
+rate_limiter: Union[BoundedRateLimiter, SharedRateTable] = BoundedRateLimiter(RATE_MAX_IPS)
+ident_classifier = IdentClassifier.from_file(SIGNATURES_FILE)
+# concurrent connection slots; main() sets the global cap once the open file limit is known
+admission = Admission(max_per_ip=MAX_CONN_PER_IP, tarpit_slots=TARPIT_SLOTS)
+# connections kept open after their exchange (tarpit, response delays) live on its timer wheel
+tarpit = Tarpit()
+_last_refusal_log = 0.0
+
+metrics = Registry()
+m_connections = metrics.counter("decoy_connections_total", "Accepted connections", ["protocol"])
+m_active = metrics.gauge("decoy_connections_active", "Connections currently open", ["protocol"])
+m_rate_limited = metrics.counter(
+    "decoy_connections_rate_limited_total", "Connections over MAX_CONN_PER_MIN", ["protocol"]
+)
+m_refused = metrics.counter(
+    "decoy_connections_refused_total", "Connections refused by admission control", ["protocol", "reason"]
+)
+m_classified = metrics.counter(
+    "decoy_classifications_total", "Handled connections by classification", ["protocol", "family", "reason"]
+)
+m_duration = metrics.histogram(
+    "decoy_connection_duration_seconds", "Time from accept to close", DURATION_BUCKETS, ["protocol"]
+)
+m_alert_post = metrics.histogram(
+    "decoy_alert_post_seconds", "Alert POST round trips to the central server", LATENCY_BUCKETS, ["outcome"]
+)
+metrics.callback("decoy_alert_queue_depth", "Alerts waiting in the sender queue", lambda: alert_sender.queue.qsize())
+metrics.callback(
+    "decoy_alerts_total", "Alerts by delivery outcome",
+    lambda: {(key,): alert_sender.stats[key] for key in ("sent", "failed", "dropped")},
+    ["outcome"], kind="counter",
+)
+metrics.callback("decoy_alert_retries_total", "Retried alert POSTs", lambda: alert_sender.stats["retries"], kind="counter")
+metrics.callback(
+    "decoy_alert_spool_bytes", "Alerts spooled to disk and not yet replayed", lambda: alert_sender.spool.pending_bytes()
+)
+metrics.callback("decoy_worker_alert_queue_depth", "Alerts waiting to reach the parent (WORKERS mode)", lambda: alert_q.qsize())
+metrics.callback("decoy_tarpit_active", "Connections held in the tarpit", lambda: admission.tarpitted)
+metrics.callback("decoy_held_connections", "Connections on the timer wheel (tarpit and response delays)", lambda: tarpit.held)
+metrics.callback(
+    "decoy_tarpit_bytes_sent_total", "Bytes dripped or written by the timer wheel", lambda: tarpit.stats["bytes_sent"],
+    kind="counter",
+)
+metrics.callback(
+    "decoy_tarpit_skipped_total", "Abusers closed without delay because TARPIT_SLOTS were in use",
+    lambda: admission.stats["tarpit_skipped"], kind="counter",
+)
+metrics.callback(
+    "decoy_log_lines_total", "Log lines written, connection lines folded into summaries (suppressed) or dropped",
+    lambda: {(key,): log_pipe.stats[key] for key in ("written", "suppressed", "dropped")},
+    ["outcome"], kind="counter",
+)
+metrics.callback("decoy_rate_limiter_tracked_ips", "Source IPs tracked by the rate limiter", lambda: rate_limiter.tracked())
+metrics.callback(
+    "decoy_ident_signature_hits_total", "Client idents matched per signature",
+    lambda: {(name,): n for name, n in ident_classifier.hit_counts().items()},
+    ["signature"], kind="counter",
+)
+
+
+def _make_alert_sender() -> AlertSender:
+    spool = None
+    if ALERT_SPOOL_DIR:
+        spool = AlertSpool(
+            ALERT_SPOOL_DIR,
+            max_bytes=int(ALERT_SPOOL_MAX_MB * 1024 * 1024),
+            segment_bytes=int(ALERT_SPOOL_SEGMENT_MB * 1024 * 1024),
+        )
+    return AlertSender(
+        CENTRAL_ALERT_URL,
+        CENTRAL_BULK_URL,
+        batch_size=ALERT_BATCH_SIZE,
+        batch_ms=ALERT_BATCH_MS,
+        concurrency=ALERT_CONCURRENCY,
+        timeout=ALERT_TIMEOUT,
+        stats_interval=ALERT_STATS_SECONDS,
+        user_agent=f"decoy-pot/{__version__}",
+        spool=spool,
+        fsync_interval=ALERT_SPOOL_FSYNC_MS / 1000.0,
+        observe_post=lambda seconds, outcome: m_alert_post.observe(seconds, outcome),
+    )
 
 
 def send_alert(payload: dict):
     """Queue an alert for async delivery."""
-    try:
-        alert_q.put_nowait((CENTRAL_ALERT_URL, payload))
-    except queue.Full:
-        logging.warning("Alert queue full; dropping alert")
+    if not CENTRAL_ALERT_URL:
+        return
+    if alert_q is not None:
+        try:
+            alert_q.put_nowait(payload)
+        except queue.Full:
+            logging.warning("Alert queue full; dropping alert")
+    elif alert_sender is not None:
+        # drops are counted by the sender and show up in its periodic stats line
+        alert_sender.submit(payload)
 
 
 def utc_now_iso() -> str:
@@ -128,70 +273,45 @@ def _sockname(writer: asyncio.StreamWriter) -> Tuple[str, int]:
         return "0.0.0.0", LISTEN_PORT
 
 
+_HTTP_PREFIXES = frozenset((b"GET ", b"POST", b"HEAD", b"PUT ", b"OPTI", b"CONN", b"PRI "))
+# response delay per signature kind, to look more "real"
+_KIND_DELAYS = {"scanner": (0.8, 1.6), "library": (0.2, 0.7), "client": (0.05, 0.25)}
+
+
 def _classify_and_rules(
     first_bytes: bytes, client_ident: str
-) -> Tuple[str, str, float, bytes]:
+) -> Tuple[str, str, str, float, float, bytes]:
     """
-    Returns (family, reason, delay_seconds, extra_reply_bytes).
-    family  - one of: OpenSSH, Paramiko, libssh, libssh2, Go, PuTTY, Dropbear, JSCH, AsyncSSH, Nmap, Masscan, http, tls, garbage, generic
+    Returns (family, reason, version, confidence, delay_seconds, extra_reply_bytes).
+    family  - an ident signature family (see signatures.py), or http, tls, garbage, generic
     reason  - e.g., ssh_ident, wrong_protocol_http, wrong_protocol_tls, no_ident, garbage
+    version - client version captured by the signature, or ""
+    confidence - 0..1, how sure the family is
     delay_seconds - additional delay to apply before closing
     extra_reply_bytes - e.g., b"Protocol mismatch.\r\n" for non-SSH
     """
-    delay = 0.0
-    extra = b""
-
     if not first_bytes:
-        return ("generic", "no_ident", delay, extra)
+        return ("generic", "no_ident", "", 0.0, 0.0, b"")
 
     # TLS ClientHello (starts with 0x16 0x03 0x0X)
     if len(first_bytes) >= 3 and first_bytes[0] == 0x16 and first_bytes[1] == 0x03:
-        return ("tls", "wrong_protocol_tls", delay, extra)
+        return ("tls", "wrong_protocol_tls", "", 1.0, 0.0, b"")
 
     # HTTP and friends
-    l4 = first_bytes[:4].upper()
-    if l4 in (b"GET ", b"POST", b"HEAD", b"PUT ", b"OPTI", b"CONN", b"PRI "):
-        extra = b"Protocol mismatch.\r\n"
-        return ("http", "wrong_protocol_http", delay, extra)
+    if first_bytes[:4].upper() in _HTTP_PREFIXES:
+        return ("http", "wrong_protocol_http", "", 1.0, 0.0, b"Protocol mismatch.\r\n")
 
     if client_ident:
-        lo = client_ident.lower()
-        family = "generic"
-        if "openssh" in lo:
-            family = "OpenSSH"
-        elif "paramiko" in lo:
-            family = "Paramiko"
-        elif "libssh2" in lo:
-            family = "libssh2"
-        elif "libssh" in lo:
-            family = "libssh"
-        elif "go" in lo or "golang" in lo:
-            family = "Go"
-        elif "putty" in lo:
-            family = "PuTTY"
-        elif "dropbear" in lo:
-            family = "Dropbear"
-        elif "jsch" in lo:
-            family = "JSCH"
-        elif "asyncssh" in lo:
-            family = "AsyncSSH"
-        elif "nmap" in lo:
-            family = "Nmap"
-        elif "masscan" in lo:
-            family = "Masscan"
-
-        # Heuristic delays to look more "real"
-        if family in {"Nmap", "Masscan"}:
-            delay = random.uniform(0.8, 1.6)
-        elif family in {"Paramiko", "libssh", "libssh2", "AsyncSSH", "Go"}:
-            delay = random.uniform(0.2, 0.7)
+        match = ident_classifier.classify(client_ident)
+        if match is None:
+            family, version, confidence, kind = "generic", "", 0.1, "client"
         else:
-            delay = random.uniform(0.05, 0.25)
-
-        return (family, "ssh_ident", delay, extra)
+            family, version, confidence, kind = match.family, match.version, match.confidence, match.kind
+        delay = random.uniform(*_KIND_DELAYS[kind])
+        return (family, "ssh_ident", version, confidence, delay, b"")
 
     # Garbage or other unrecognized plaintext
-    return ("garbage", "garbage", delay, extra)
+    return ("garbage", "garbage", "", 0.0, 0.0, b"")
 
 
 def _inc_and_rate_limit(ip: str, now: float) -> Tuple[int, bool]:
@@ -199,12 +319,7 @@ def _inc_and_rate_limit(ip: str, now: float) -> Tuple[int, bool]:
     Track per-IP connection counts within the last minute.
     Returns (count_in_last_min, is_rate_limited)
     """
-    dq = ip_hits[ip]
-    dq.append(now)
-    # purge older than 60s
-    while dq and now - dq[0] > 60.0:
-        dq.popleft()
-    count = len(dq)
+    count = rate_limiter.hit(ip, now)
     if MAX_CONN_PER_MIN <= 0:
         return (count, False)
     return (count, count > MAX_CONN_PER_MIN)
@@ -227,81 +342,172 @@ def _severity_from(
     return sev, sn
 
 
-async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
-    ts = utc_now_iso()
-    peer = writer.get_extra_info("peername")
-    client_ip, client_port = _peername_to_ip_port(peer)
-    local_ip, local_port = _sockname(writer)
+class Listener(NamedTuple):
+    protocol: Protocol
+    port: int
+    honeypot_id: int
+
+
+def _make_protocol(name: str) -> Protocol:
+    if name == "ssh":
+        return SSHProtocol(READ_LIMIT, READ_TIMEOUT, ident_classifier, pick_banner, _classify_and_rules)
+    return PROTOCOLS[name](READ_LIMIT, READ_TIMEOUT, ident_classifier)
+
+
+def parse_listeners(spec: str) -> List[Listener]:
+    """Parse LISTENERS, e.g. "ssh:2222,http:8080:3,telnet:2323"."""
+    listeners = []
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        parts = item.strip().split(":")
+        name = parts[0].lower()
+        if name not in PROTOCOLS or len(parts) not in (2, 3):
+            raise ValueError(f"Invalid listener {item!r}; expected protocol:port[:honeypot_id] "
+                             f"with protocol one of {', '.join(PROTOCOLS)}")
+        honeypot_id = int(parts[2]) if len(parts) == 3 else HONEYPOT_ID
+        listeners.append(Listener(_make_protocol(name), int(parts[1]), honeypot_id))
+    return listeners
 
-    # Rate limiting / tarpit decision recorded *before* reading
-    now = time.time()
-    count_last_min, rate_limited = _inc_and_rate_limit(client_ip, now)
 
-    banner = pick_banner()
+async def _close(writer: asyncio.StreamWriter):
     try:
-        writer.write(banner)
-        await writer.drain()
+        writer.close()
+        await writer.wait_closed()
     except Exception:
-        # If we can't even send the banner, not much to do.
+        pass
+
+
+def _refuse(writer: asyncio.StreamWriter, protocol: Protocol, reason: str):
+    """Fast reject: no read, no classification, no alert."""
+    global _last_refusal_log
+    if REJECT_MODE == "banner":
+        reply = protocol.busy_reply()
+        if reply:
+            writer.write(reply)
+        writer.close()
+    else:
         try:
-            writer.close()
-            await writer.wait_closed()
-        except Exception:
+            # linger 0: close() sends RST instead of FIN and leaves no TIME_WAIT behind
+            writer.get_extra_info("socket").setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0))
+        except (AttributeError, OSError):
             pass
+        writer.transport.abort()
+    now = time.monotonic()
+    if now - _last_refusal_log >= 10.0:
+        _last_refusal_log = now
+        logging.warning(
+            "Refusing connections (%s cap): %d active, refused so far: %d over MAX_CONNECTIONS, %d over MAX_CONN_PER_IP",
+            reason, admission.active, admission.stats["rejected_global"], admission.stats["rejected_per_ip"],
+        )
+
+
+async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWriter, listener: Listener):
+    name = listener.protocol.name
+    client_ip, _ = _peername_to_ip_port(writer.get_extra_info("peername"))
+    refused = admission.admit(client_ip)
+    if refused is not None:
+        m_refused.inc(name, refused)
+        _refuse(writer, listener.protocol, refused)
         return
+    started = time.perf_counter()
+    m_connections.inc(name)
+    m_active.inc(name)
 
-    # Read at most READ_LIMIT bytes with timeout (pre-auth only).
+    def done():
+        admission.release(client_ip)
+        m_active.dec(name)
+        m_duration.observe(time.perf_counter() - started, name)
+
+    handed_off = False
     try:
-        first_bytes = await asyncio.wait_for(
-            reader.read(READ_LIMIT), timeout=READ_TIMEOUT
-        )
-    except asyncio.TimeoutError:
-        first_bytes = b""
-    except Exception:
-        first_bytes = b""
+        handed_off = await _handle_connection(reader, writer, listener, done)
+    finally:
+        if not handed_off:
+            done()
 
-    # Extract just the identification line (client banner), ASCII only.
-    client_ident = ""
-    if first_bytes:
-        try:
-            line = first_bytes.split(b"\n", 1)[0].rstrip(b"\r")
-            client_ident = line.decode("ascii", errors="ignore")
-        except Exception:
-            client_ident = ""
 
-    # Classify & pick rule-based response
-    family, reason, rule_delay, extra_reply = _classify_and_rules(
-        first_bytes, client_ident
-    )
+async def _handle_connection(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, listener: Listener, done
+) -> bool:
+    """Returns True if the connection was handed to the tarpit, which calls done() once it closes."""
+    ts = utc_now_iso()
+    peer = writer.get_extra_info("peername")
+    client_ip, client_port = _peername_to_ip_port(peer)
+    local_ip, local_port = _sockname(writer)
+    protocol = listener.protocol
 
-    # Apply tarpit/rate limit delay if configured
-    total_delay = rule_delay
-    if rate_limited and TARPIT_SECONDS > 0:
+    # Rate limiting / tarpit decision recorded *before* reading
+    now = time.time()
+    count_last_min, rate_limited = _inc_and_rate_limit(client_ip, now)
+    if rate_limited:
+        m_rate_limited.inc(protocol.name)
+    client, local = (client_ip, client_port), (local_ip, local_port)
+
+    if rate_limited and TARPIT_SECONDS > 0 and TARPIT_MODE == "drip" and admission.acquire_tarpit():
+        # no conversation: drip until the client gives up or TARPIT_SECONDS pass, then report
+        def released(entry: Held):
+            admission.release_tarpit()
+            done()
+            held = {"tarpit": {"held_seconds": round(entry.held_seconds, 1), "bytes_sent": entry.bytes_sent}}
+            exchange = Exchange("generic", "tarpit", bytes_received=entry.bytes_received, fields=held)
+            _report(listener, ts, client, local, exchange, count_last_min, rate_limited)
+
+        tarpit.hold(writer, TARPIT_SECONDS, protocol.tarpit_line, TARPIT_DRIP_SECONDS, protocol.tarpit_prelude,
+                    on_close=released)
+        return True
+
+    # Banner, pre-auth conversation and classification
+    exchange = await protocol.exchange(reader, writer)
+    if exchange is None:
+        await _close(writer)
+        return False
+
+    # Apply tarpit/rate limit delay if configured (and a tarpit slot is free)
+    total_delay = exchange.delay
+    tarpitted = rate_limited and TARPIT_SECONDS > 0 and TARPIT_MODE == "delay" and admission.acquire_tarpit()
+    if tarpitted:
         total_delay = max(total_delay, TARPIT_SECONDS)
 
+    _report(listener, ts, client, local, exchange, count_last_min, rate_limited)
+
     if total_delay > 0:
-        try:
-            await asyncio.sleep(total_delay)
-        except Exception:
-            pass
+        # the timer wheel writes the reply and closes later; this coroutine ends now
+        def released(entry: Held):
+            if tarpitted:
+                admission.release_tarpit()
+            done()
 
-    # For obvious protocol mismatch, it's plausible for servers to emit a line
-    # before closing; keep this small and only when we detected HTTP. Avoid for TLS/binary.
-    if extra_reply:
+        tarpit.hold(writer, total_delay, final=exchange.reply, on_close=released)
+        return True
+
+    if exchange.reply:
         try:
-            writer.write(extra_reply)
+            writer.write(exchange.reply)
             await writer.drain()
         except Exception:
             pass
 
     # Close connection
-    try:
-        writer.close()
-        await writer.wait_closed()
-    except Exception:
-        pass
-
-    bytes_received = len(first_bytes) if first_bytes else 0
+    await _close(writer)
+    return False
+
+
+def _report(
+    listener: Listener,
+    ts: str,
+    client: Tuple[str, int],
+    local: Tuple[str, int],
+    exchange: Exchange,
+    count_last_min: int,
+    rate_limited: bool,
+):
+    """Logs the connection and queues its alert."""
+    protocol = listener.protocol
+    (client_ip, client_port), (local_ip, local_port) = client, local
+    family, reason = exchange.family, exchange.reason
+    bytes_received = exchange.bytes_received
+    m_classified.inc(protocol.name, family, reason)
 
     # Build alert (minimal + enrichment). No credentials are parsed or stored.
     severity, severity_number = _severity_from(
@@ -309,8 +515,8 @@ async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWrit
     )
     alert = {
         "@timestamp": ts,
-        "title": "SSH honeypot connection",
-        "honeypot_id": HONEYPOT_ID,
+        "title": protocol.title,
+        "honeypot_id": listener.honeypot_id,
         "description": f"Connection from {client_ip}:{client_port}",
         "severity": severity,
         "severity_number": severity_number,
@@ -318,69 +524,180 @@ async def handle_client(reader: asyncio.StreamReader, writer: asyncio.StreamWrit
             "kind": "event",
             "category": "network",
             "type": ["connection"],
-            "action": "ssh_banner",
-            "dataset": "ssh.honeypot",
+            "action": protocol.action,
+            "dataset": f"{protocol.name}.honeypot",
         },
         "network": {
             "transport": "tcp",
-            "protocol": "ssh",
+            "protocol": protocol.name,
             "direction": "ingress",
             "bytes": bytes_received,
         },
         "source": {"ip": client_ip, "port": client_port},
         "destination": {"ip": local_ip, "port": local_port},
         "observer": {"type": "honeypot", "version": __version__},
-        "ssh": {
-            "client": {"ident": client_ident},
-            "server": {"banner": banner.decode("ascii", errors="ignore").strip()},
+        **exchange.fields,
+        "classification": {
+            "family": family,
+            "reason": reason,
+            "version": exchange.version,
+            "confidence": exchange.confidence,
         },
-        "classification": {"family": family, "reason": reason},
         "rate": {"count_last_min": count_last_min, "rate_limited": rate_limited},
     }
 
-    logging.info(
-        "Handled %s:%d -> %s:%d | %s/%s bytes=%d count/min=%d%s",
-        client_ip,
-        client_port,
-        local_ip,
-        local_port,
-        family,
-        reason,
-        bytes_received,
-        count_last_min,
-        " [RL]" if rate_limited else "",
+    log_pipe.connection(
+        client_ip, client_port, local_ip, local_port, protocol.name, family, reason,
+        bytes_received, count_last_min, rate_limited,
     )
 
-    # Enqueue alert (non-blocking); if CENTRAL_ALERT_URL is unset, worker will skip send.
+    # Enqueue alert (non-blocking); if CENTRAL_ALERT_URL is unset, nothing is sent.
     send_alert(alert)
 
 
-async def serve():
-    # Start alert worker thread
-    worker = threading.Thread(
-        target=_post_alert_worker, name="alert-worker", daemon=True
-    )
-    worker.start()
-
-    # Start server (IPv4 or IPv6 depending on LISTEN_HOST)
-    server = await asyncio.start_server(
-        handle_client,
-        host=LISTEN_HOST,
-        port=LISTEN_PORT,
-        reuse_address=True,
-    )
-    addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets or [])
-    logging.info("Listening on %s", addresses)
+async def serve(reuse_port: bool = False, run_sender: bool = True, metrics_port: int = METRICS_PORT):
+    global alert_sender
+    # Start alert sender on this loop (in WORKERS mode the parent process runs it)
+    if run_sender:
+        alert_sender = _make_alert_sender()
+        alert_sender.start()
+    if metrics_port:
+        servers = [await metrics.serve(METRICS_HOST, metrics_port)]
+    else:
+        servers = []
+
+    # Start one server per listener (IPv4 or IPv6 depending on LISTEN_HOST)
+    for listener in parse_listeners(LISTENERS):
+        server = await asyncio.start_server(
+            functools.partial(handle_client, listener=listener),
+            host=LISTEN_HOST,
+            port=listener.port,
+            reuse_address=True,
+            reuse_port=reuse_port,
+            backlog=LISTEN_BACKLOG,
+        )
+        addresses = ", ".join(str(sock.getsockname()) for sock in server.sockets or [])
+        logging.info("Listening on %s (%s, honeypot %d)", addresses, listener.protocol.name, listener.honeypot_id)
+        servers.append(server)
 
-    async with server:
-        await shutdown_event.wait()
-        logging.info("Shutdown requested; closing listener")
+    await shutdown_event.wait()
+    logging.info("Shutdown requested; closing listeners")
+    for server in servers:
         server.close()
+    # report the connections still held before the sender stops
+    tarpit.close()
+    await asyncio.sleep(0)
+    for server in servers:
         await server.wait_closed()
 
-    # Stop alert worker
+    hits = sorted(ident_classifier.hit_counts().items(), key=lambda kv: -kv[1])
+    if hits:
+        logging.info("Ident signature hits: %s", ", ".join(f"{name}={n}" for name, n in hits))
+
+    # Give queued alerts a moment to go out
+    if run_sender:
+        await alert_sender.close(timeout=2.0)
+
+
+def _worker_main(index: int):
+    global alert_sender
+    # a restarted worker inherits the parent's sender; it reports (and uses) alert_q instead
+    alert_sender = None
+    signal.signal(signal.SIGINT, _handle_signal)
+    signal.signal(signal.SIGTERM, _handle_signal)
+    log_pipe.start()
+    logging.info("Worker %d started (pid %d)", index, os.getpid())
+    try:
+        asyncio.run(serve(reuse_port=True, run_sender=False, metrics_port=METRICS_PORT + 1 + index if METRICS_PORT else 0))
+    finally:
+        log_pipe.close()
+
+
+def _drain_worker_alerts(limit: int = 1000) -> Tuple[List[dict], bool]:
+    """
+    Blocking read of up to `limit` alerts from alert_q (runs in an executor thread).
+    Returns (payloads, stop_requested)
+    """
+    try:
+        item = alert_q.get(timeout=1.0)
+    except queue.Empty:
+        return [], False
+    items: List[dict] = []
+    while item is not None:
+        items.append(item)
+        if len(items) >= limit:
+            return items, False
+        try:
+            item = alert_q.get_nowait()
+        except queue.Empty:
+            return items, False
+    return items, True
+
+
+async def _relay_worker_alerts():
+    """Feed alerts from all workers into one AlertSender on this thread's event loop."""
+    global alert_sender
+    alert_sender = sender = _make_alert_sender()
+    sender.start()
+    metrics_server = await metrics.serve(METRICS_HOST, METRICS_PORT) if METRICS_PORT else None
+    loop = asyncio.get_running_loop()
+    stop = False
+    while not stop:
+        items, stop = await loop.run_in_executor(None, _drain_worker_alerts)
+        for payload in items:
+            sender.submit(payload)
+    if metrics_server is not None:
+        metrics_server.close()
+    await sender.close(timeout=2.0)
+
+
+def run_workers():
+    """
+    Fork WORKERS processes, each with its own event loop on a SO_REUSEPORT listener.
+    Rate limiting goes through a shared-memory table; workers put alerts on a
+    process-shared queue drained by the batched sender, which runs on an event loop
+    in a thread of this (parent) process.
+    Workers that die are restarted.
+    """
+    global alert_q, rate_limiter
+    ctx = multiprocessing.get_context("fork")
+    rate_limiter = SharedRateTable(RATE_MAX_IPS)
+    alert_q = ctx.Queue(maxsize=10000)
+
+    stop = threading.Event()
+
+    def _stop(sig, frame):
+        logging.info("Shutting down workers (signal %s)", sig)
+        stop.set()
+
+    signal.signal(signal.SIGINT, _stop)
+    signal.signal(signal.SIGTERM, _stop)
+
+    def spawn(index: int):
+        proc = ctx.Process(target=_worker_main, args=(index,), name=f"pot-worker-{index}")
+        proc.start()
+        return proc
+
+    procs = [spawn(i) for i in range(WORKERS)]
+    # started after the first fork so workers don't inherit a thread blocked on alert_q
+    sender = threading.Thread(
+        target=lambda: asyncio.run(_relay_worker_alerts()), name="alert-sender", daemon=True
+    )
+    sender.start()
+
+    while not stop.wait(1.0):
+        for i, proc in enumerate(procs):
+            if not proc.is_alive():
+                logging.warning("Worker %d exited with code %s; restarting", i, proc.exitcode)
+                procs[i] = spawn(i)
+
+    for proc in procs:
+        if proc.is_alive():
+            proc.terminate()
+    for proc in procs:
+        proc.join(timeout=5.0)
     alert_q.put(None)
-    worker.join(timeout=2.0)
+    sender.join(timeout=5.0)
 
 
 def _handle_signal(sig, frame):
@@ -396,7 +713,50 @@ def _handle_signal(sig, frame):
             pass
 
 
+def _raise_fd_limit() -> int:
+    """Raises the soft open file limit to the hard limit; returns the new soft limit."""
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        try:
+            resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        except (ValueError, OSError):
+            return soft
+    return hard
+
+
 def main():
+    log_pipe.start()
+    try:
+        _main()
+    finally:
+        log_pipe.close()
+
+
+def _main():
+    try:
+        parse_listeners(LISTENERS)
+    except ValueError as e:
+        logging.error("%s", e)
+        sys.exit(2)
+    if REJECT_MODE not in ("rst", "banner"):
+        logging.error("REJECT_MODE must be rst or banner, not %r", REJECT_MODE)
+        sys.exit(2)
+    if TARPIT_MODE not in ("delay", "drip"):
+        logging.error("TARPIT_MODE must be delay or drip, not %r", TARPIT_MODE)
+        sys.exit(2)
+    if LOG_STYLE not in ("json", "text"):
+        logging.error("LOG_STYLE must be json or text, not %r", LOG_STYLE)
+        sys.exit(2)
+    fd_limit = _raise_fd_limit()
+    # every connection is one file descriptor; keep some for listeners, the sender and the spool
+    admission.max_connections = max(64, fd_limit - 128) if MAX_CONNECTIONS < 0 else MAX_CONNECTIONS
+    logging.info("Admission: %s connections at once, %s per IP, %s in the tarpit",
+                 admission.max_connections or "unlimited", MAX_CONN_PER_IP or "unlimited", TARPIT_SLOTS or "unlimited")
+    if WORKERS > 1:
+        if hasattr(socket, "SO_REUSEPORT"):
+            run_workers()
+            return
+        logging.warning("SO_REUSEPORT not available; ignoring WORKERS=%d", WORKERS)
     signal.signal(signal.SIGINT, _handle_signal)
     signal.signal(signal.SIGTERM, _handle_signal)
     try:
@@ -1,20 +1,235 @@
 #!/usr/bin/env python3
-import socket, sys, time
-
-host = sys.argv[1]
-port = int(sys.argv[2])
-ident = (sys.argv[3] if len(sys.argv) > 3 else "SSH-2.0-Paramiko_2.11.0") + "\r\n"
-
-s = socket.create_connection((host, port), timeout=3)
-# read the server banner (optional)
-try:
-    s.settimeout(1.0)
-    banner = s.recv(128)
-    sys.stderr.write(f"server banner: {banner!r}\n")
-except Exception:
-    pass
-
-# send our fake client identification
-s.sendall(ident.encode("ascii", "ignore"))
-time.sleep(0.2)
-s.close()
+"""
+usage:
+  python3 probe.py <HOST> <PORT> ["<SSH_IDENT>"]   one connection; prints the server banner
+  python3 probe.py load <HOST> <PORT> [options]     asyncio load generator (see --help)
+
+Load mode opens many concurrent connections with a mix of behaviours and reports
+connections/sec and banner latency. With --stub-port it also serves a stub central
+server (start pot.py with CENTRAL_ALERT_URL=http://127.0.0.1:<stub-port>/IncidentLogs)
+and measures how long each alert takes from closing the connection to arriving there.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import resource
+import socket
+import sys
+import time
+
+# idents from the README table
+IDENTS = [
+    "SSH-2.0-OpenSSH_9.6",
+    "SSH-2.0-Paramiko_2.11.0",
+    "SSH-2.0-libssh_0.10.6",
+    "SSH-2.0-libssh2_1.11.0",
+    "SSH-2.0-Go",
+    "SSH-2.0-Nmap",
+    "SSH-2.0-Test",
+]
+DEFAULT_MIX = "ssh=85,http=4,tls=4,garbage=4,slowloris=3"
+# start of a TLS 1.2 ClientHello record
+TLS_HELLO = bytes.fromhex("160301009a0100009603030000000000000000000000000000000000000000000000000000000000000000")
+
+
+def probe_once(host, port, ident):
+    ident = ident + "\r\n"
+    s = socket.create_connection((host, port), timeout=3)
+    # read the server banner (optional)
+    try:
+        s.settimeout(1.0)
+        banner = s.recv(128)
+        sys.stderr.write(f"server banner: {banner!r}\n")
+    except Exception:
+        pass
+
+    # send our fake client identification
+    s.sendall(ident.encode("ascii", "ignore"))
+    time.sleep(0.2)
+    s.close()
+
+
+def percentile(values, p):
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p / 100.0))]
+
+
+def parse_mix(spec):
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        if name.strip() not in ("ssh", "http", "tls", "garbage", "slowloris"):
+            raise SystemExit(f"unknown behaviour in --mix: {name!r}")
+        mix[name.strip()] = float(weight or 1)
+    return mix
+
+
+class LoadRun:
+    def __init__(self, args):
+        self.args = args
+        self.behaviours = list(parse_mix(args.mix).items())
+        self.banner_ms = []
+        self.alert_ms = []
+        self.closed_at = {}  # local port -> time the probe closed its connection
+        self.counts = {"ok": 0, "errors": 0, "no_banner": 0}
+        self.by_behaviour = {name: 0 for name, _ in self.behaviours}
+        self.alerts = 0
+
+    async def one(self, behaviour):
+        args = self.args
+        started = time.perf_counter()
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(args.host, args.port), args.timeout)
+        except Exception:
+            self.counts["errors"] += 1
+            return
+        local_port = writer.get_extra_info("sockname")[1]
+        try:
+            banner = await asyncio.wait_for(reader.read(256), args.timeout)
+            if banner:
+                self.banner_ms.append((time.perf_counter() - started) * 1000.0)
+            else:
+                self.counts["no_banner"] += 1
+            if behaviour == "ssh":
+                writer.write((random.choice(IDENTS) + "\r\n").encode())
+            elif behaviour == "http":
+                writer.write(b"GET / HTTP/1.1\r\nHost: target\r\nUser-Agent: Mozilla/5.0\r\n\r\n")
+            elif behaviour == "tls":
+                writer.write(TLS_HELLO)
+            elif behaviour == "garbage":
+                writer.write(os.urandom(random.randint(8, 64)))
+            else:
+                # slow-loris: an ident one byte at a time until the server gives up on us
+                for byte in b"SSH-2.0-":
+                    if reader.at_eof():
+                        break
+                    try:
+                        writer.write(bytes([byte]))
+                        await writer.drain()
+                    except ConnectionError:
+                        break
+                    await asyncio.sleep(args.drip)
+            await writer.drain()
+            # the server classifies, maybe delays, then closes
+            await asyncio.wait_for(reader.read(), args.timeout)
+            self.counts["ok"] += 1
+        except Exception:
+            self.counts["errors"] += 1
+        finally:
+            self.closed_at[local_port] = time.perf_counter()
+            writer.close()
+
+    async def stub_client(self, reader, writer):
+        """Minimal keep-alive HTTP/1.1 server standing in for the backend."""
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                length = 0
+                for line in head.split(b"\r\n"):
+                    if line.lower().startswith(b"content-length:"):
+                        length = int(line.split(b":", 1)[1])
+                body = json.loads(await reader.readexactly(length)) if length else []
+                now = time.perf_counter()
+                for alert in body if isinstance(body, list) else [body]:
+                    self.alerts += 1
+                    closed = self.closed_at.get(alert.get("source", {}).get("port"))
+                    if closed is not None:
+                        self.alert_ms.append(max(0.0, now - closed) * 1000.0)
+                writer.write(b"HTTP/1.1 201 CREATED\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}")
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, asyncio.CancelledError):
+            pass  # the sender hung up, or the run is over
+        finally:
+            writer.close()
+
+    async def run(self):
+        args = self.args
+        stub = None
+        if args.stub_port:
+            stub = await asyncio.start_server(self.stub_client, "127.0.0.1", args.stub_port)
+        names = [name for name, _ in self.behaviours]
+        weights = [weight for _, weight in self.behaviours]
+        slots = asyncio.Semaphore(args.concurrency)
+        tasks = set()
+        started = time.perf_counter()
+        for _ in range(args.connections):
+            await slots.acquire()
+            behaviour = random.choices(names, weights)[0]
+            self.by_behaviour[behaviour] += 1
+            task = asyncio.create_task(self.one(behaviour))
+            tasks.add(task)
+            task.add_done_callback(lambda t: (tasks.discard(t), slots.release()))
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+        if stub is not None:
+            # alerts are batched; give the last batch time to arrive
+            deadline = time.perf_counter() + args.alert_wait
+            while self.alerts < args.connections and time.perf_counter() < deadline:
+                await asyncio.sleep(0.1)
+            stub.close()
+        return self.report(elapsed)
+
+    def report(self, elapsed):
+        done = self.counts["ok"] + self.counts["errors"]
+        result = {
+            "target": f"{self.args.host}:{self.args.port}",
+            "connections": self.args.connections,
+            "concurrency": self.args.concurrency,
+            "mix": self.by_behaviour,
+            "elapsed_s": round(elapsed, 3),
+            "connections_per_s": round(done / elapsed, 1) if elapsed else None,
+            **self.counts,
+            "banner_ms": {p: _round(percentile(self.banner_ms, n)) for p, n in (("p50", 50), ("p99", 99), ("max", 100))},
+        }
+        if self.args.stub_port:
+            result["alerts_received"] = self.alerts
+            result["alert_ms"] = {p: _round(percentile(self.alert_ms, n)) for p, n in (("p50", 50), ("p99", 99), ("max", 100))}
+        return result
+
+
+def _round(value):
+    return None if value is None else round(value, 2)
+
+
+def _raise_fd_limit():
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+    return resource.getrlimit(resource.RLIMIT_NOFILE)[0]
+
+
+def run_load(argv):
+    parser = argparse.ArgumentParser(prog="probe.py load", description="asyncio load generator for pot.py")
+    parser.add_argument("host")
+    parser.add_argument("port", type=int)
+    parser.add_argument("-n", "--connections", type=int, default=10000, help="total connections (default 10000)")
+    parser.add_argument("-c", "--concurrency", type=int, default=1000, help="connections open at once (default 1000)")
+    parser.add_argument("--mix", default=DEFAULT_MIX, help=f"behaviour weights (default {DEFAULT_MIX})")
+    parser.add_argument("--timeout", type=float, default=10.0, help="per-step timeout in seconds")
+    parser.add_argument("--drip", type=float, default=1.0, help="seconds between slow-loris bytes")
+    parser.add_argument("--stub-port", type=int, default=0, help="serve a stub CENTRAL_ALERT_URL on this port")
+    parser.add_argument("--alert-wait", type=float, default=5.0, help="seconds to wait for trailing alerts")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    limit = _raise_fd_limit()
+    if args.concurrency + 64 > limit:
+        sys.stderr.write(f"open file limit is {limit}; lowering concurrency to {limit - 64}\n")
+        args.concurrency = max(1, limit - 64)
+
+    result = asyncio.run(LoadRun(args).run())
+    print(json.dumps(result, indent=2))
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(result, f, indent=2)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "load":
+        run_load(sys.argv[2:])
+    else:
+        probe_once(sys.argv[1], int(sys.argv[2]), sys.argv[3] if len(sys.argv) > 3 else "SSH-2.0-Paramiko_2.11.0")
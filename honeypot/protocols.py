@@ -0,0 +1,403 @@
+"""
+Protocol emulations for the listeners in pot.py. Each protocol runs the pre-auth part
+of one conversation and describes what it saw in an Exchange; pot.py applies rate
+limiting and delays, closes the connection and turns the Exchange into an alert.
+
+Like the SSH listener, none of them parse or keep credentials: usernames and
+passwords sent to telnet/FTP are read and discarded.
+"""
+from __future__ import annotations
+
+import asyncio
+import os
+import re
+import struct
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Optional, Tuple, Type
+
+from signatures import IdentClassifier
+
+
+@dataclass
+class Exchange:
+    family: str
+    reason: str
+    version: str = ""
+    confidence: float = 0.0
+    delay: float = 0.0  # extra delay before `reply` and closing
+    reply: bytes = b""  # written right before the connection is closed
+    bytes_received: int = 0
+    fields: Dict[str, dict] = field(default_factory=dict)  # protocol sections merged into the alert
+
+
+async def read_until(reader: asyncio.StreamReader, sep: bytes, limit: int, timeout: float) -> bytes:
+    """Read until `sep` is seen, `limit` bytes arrived, EOF or `timeout` seconds passed."""
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    data = b""
+    while sep not in data and len(data) < limit:
+        remaining = deadline - loop.time()
+        if remaining <= 0:
+            break
+        try:
+            chunk = await asyncio.wait_for(reader.read(limit - len(data)), remaining)
+        except Exception:
+            break
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+async def write(writer: asyncio.StreamWriter, data: bytes) -> bool:
+    try:
+        writer.write(data)
+        await writer.drain()
+        return True
+    except Exception:
+        return False
+
+
+def _is_tls(data: bytes) -> bool:
+    return len(data) >= 3 and data[0] == 0x16 and data[1] == 0x03
+
+
+class Protocol:
+    name = ""  # network.protocol in alerts
+    category = ""  # honeypot server category this emulates
+    action = ""  # event.action in alerts
+
+    def __init__(self, read_limit: int, read_timeout: float, classifier: IdentClassifier):
+        self.read_limit = read_limit
+        self.read_timeout = read_timeout
+        self.classifier = classifier
+
+    @property
+    def title(self) -> str:
+        return f"{self.name.upper()} honeypot connection"
+
+    async def exchange(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> Optional[Exchange]:
+        """Talk to the client; None means it went away before anything could be recorded."""
+        raise NotImplementedError
+
+    def busy_reply(self) -> bytes:
+        """Sent to connections refused by admission control (REJECT_MODE=banner) right before closing."""
+        return b""
+
+    # TARPIT_MODE=drip: written once when an abuser is taken into the tarpit, then one
+    # tarpit_line every TARPIT_DRIP_SECONDS. Protocols without either hold the socket silently.
+    tarpit_prelude = b""
+    tarpit_line: Optional[Callable[[], bytes]] = None
+
+    def _tool(self, text: str, default: str) -> Tuple[str, str, float]:
+        """(family, version, confidence) of a client string such as an HTTP User-Agent."""
+        match = self.classifier.classify(text) if text else None
+        if match is None:
+            return default, "", 0.1
+        return match.family, match.version, match.confidence
+
+
+class SSHProtocol(Protocol):
+    name = "ssh"
+    category = "ssh"
+    action = "ssh_banner"
+
+    def __init__(self, read_limit, read_timeout, classifier, pick_banner: Callable[[], bytes],
+                 classify: Callable[[bytes, str], Tuple[str, str, str, float, float, bytes]]):
+        super().__init__(read_limit, read_timeout, classifier)
+        self.pick_banner = pick_banner
+        self.classify = classify
+
+    def busy_reply(self):
+        return self.pick_banner()
+
+    @staticmethod
+    def tarpit_line():
+        # RFC 4253 lets a server send other lines before its version string; clients wait for "SSH-"
+        return os.urandom(12).hex().encode() + b"\r\n"
+
+    async def exchange(self, reader, writer):
+        banner = self.pick_banner()
+        if not await write(writer, banner):
+            # If we can't even send the banner, not much to do.
+            return None
+
+        # Read at most read_limit bytes with timeout (pre-auth only).
+        try:
+            first_bytes = await asyncio.wait_for(reader.read(self.read_limit), timeout=self.read_timeout)
+        except Exception:
+            first_bytes = b""
+
+        # Extract just the identification line (client banner), ASCII only.
+        client_ident = ""
+        if first_bytes:
+            line = first_bytes.split(b"\n", 1)[0].rstrip(b"\r")
+            client_ident = line.decode("ascii", errors="ignore")
+
+        family, reason, version, confidence, delay, extra = self.classify(first_bytes, client_ident)
+        return Exchange(
+            family, reason, version, confidence, delay,
+            # For obvious protocol mismatch, it's plausible for servers to emit a line
+            # before closing; the classifier only asks for this on HTTP. Avoid for TLS/binary.
+            reply=extra,
+            bytes_received=len(first_bytes),
+            fields={"ssh": {
+                "client": {"ident": client_ident},
+                "server": {"banner": banner.decode("ascii", errors="ignore").strip()},
+            }},
+        )
+
+
+_HTTP_METHODS = {"GET", "POST", "HEAD", "PUT", "DELETE", "OPTIONS", "CONNECT", "PATCH", "TRACE", "PRI"}
+# paths that only exploit kits and vulnerability scanners ask a random host for
+_HTTP_EXPLOIT_PATH = re.compile(
+    r"(\.\./|/\.env|/\.git/|/cgi-bin/|/boaform|/hnap1|/wp-login\.php|/xmlrpc\.php|/phpmyadmin|/shell|"
+    r"/vendor/phpunit|/actuator|/console|/setup\.cgi|/goform/|/manager/html|\$\{jndi:)",
+    re.IGNORECASE,
+)
+_NGINX_INDEX = (
+    b"<!DOCTYPE html>\n<html>\n<head>\n<title>Welcome to nginx!</title>\n</head>\n<body>\n"
+    b"<h1>Welcome to nginx!</h1>\n<p>If you see this page, the nginx web server is successfully installed and\n"
+    b"working. Further configuration is required.</p>\n</body>\n</html>\n"
+)
+_NGINX_404 = (
+    b"<html>\r\n<head><title>404 Not Found</title></head>\r\n<body>\r\n<center><h1>404 Not Found</h1></center>\r\n"
+    b"<hr><center>nginx/1.18.0 (Ubuntu)</center>\r\n</body>\r\n</html>\r\n"
+)
+_NGINX_503 = (
+    b"<html>\r\n<head><title>503 Service Temporarily Unavailable</title></head>\r\n<body>\r\n"
+    b"<center><h1>503 Service Temporarily Unavailable</h1></center>\r\n"
+    b"<hr><center>nginx/1.18.0 (Ubuntu)</center>\r\n</body>\r\n</html>\r\n"
+)
+
+
+def _http_response(status: str, body: bytes, head: bool = False) -> bytes:
+    headers = (
+        f"HTTP/1.1 {status}\r\nServer: nginx/1.18.0 (Ubuntu)\r\nContent-Type: text/html\r\n"
+        f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n"
+    )
+    return headers.encode() + (b"" if head else body)
+
+
+class HTTPProtocol(Protocol):
+    name = "http"
+    category = "web"
+    action = "http_request"
+
+    tarpit_prelude = b"HTTP/1.1 200 OK\r\n"
+
+    def busy_reply(self):
+        return _http_response("503 Service Temporarily Unavailable", _NGINX_503)
+
+    @staticmethod
+    def tarpit_line():
+        # an endless header block
+        return b"X-" + os.urandom(4).hex().encode() + b": " + os.urandom(8).hex().encode() + b"\r\n"
+
+    async def exchange(self, reader, writer):
+        data = await read_until(reader, b"\r\n\r\n", self.read_limit, self.read_timeout)
+        if not data:
+            return Exchange("generic", "no_request")
+        if _is_tls(data):
+            return Exchange("tls", "wrong_protocol_tls", confidence=1.0, bytes_received=len(data))
+        head = data.split(b"\r\n\r\n", 1)[0].decode("latin-1")
+        lines = head.split("\r\n")
+        parts = lines[0].split(" ")
+        if len(parts) != 3 or parts[0].upper() not in _HTTP_METHODS:
+            return Exchange("garbage", "garbage", bytes_received=len(data),
+                            reply=_http_response("400 Bad Request", b""))
+        method, target, _ = parts
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+        user_agent = headers.get("user-agent", "")
+        family, version, confidence = self._tool(user_agent, "http-client")
+        path = target.split("?", 1)[0]
+        reason = "http_exploit_path" if _HTTP_EXPLOIT_PATH.search(target) else "http_request"
+        if path == "/" and method.upper() in ("GET", "HEAD"):
+            reply = _http_response("200 OK", _NGINX_INDEX, head=method.upper() == "HEAD")
+        else:
+            reply = _http_response("404 Not Found", _NGINX_404, head=method.upper() == "HEAD")
+        return Exchange(
+            family, reason, version, confidence, reply=reply, bytes_received=len(data),
+            fields={
+                "http": {"request": {"method": method[:16]}},
+                "url": {"original": target[:512], "path": path[:512]},
+                "user_agent": {"original": user_agent[:512]},
+            },
+        )
+
+
+_TELNET_IAC = re.compile(rb"\xff\xfa.*?\xff\xf0|\xff[\xfb-\xfe].|\xff.", re.DOTALL)
+
+
+class TelnetProtocol(Protocol):
+    name = "telnet"
+    category = "telnet"
+    action = "telnet_login"
+    # IAC WILL ECHO, IAC WILL SUPPRESS-GO-AHEAD, then a login prompt
+    banner = b"\xff\xfb\x01\xff\xfb\x03\r\nUbuntu 22.04.3 LTS\r\nlogin: "
+    # negotiation first, then noise one character at a time
+    tarpit_prelude = b"\xff\xfb\x01\xff\xfb\x03\r\n"
+
+    @staticmethod
+    def tarpit_line():
+        return os.urandom(1).hex()[:1].encode()
+
+    async def _line(self, reader) -> Tuple[bytes, int]:
+        raw = await read_until(reader, b"\n", self.read_limit, self.read_timeout)
+        return _TELNET_IAC.sub(b"", raw).strip(), len(raw)
+
+    async def exchange(self, reader, writer):
+        if not await write(writer, self.banner):
+            return None
+        user, received = await self._line(reader)
+        if _is_tls(user):
+            return Exchange("tls", "wrong_protocol_tls", confidence=1.0, bytes_received=received)
+        if not user:
+            return Exchange("telnet", "no_login", bytes_received=received)
+        # the username is not recorded; the password is read only so the client sees a normal failure
+        await write(writer, b"Password: ")
+        _, password_bytes = await self._line(reader)
+        return Exchange("telnet", "telnet_login_attempt", confidence=1.0, delay=1.0,
+                        reply=b"\r\nLogin incorrect\r\n", bytes_received=received + password_bytes)
+
+
+class FTPProtocol(Protocol):
+    name = "ftp"
+    category = "ftp"
+    action = "ftp_session"
+    banner = b"220 (vsFTPd 3.0.3)\r\n"
+    max_commands = 8
+
+    def busy_reply(self):
+        return b"421 There are too many connections from your internet address.\r\n"
+
+    @staticmethod
+    def tarpit_line():
+        # a multi-line 220 greeting that never reaches its last line
+        return b"220-" + os.urandom(12).hex().encode() + b"\r\n"
+
+    async def exchange(self, reader, writer):
+        if not await write(writer, self.banner):
+            return None
+        received = 0
+        commands = []
+        reason = "no_command"
+        for _ in range(self.max_commands):
+            line = await read_until(reader, b"\n", self.read_limit, self.read_timeout)
+            received += len(line)
+            if not line:
+                break
+            if _is_tls(line):
+                return Exchange("tls", "wrong_protocol_tls", confidence=1.0, bytes_received=received)
+            # only the verb is kept: USER/PASS arguments are credentials
+            verb = line.split(b" ", 1)[0].strip().upper().decode("ascii", errors="ignore")[:8]
+            commands.append(verb)
+            if verb == "USER":
+                reason = "ftp_login_attempt"
+                reply = b"331 Please specify the password.\r\n"
+            elif verb == "PASS":
+                reason = "ftp_login_attempt"
+                reply = b"530 Login incorrect.\r\n"
+            elif verb == "QUIT":
+                await write(writer, b"221 Goodbye.\r\n")
+                break
+            else:
+                if reason == "no_command":
+                    reason = "ftp_command"
+                reply = b"530 Please login with USER and PASS.\r\n"
+            if not await write(writer, reply):
+                break
+        return Exchange("ftp", reason, confidence=1.0 if commands else 0.0, bytes_received=received,
+                        fields={"ftp": {"commands": commands}})
+
+
+def _mqtt_varint(data: bytes, offset: int) -> Tuple[int, int]:
+    """An MQTT variable byte integer at offset and the offset after it."""
+    value = shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80 or shift >= 21:
+            return value, offset
+        shift += 7
+
+
+def _mqtt_string(data: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = struct.unpack_from("!H", data, offset)
+    value = data[offset + 2:offset + 2 + length]
+    return value.decode("utf-8", errors="replace"), offset + 2 + length
+
+
+class MQTTProtocol(Protocol):
+    name = "mqtt"
+    category = "iot"
+    action = "mqtt_connect"
+
+    async def exchange(self, reader, writer):
+        try:
+            data = await asyncio.wait_for(reader.read(self.read_limit), timeout=self.read_timeout)
+        except Exception:
+            data = b""
+        if not data:
+            return Exchange("generic", "no_request")
+        if _is_tls(data):
+            return Exchange("tls", "wrong_protocol_tls", confidence=1.0, bytes_received=len(data))
+        if data[0] != 0x10:
+            return Exchange("garbage", "garbage", bytes_received=len(data))
+        try:
+            # skip the variable-length "remaining length" field of the fixed header
+            _, offset = _mqtt_varint(data, 1)
+            protocol_name, offset = _mqtt_string(data, offset)
+            level = data[offset]
+            offset += 1 + 1 + 2  # protocol level, connect flags, keep alive
+            if level == 5:
+                # MQTT 5 puts a properties block before the payload
+                properties_length, offset = _mqtt_varint(data, offset)
+                offset += properties_length
+            client_id, _ = _mqtt_string(data, offset)
+        except (IndexError, struct.error):
+            return Exchange("garbage", "garbage", bytes_received=len(data))
+        family, version, confidence = self._tool(client_id, "mqtt-client")
+        # CONNACK refusing the login: return code 5 (not authorized) before MQTT 5; there it is
+        # reason code 0x87 (not authorized) followed by an empty properties block
+        reply = b"\x20\x03\x00\x87\x00" if level == 5 else b"\x20\x02\x00\x05"
+        return Exchange(
+            family, "mqtt_connect", version, max(confidence, 0.5), reply=reply,
+            bytes_received=len(data),
+            fields={"mqtt": {"protocol_name": protocol_name[:16], "protocol_level": level, "client_id": client_id[:128]}},
+        )
+
+
+class ModbusProtocol(Protocol):
+    name = "modbus"
+    category = "scada"
+    action = "modbus_request"
+
+    async def exchange(self, reader, writer):
+        try:
+            data = await asyncio.wait_for(reader.read(self.read_limit), timeout=self.read_timeout)
+        except Exception:
+            data = b""
+        if not data:
+            return Exchange("generic", "no_request")
+        if _is_tls(data):
+            return Exchange("tls", "wrong_protocol_tls", confidence=1.0, bytes_received=len(data))
+        # MBAP header: transaction id, protocol id (always 0), length, unit id; then the function code
+        if len(data) < 8 or data[2:4] != b"\x00\x00":
+            return Exchange("garbage", "garbage", bytes_received=len(data))
+        transaction, _, _, unit, function = struct.unpack_from("!HHHBB", data)
+        # exception response: illegal data address
+        reply = struct.pack("!HHHBBB", transaction, 0, 3, unit, function | 0x80, 0x02)
+        return Exchange(
+            "modbus", "modbus_request", confidence=1.0, reply=reply, bytes_received=len(data),
+            fields={"modbus": {"unit_id": unit, "function_code": function}},
+        )
+
+
+PROTOCOLS: Dict[str, Type[Protocol]] = {
+    cls.name: cls for cls in (SSHProtocol, HTTPProtocol, TelnetProtocol, FTPProtocol, MQTTProtocol, ModbusProtocol)
+}
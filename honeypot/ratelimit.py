@@ -0,0 +1,171 @@
+"""
+Per-IP connection counting over a sliding 60 second window, in fixed-size arrays.
+
+Each tracked IP owns one slot: the second it was last seen, its running total and
+one counter per second of the window. A hit counts while it is at most `window`
+seconds old (like the original deque purge), rounded to whole seconds, so the
+count may include up to one extra second of hits but never misses one.
+"""
+from __future__ import annotations
+
+import hashlib
+import multiprocessing
+from array import array
+from collections import OrderedDict
+from typing import List
+
+WINDOW_SECONDS = 60
+_MAX_BUCKET = 0xFFFF
+
+
+def ip_key(ip: str) -> int:
+    """Stable non-zero 64-bit key for an IP (0 marks an empty slot)."""
+    return int.from_bytes(hashlib.blake2b(ip.encode(), digest_size=8).digest(), "little") or 1
+
+
+class SlidingWindowCounter:
+    """Window arithmetic over slot arrays; subclasses decide how IPs map to slots."""
+
+    def __init__(self, last_sec, totals, buckets, window: int = WINDOW_SECONDS):
+        self.window = window
+        self.span = window + 1  # buckets per slot: the current second plus `window` before it
+        self._last_sec = last_sec
+        self._totals = totals
+        self._buckets = buckets
+
+    def _reset_slot(self, slot: int, sec: int) -> None:
+        base = slot * self.span
+        for i in range(base, base + self.span):
+            self._buckets[i] = 0
+        self._totals[slot] = 0
+        self._last_sec[slot] = sec
+
+    def _count_hit(self, slot: int, sec: int) -> int:
+        """Advance the slot's window to sec, count one hit and return the total in the window."""
+        span = self.span
+        base = slot * span
+        last = self._last_sec[slot]
+        if sec - last >= span:
+            self._reset_slot(slot, sec)
+        elif sec > last:
+            total = self._totals[slot]
+            for t in range(last + 1, sec + 1):
+                i = base + t % span
+                total -= self._buckets[i]
+                self._buckets[i] = 0
+            self._totals[slot] = total
+            self._last_sec[slot] = sec
+        else:
+            # another process saw a slightly later clock; count into the newest second
+            sec = last
+        i = base + sec % span
+        if self._buckets[i] < _MAX_BUCKET:
+            self._buckets[i] += 1
+            self._totals[slot] += 1
+        return self._totals[slot]
+
+
+class BoundedRateLimiter(SlidingWindowCounter):
+    """
+    Single-process counter table with a hard cap of `max_ips` tracked addresses.
+
+    Slots are handed out from preallocated arrays, so memory is fixed up front.
+    IPs idle for longer than the window are released as they reach the head of
+    the LRU order; when all slots are busy the least recently seen IP is evicted
+    (and starts from zero if it comes back).
+    """
+
+    SWEEP = 2  # idle IPs released per hit
+
+    def __init__(self, max_ips: int = 65536, window: int = WINDOW_SECONDS):
+        self.max_ips = max_ips
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._free: List[int] = []
+        self._next_unused = 0
+        super().__init__(
+            array("q", bytes(8 * max_ips)),
+            array("L", [0]) * max_ips,
+            array("H", bytes(2 * max_ips * (window + 1))),
+            window,
+        )
+
+    def _release_idle(self, sec: int) -> None:
+        for _ in range(self.SWEEP):
+            if not self._slots:
+                return
+            ip, slot = next(iter(self._slots.items()))
+            if sec - self._last_sec[slot] <= self.window:
+                return
+            del self._slots[ip]
+            self._free.append(slot)
+
+    def _claim_slot(self) -> int:
+        if self._free:
+            return self._free.pop()
+        if self._next_unused < self.max_ips:
+            self._next_unused += 1
+            return self._next_unused - 1
+        _, slot = self._slots.popitem(last=False)
+        return slot
+
+    def hit(self, ip: str, now: float) -> int:
+        sec = int(now)
+        self._release_idle(sec)
+        slot = self._slots.get(ip)
+        if slot is None:
+            slot = self._claim_slot()
+            self._reset_slot(slot, sec)
+            self._slots[ip] = slot
+        else:
+            self._slots.move_to_end(ip)
+        return self._count_hit(slot, sec)
+
+    def tracked(self) -> int:
+        return len(self._slots)
+
+
+class SharedRateTable(SlidingWindowCounter):
+    """
+    Counter table in shared memory for forked worker processes.
+
+    IPs are placed by open addressing over a short probe run; when the run is full
+    the slot idle the longest is taken over, so memory stays fixed at `slots`.
+    """
+
+    PROBES = 8
+
+    def __init__(self, slots: int = 65536, window: int = WINDOW_SECONDS):
+        self.slots = slots
+        self._keys = multiprocessing.RawArray("Q", slots)
+        self._lock = multiprocessing.Lock()
+        super().__init__(
+            multiprocessing.RawArray("q", slots),
+            multiprocessing.RawArray("L", slots),
+            multiprocessing.RawArray("H", slots * (window + 1)),
+            window,
+        )
+
+    def _find_slot(self, key: int, sec: int) -> int:
+        start = key % self.slots
+        candidate = -1
+        for probe in range(self.PROBES):
+            slot = (start + probe) % self.slots
+            existing = self._keys[slot]
+            if existing == key:
+                return slot
+            if candidate >= 0 and self._keys[candidate] == 0:
+                continue
+            if existing == 0 or candidate < 0 or self._last_sec[slot] < self._last_sec[candidate]:
+                candidate = slot
+        self._keys[candidate] = key
+        self._reset_slot(candidate, sec)
+        return candidate
+
+    def hit(self, ip: str, now: float) -> int:
+        key = ip_key(ip)
+        sec = int(now)
+        with self._lock:
+            return self._count_hit(self._find_slot(key, sec), sec)
+
+    def tracked(self) -> int:
+        return sum(1 for key in self._keys if key)
@@ -0,0 +1,413 @@
+"""
+Asyncio alert delivery: batches queued alerts and POSTs them over a small pool of
+keep-alive HTTP/1.1 connections, with retries and backoff per request.
+"""
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import json
+import logging
+import os
+import random
+import ssl
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from spool import AlertSpool
+
+
+class HttpError(Exception):
+    pass
+
+
+class HttpConnection:
+    """One keep-alive HTTP/1.1 connection to the host of `url`, reopened when the server drops it."""
+
+    def __init__(self, url: str, user_agent: str = "decoy-pot", timeout: float = 2.0):
+        parts = urlsplit(url)
+        self.host = parts.hostname or "localhost"
+        self.tls = parts.scheme == "https"
+        self.port = parts.port or (443 if self.tls else 80)
+        self.user_agent = user_agent
+        self.timeout = timeout
+        default_port = 443 if self.tls else 80
+        self.host_header = self.host if self.port == default_port else f"{self.host}:{self.port}"
+        self.reader: Optional[asyncio.StreamReader] = None
+        self.writer: Optional[asyncio.StreamWriter] = None
+
+    async def _connect(self) -> None:
+        self.reader, self.writer = await asyncio.open_connection(
+            self.host, self.port, ssl=ssl.create_default_context() if self.tls else None
+        )
+
+    def close(self) -> None:
+        if self.writer is not None:
+            try:
+                self.writer.close()
+            except Exception:
+                pass
+        self.reader = self.writer = None
+
+    async def post_json(self, path: str, body: bytes) -> int:
+        """
+        POST body and return the status code; retries once on a fresh connection if a reused one was stale.
+        Raises asyncio.TimeoutError if the response has not arrived within `timeout` seconds.
+        """
+        deadline = asyncio.get_running_loop().time() + self.timeout
+        reused = self.writer is not None
+        try:
+            return await self._post(path, body, deadline)
+        except (ConnectionError, asyncio.IncompleteReadError, HttpError):
+            self.close()
+            if not reused:
+                raise
+        return await self._post(path, body, deadline)
+
+    async def _post(self, path: str, body: bytes, deadline: float) -> int:
+        remaining = deadline - asyncio.get_running_loop().time()
+        status, headers, framed = await asyncio.wait_for(self._request(path, body), remaining)
+        if not framed:
+            await self._drain_unframed()
+        elif headers.get("connection", "").lower() == "close":
+            self.close()
+        return status
+
+    async def _request(self, path: str, body: bytes) -> Tuple[int, Dict[str, str], bool]:
+        if self.writer is None:
+            await self._connect()
+        head = (
+            f"POST {path} HTTP/1.1\r\n"
+            f"Host: {self.host_header}\r\n"
+            f"User-Agent: {self.user_agent}\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "Connection: keep-alive\r\n\r\n"
+        )
+        self.writer.write(head.encode("latin-1") + body)
+        await self.writer.drain()
+        status, headers = await self._read_head()
+        while status == 100 or 102 <= status < 200:
+            # interim responses (100 Continue, 103 Early Hints) come before the real one
+            status, headers = await self._read_head()
+        framed = await self._read_body(status, headers)
+        return status, headers, framed
+
+    async def _read_head(self) -> Tuple[int, Dict[str, str]]:
+        line = await self.reader.readline()
+        if not line:
+            raise HttpError("connection closed before response")
+        try:
+            status = int(line.split()[1])
+        except (IndexError, ValueError):
+            raise HttpError(f"bad status line {line!r}")
+        headers: Dict[str, str] = {}
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        return status, headers
+
+    async def _read_body(self, status: int, headers: Dict[str, str]) -> bool:
+        """Reads the body; False if it has no length and runs until the server closes the connection."""
+        if 100 <= status < 200 or status in (204, 304):
+            return True  # never a body, whatever the headers say
+        if "content-length" in headers:
+            await self.reader.readexactly(int(headers["content-length"]))
+        elif headers.get("transfer-encoding", "").lower() == "chunked":
+            while True:
+                size = int((await self.reader.readline()).split(b";")[0], 16)
+                await self.reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        else:
+            return False
+        return True
+
+    async def _drain_unframed(self) -> None:
+        # the status is already known; give the body `timeout` seconds, then drop the connection
+        # (a server that keeps it alive would otherwise hold the POST until it times out)
+        try:
+            await asyncio.wait_for(self.reader.read(), self.timeout)
+        except (asyncio.TimeoutError, ConnectionError):
+            pass
+        self.close()
+
+
+class AlertSender:
+    """
+    Runs on the event loop that produces alerts. submit() never blocks: alerts that
+    don't fit in the queue are counted as dropped. A batcher task cuts the queue into
+    batches (batch_size alerts or batch_ms), and up to `concurrency` deliveries run at
+    once, each backing off on its own when the central server is slow or failing.
+
+    With a spool, alerts go to disk instead once the queue is three quarters full,
+    as do batches that ran out of retries (and whatever is left at shutdown). A
+    replayer sends the spool back in order while the queue is short, probing with
+    growing pauses while the central server keeps failing. All spool file IO runs
+    in order on one worker thread; appends made during one loop iteration are
+    written together.
+    """
+
+    def __init__(
+        self,
+        url: str,
+        bulk_url: str,
+        batch_size: int = 500,
+        batch_ms: float = 250.0,
+        concurrency: int = 4,
+        timeout: float = 2.0,
+        retries: int = 3,
+        queue_size: int = 10000,
+        stats_interval: float = 60.0,
+        user_agent: str = "decoy-pot",
+        spool: Optional[AlertSpool] = None,
+        fsync_interval: float = 1.0,
+        observe_post: Optional[Callable[[float, str], None]] = None,
+    ):
+        self.url = url
+        self.bulk_url = bulk_url
+        self.batch_size = batch_size
+        self.batch_ms = batch_ms
+        self.concurrency = max(1, concurrency)
+        self.timeout = timeout
+        self.retries = retries
+        self.stats_interval = stats_interval
+        self.user_agent = user_agent
+        self.spool = spool
+        # called with (seconds, "ok" | "rejected" | "retry" | "error") after every POST attempt
+        self.observe_post = observe_post
+        self.fsync_interval = fsync_interval
+        self.queue: "asyncio.Queue[dict]" = asyncio.Queue(maxsize=queue_size)
+        self.high_water = queue_size * 3 // 4
+        self.low_water = queue_size // 4
+        self.stats = {"sent": 0, "batches": 0, "failed": 0, "dropped": 0, "retries": 0}
+        self._idle: List[HttpConnection] = []
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._inflight: set = set()
+        self._tasks: List[asyncio.Task] = []
+        # the thread starts on first use, so a sender made before a fork is fine
+        self._spool_io = concurrent.futures.ThreadPoolExecutor(1, "alert-spool") if spool is not None else None
+        self._unspooled: List[dict] = []
+
+    def submit(self, payload: dict) -> bool:
+        if self.spool is not None and self.queue.qsize() >= self.high_water:
+            self._spool_later([payload])
+            return True
+        try:
+            self.queue.put_nowait(payload)
+            return True
+        except asyncio.QueueFull:
+            self.stats["dropped"] += 1
+            return False
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._batcher())]
+        if self.spool is not None:
+            self.spool.open()
+            self._tasks += [asyncio.create_task(self._replayer()), asyncio.create_task(self._sync_spool())]
+        if self.stats_interval > 0:
+            self._tasks.append(asyncio.create_task(self._log_stats()))
+
+    async def close(self, timeout: float = 2.0) -> None:
+        """Give queued and in-flight alerts up to `timeout` seconds, then stop."""
+        deadline = time.monotonic() + timeout
+        while (not self.queue.empty() or self._inflight) and time.monotonic() < deadline:
+            await asyncio.sleep(0.05)
+        for task in [*self._tasks, *self._inflight]:
+            task.cancel()
+        await asyncio.gather(*self._tasks, *self._inflight, return_exceptions=True)
+        for conn in self._idle:
+            conn.close()
+        self._idle.clear()
+        if self.spool is not None:
+            leftover, self._unspooled = self._unspooled, []
+            while not self.queue.empty():
+                leftover.append(self.queue.get_nowait())
+            if leftover:
+                await self._in_spool_thread(self._append_to_spool, leftover)
+            await self._in_spool_thread(self.spool.close)
+            await self._sync_spool_fds()
+            self._spool_io.shutdown(wait=False)
+
+    async def _next_batch(self) -> List[dict]:
+        loop = asyncio.get_running_loop()
+        batch = [await self.queue.get()]
+        deadline = loop.time() + self.batch_ms / 1000.0
+        while len(batch) < self.batch_size:
+            while not self.queue.empty() and len(batch) < self.batch_size:
+                batch.append(self.queue.get_nowait())
+            remaining = deadline - loop.time()
+            if len(batch) >= self.batch_size or remaining <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), remaining))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _batcher(self) -> None:
+        while True:
+            batch = await self._next_batch()
+            await self._slots.acquire()
+            task = asyncio.create_task(self._deliver(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _deliver(self, batch: List[dict]) -> None:
+        unsent = batch
+        try:
+            failed = await self._send(batch, self.retries)
+            unsent = []
+            if failed and self.spool is not None:
+                self._spool_later(failed)
+            else:
+                self.stats["failed"] += len(failed)
+        except asyncio.CancelledError:
+            # shutting down mid-request: keep the batch (it may arrive twice)
+            if unsent and self.spool is not None:
+                self._spool_later(unsent)
+            raise
+        finally:
+            self._slots.release()
+
+    async def _send(self, batch: List[dict], retries: int) -> List[dict]:
+        """POSTs batch; returns the alerts that still failed after `retries` attempts."""
+        if self.batch_size == 1:
+            failed = []
+            for payload in batch:
+                if not await self._post(self.url, json.dumps(payload).encode(), 1, retries):
+                    failed.append(payload)
+            return failed
+        ok = await self._post(self.bulk_url, json.dumps(batch).encode(), len(batch), retries)
+        return [] if ok else batch
+
+    async def _post(self, url: str, body: bytes, count: int, retries: int) -> bool:
+        """False if every attempt failed or was throttled; True once the server answered (even with a 4xx)."""
+        path = urlsplit(url)
+        target = (path.path or "/") + (f"?{path.query}" if path.query else "")
+        for attempt in range(retries):
+            conn = self._idle.pop() if self._idle else HttpConnection(url, self.user_agent, self.timeout)
+            started = time.perf_counter()
+            try:
+                status = await conn.post_json(target, body)
+            except Exception as e:
+                conn.close()
+                error = str(e) or type(e).__name__
+                self._observe(started, "error")
+            else:
+                self._idle.append(conn)
+                # the backend answers 429 while its ingest queue is full
+                retry = status == 429 or status >= 500
+                self._observe(started, "retry" if retry else "rejected" if status >= 400 else "ok")
+                if not retry:
+                    if status >= 400:
+                        self.stats["failed"] += count
+                        logging.warning("Alert POST rejected with HTTP %d", status)
+                    else:
+                        self.stats["sent"] += count
+                        self.stats["batches"] += 1
+                    return True
+                error = f"HTTP {status}"
+            if attempt == retries - 1:
+                logging.warning("Alert POST failed (giving up on %d alerts): %s", count, error)
+                return False
+            self.stats["retries"] += 1
+            await asyncio.sleep(0.5 * (2**attempt) * random.uniform(0.8, 1.2))
+        return False
+
+    def _observe(self, started: float, outcome: str) -> None:
+        if self.observe_post is not None:
+            self.observe_post(time.perf_counter() - started, outcome)
+
+    async def _replayer(self) -> None:
+        pause = 1.0
+        while True:
+            await asyncio.sleep(pause)
+            if not self.spool.pending or self.queue.qsize() > self.low_water:
+                pause = 1.0
+                continue
+            items, position = await self._in_spool_thread(self.spool.read, self.batch_size)
+            if not items:
+                await self._in_spool_thread(self.spool.commit, position)
+                continue
+            async with self._slots:
+                failed = await self._send(items, 1)
+            if failed:
+                # central server still unavailable: probe again later, up to once a minute
+                pause = min(60.0, max(2.0, pause * 2))
+            else:
+                await self._in_spool_thread(self.spool.commit, position, len(items))
+                pause = 0.0
+
+    async def _sync_spool(self) -> None:
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+            await self._sync_spool_fds()
+
+    async def _sync_spool_fds(self) -> None:
+        # fsync on the default executor, so a slow disk does not hold up spool appends
+        loop = asyncio.get_running_loop()
+        for fd in await self._in_spool_thread(self.spool.sync_fds):
+            await loop.run_in_executor(None, _fsync_and_close, fd)
+
+    def _spool_later(self, payloads: List[dict]) -> None:
+        if not self._unspooled:
+            asyncio.get_running_loop().call_soon(self._flush_unspooled)
+        self._unspooled.extend(payloads)
+
+    def _flush_unspooled(self) -> None:
+        if self._unspooled:
+            payloads, self._unspooled = self._unspooled, []
+            self._spool_io.submit(self._append_to_spool, payloads)
+
+    def _append_to_spool(self, payloads: List[dict]) -> None:
+        try:
+            self.spool.append(payloads)
+        except OSError as e:
+            logging.warning("Could not spool %d alerts: %s", len(payloads), e)
+
+    def _in_spool_thread(self, func, *args) -> "asyncio.Future":
+        return asyncio.get_running_loop().run_in_executor(self._spool_io, func, *args)
+
+    async def _log_stats(self) -> None:
+        last = dict(self.stats)
+        last_spool = dict(self.spool.stats) if self.spool is not None else {}
+        while True:
+            await asyncio.sleep(self.stats_interval)
+            now = dict(self.stats)
+            delta = {k: now[k] - last[k] for k in now}
+            last = now
+            if any(delta.values()) or not self.queue.empty():
+                logging.info(
+                    "Alerts: sent=%d (%.1f/s) batches=%d retries=%d failed=%d dropped=%d queued=%d",
+                    delta["sent"],
+                    delta["sent"] / self.stats_interval,
+                    delta["batches"],
+                    delta["retries"],
+                    delta["failed"],
+                    delta["dropped"],
+                    self.queue.qsize(),
+                )
+            if self.spool is not None:
+                now = dict(self.spool.stats)
+                delta = {k: now[k] - last_spool[k] for k in now}
+                last_spool = now
+                if any(delta.values()) or self.spool.pending:
+                    logging.info(
+                        "Alert spool: spooled=%d replayed=%d evicted_bytes=%d pending_bytes=%d",
+                        delta["spooled"],
+                        delta["replayed"],
+                        delta["evicted_bytes"],
+                        self.spool.pending_bytes(),
+                    )
+
+
+def _fsync_and_close(fd: int) -> None:
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
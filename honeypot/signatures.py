@@ -0,0 +1,104 @@
+"""
+Client ident classification: all signatures are compiled into one case-insensitive
+regex, so an ident is scanned once no matter how many signatures are loaded.
+
+A signature is a dict:
+  family      - reported family, e.g. "Paramiko"
+  pattern     - regex searched in the ident; an optional (?P<version>...) group captures the version
+  name        - unique name for hit counting (defaults to family)
+  confidence  - 0..1; when several signatures match, the most confident wins (ties: leftmost)
+  kind        - "client", "library" or "scanner"; drives the response delay
+
+Signatures from SIGNATURES_FILE (a JSON list, or {"signatures": [...]}) come before
+the built-in ones, so at the same position in the ident they take precedence.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import re
+from typing import Dict, List, NamedTuple, Optional
+
+_VERSION = r"[_/ -]?v?(?P<version>[0-9][\w.-]*)?"
+
+BUILTIN_SIGNATURES: List[dict] = [
+    {"family": "OpenSSH", "pattern": r"openssh" + _VERSION, "confidence": 0.6, "kind": "client"},
+    {"family": "Paramiko", "pattern": r"paramiko" + _VERSION, "confidence": 0.8, "kind": "library"},
+    {"family": "libssh2", "pattern": r"libssh2" + _VERSION, "confidence": 0.8, "kind": "library"},
+    {"family": "libssh", "pattern": r"libssh" + _VERSION, "confidence": 0.8, "kind": "library"},
+    {"family": "Go", "pattern": r"(?<![a-z])go(?:lang)?(?![a-z])", "confidence": 0.5, "kind": "library"},
+    {"family": "PuTTY", "pattern": r"putty(?:[_-]release)?" + _VERSION, "confidence": 0.7, "kind": "client"},
+    {"family": "Dropbear", "pattern": r"dropbear" + _VERSION, "confidence": 0.7, "kind": "client"},
+    {"family": "JSCH", "pattern": r"jsch" + _VERSION, "confidence": 0.8, "kind": "library"},
+    {"family": "AsyncSSH", "pattern": r"asyncssh" + _VERSION, "confidence": 0.8, "kind": "library"},
+    {"family": "Nmap", "pattern": r"nmap", "confidence": 0.95, "kind": "scanner"},
+    {"family": "Masscan", "pattern": r"masscan", "confidence": 0.95, "kind": "scanner"},
+]
+
+KINDS = ("client", "library", "scanner")
+
+
+class Signature(NamedTuple):
+    name: str
+    family: str
+    confidence: float
+    kind: str
+
+
+class IdentMatch(NamedTuple):
+    family: str
+    version: str
+    confidence: float
+    kind: str
+    signature: str
+
+
+class IdentClassifier:
+    def __init__(self, signatures: List[dict]):
+        self.signatures: List[Signature] = []
+        parts = []
+        names = set()
+        for i, sig in enumerate(signatures):
+            name = sig.get("name") or sig["family"]
+            if name in names:
+                raise ValueError(f"duplicate signature name {name!r}")
+            kind = sig.get("kind", "client")
+            if kind not in KINDS:
+                raise ValueError(f"signature {name!r}: kind must be one of {', '.join(KINDS)}")
+            pattern = sig["pattern"].replace("(?P<version>", f"(?P<v{i}>")
+            re.compile(pattern)  # report a bad pattern against its own signature
+            parts.append(f"(?P<s{i}>{pattern})")
+            names.add(name)
+            self.signatures.append(Signature(name, sig["family"], float(sig.get("confidence", 0.5)), kind))
+        self._regex = re.compile("|".join(parts) or r"(?!)", re.IGNORECASE)
+        self.hits = [0] * len(self.signatures)
+
+    @classmethod
+    def from_file(cls, path: str = "") -> "IdentClassifier":
+        """Signatures from `path` (if given) followed by the built-in ones."""
+        loaded: List[dict] = []
+        if path:
+            with open(path) as f:
+                data = json.load(f)
+            loaded = data["signatures"] if isinstance(data, dict) else data
+            logging.info("Loaded %d ident signatures from %s", len(loaded), path)
+        seen = {sig.get("name") or sig["family"] for sig in loaded}
+        builtins = [sig for sig in BUILTIN_SIGNATURES if sig["family"] not in seen]
+        return cls(loaded + builtins)
+
+    def classify(self, ident: str) -> Optional[IdentMatch]:
+        best = None
+        best_index = -1
+        for m in self._regex.finditer(ident):
+            index = int(m.lastgroup[1:])
+            if best is None or self.signatures[index].confidence > self.signatures[best_index].confidence:
+                best, best_index = m, index
+        if best is None:
+            return None
+        self.hits[best_index] += 1
+        sig = self.signatures[best_index]
+        version = best.group(f"v{best_index}") if f"v{best_index}" in self._regex.groupindex else None
+        return IdentMatch(sig.family, version or "", sig.confidence, sig.kind, sig.name)
+
+    def hit_counts(self) -> Dict[str, int]:
+        return {sig.name: hits for sig, hits in zip(self.signatures, self.hits) if hits}
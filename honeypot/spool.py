@@ -0,0 +1,194 @@
+"""
+Append-only on-disk alert spool: NDJSON segments in one directory, read back in order.
+
+Segments are named alerts-<seq>.ndjson. The read position (segment, offset) of the
+last delivered alert is kept in a cursor file; segments before it are deleted. When
+the spool grows past its size cap the oldest segments are evicted, unread or not.
+
+Every method does blocking file IO, so the sender calls them on a worker thread.
+fsync is never done here: closed segments and the dirty active one are handed out
+by sync_fds() to be synced and closed elsewhere. pending and pending_bytes() may be
+read from the event loop at any time.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import re
+from typing import Dict, List, Tuple
+
+_SEGMENT_RE = re.compile(r"^alerts-(\d{12})\.ndjson$")
+
+Position = Tuple[int, int]  # (segment seq, byte offset)
+
+
+class AlertSpool:
+    def __init__(
+        self,
+        directory: str,
+        max_bytes: int = 256 << 20,
+        segment_bytes: int = 16 << 20,
+    ):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        # keep several segments under the cap so eviction drops a fraction, not everything
+        self.segment_bytes = max(1, min(segment_bytes, max_bytes // 4))
+        self.stats = {"spooled": 0, "replayed": 0, "evicted_bytes": 0}
+        self._sizes: Dict[int, int] = {}
+        self._cursor: Position = (0, 0)
+        self._active = 0
+        self._file = None
+        self._dirty = False
+        self._unsynced: List[int] = []  # fds of closed segments not fsynced yet
+
+    # setup / teardown
+
+    def open(self) -> None:
+        os.makedirs(self.directory, exist_ok=True)
+        for name in os.listdir(self.directory):
+            match = _SEGMENT_RE.match(name)
+            if match:
+                seq = int(match.group(1))
+                self._sizes[seq] = os.path.getsize(self._path(seq))
+        self._cursor = self._load_cursor()
+        if self._sizes:
+            self._cut_torn_tail(max(self._sizes))
+        # delete what was already delivered; always write into a fresh segment
+        for seq in [s for s in self._sizes if s < self._cursor[0]]:
+            self._delete(seq)
+        self._open_segment(max(self._sizes, default=self._cursor[0]) + 1)
+        if self._cursor[0] not in self._sizes:
+            self._cursor = (min(self._sizes), 0)
+        if self.pending:
+            logging.info("Alert spool %s holds %d bytes to replay", self.directory, self.pending_bytes())
+
+    def close(self) -> None:
+        """Closes the active segment; fsync the fds from sync_fds() afterwards to make it durable."""
+        if self._file is not None:
+            self._file.flush()
+            if self._dirty:
+                self._unsynced.append(os.dup(self._file.fileno()))
+                self._dirty = False
+            self._file.close()
+            self._file = None
+
+    # writing
+
+    def append(self, payloads: List[dict]) -> None:
+        data = b"".join(json.dumps(p, separators=(",", ":")).encode() + b"\n" for p in payloads)
+        self._file.write(data)
+        # flushed at once so reads see whole lines; fsync is batched via sync_fds()
+        self._file.flush()
+        self._sizes[self._active] += len(data)
+        self._dirty = True
+        self.stats["spooled"] += len(payloads)
+        if self._sizes[self._active] >= self.segment_bytes:
+            self._open_segment(self._active + 1)
+        self._enforce_cap()
+
+    def sync_fds(self) -> List[int]:
+        """
+        Duplicate fds of the segments written since the last call (closed ones and the
+        active one) for the caller to fsync and close off the event loop.
+        """
+        fds, self._unsynced = self._unsynced, []
+        if self._dirty and self._file is not None:
+            self._dirty = False
+            fds.append(os.dup(self._file.fileno()))
+        return fds
+
+    # reading
+
+    @property
+    def pending(self) -> bool:
+        return self._cursor != (self._active, self._sizes.get(self._active, 0))
+
+    def pending_bytes(self) -> int:
+        # copied first: the spool thread may add a segment while the event loop reads this
+        cursor = self._cursor
+        return sum(size for seq, size in self._sizes.copy().items() if seq >= cursor[0]) - cursor[1]
+
+    def read(self, limit: int) -> Tuple[List[dict], Position]:
+        """Up to `limit` alerts from the cursor on, and the position after them (pass it to commit)."""
+        items: List[dict] = []
+        seq, offset = self._cursor
+        while len(items) < limit and seq <= self._active:
+            if seq not in self._sizes:
+                seq, offset = seq + 1, 0
+                continue
+            with open(self._path(seq), "rb") as f:
+                f.seek(offset)
+                while len(items) < limit:
+                    line = f.readline()
+                    if not line.endswith(b"\n"):
+                        break  # end of segment (or a torn line from a crash)
+                    offset += len(line)
+                    try:
+                        items.append(json.loads(line))
+                    except ValueError:
+                        continue
+            if len(items) < limit and seq < self._active:
+                seq, offset = seq + 1, 0
+            else:
+                break
+        return items, (seq, offset)
+
+    def commit(self, position: Position, count: int = 0) -> None:
+        """Mark everything before position as delivered."""
+        if position[0] < self._cursor[0]:
+            return  # the segments were evicted while the batch was in flight
+        self._cursor = position
+        self.stats["replayed"] += count
+        for seq in [s for s in self._sizes if s < position[0]]:
+            self._delete(seq)
+        tmp = os.path.join(self.directory, "cursor.tmp")
+        with open(tmp, "w") as f:
+            f.write(f"{position[0]} {position[1]}")
+        os.replace(tmp, os.path.join(self.directory, "cursor"))
+
+    # internals
+
+    def _path(self, seq: int) -> str:
+        return os.path.join(self.directory, f"alerts-{seq:012d}.ndjson")
+
+    def _load_cursor(self) -> Position:
+        try:
+            with open(os.path.join(self.directory, "cursor")) as f:
+                seq, offset = f.read().split()
+                return int(seq), int(offset)
+        except (OSError, ValueError):
+            return (min(self._sizes, default=0), 0)
+
+    def _cut_torn_tail(self, seq: int) -> None:
+        path = self._path(seq)
+        with open(path, "rb") as f:
+            data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            os.truncate(path, end)
+            self._sizes[seq] = end
+
+    def _open_segment(self, seq: int) -> None:
+        self.close()
+        self._active = seq
+        self._sizes[seq] = 0
+        self._file = open(self._path(seq), "ab")
+
+    def _delete(self, seq: int) -> None:
+        self._sizes.pop(seq, None)
+        try:
+            os.remove(self._path(seq))
+        except OSError:
+            pass
+
+    def _enforce_cap(self) -> None:
+        while self.pending_bytes() > self.max_bytes and len(self._sizes) > 1:
+            oldest = min(self._sizes)
+            dropped = self._sizes[oldest] - (self._cursor[1] if self._cursor[0] == oldest else 0)
+            self._delete(oldest)
+            if self._cursor[0] <= oldest:
+                self._cursor = (min(self._sizes), 0)
+            self.stats["evicted_bytes"] += dropped
+            logging.warning("Alert spool over %d bytes; evicted %d unsent bytes from segment %d",
+                            self.max_bytes, dropped, oldest)
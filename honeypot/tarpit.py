@@ -0,0 +1,179 @@
+"""
+Tarpit: holds connections open with no coroutine per connection.
+
+A held connection is just its transport, a tiny protocol object that discards what
+the client sends, and an entry on a hashed timer wheel. One wheel callback per tick
+serves every entry that is due in that tick: it either writes the next drip line
+(TARPIT_MODE=drip, e.g. endless SSH pre-banner lines) or, once the hold time is up,
+writes the final reply and closes. Tens of thousands of held sockets cost one timer
+and a few hundred bytes each.
+"""
+from __future__ import annotations
+
+import asyncio
+import math
+import time
+from typing import Callable, List, Optional
+
+# client bytes we read (and discard) before pausing reading; the kernel buffers the rest
+_READ_BUDGET = 64 * 1024
+
+
+class Held:
+    __slots__ = ("writer", "transport", "deadline", "drip", "interval", "final", "on_close",
+                 "started", "bytes_sent", "bytes_received", "due_tick", "closed")
+
+    def __init__(self, writer, deadline, drip, interval, final, on_close):
+        # the writer stays referenced: a collected StreamWriter closes its transport
+        self.writer = writer
+        self.transport = writer.transport
+        self.deadline = deadline
+        self.drip = drip
+        self.interval = interval
+        self.final = final
+        self.on_close = on_close
+        self.started = time.monotonic()
+        self.bytes_sent = 0
+        self.bytes_received = 0
+        self.due_tick = 0
+        self.closed = False
+
+    @property
+    def held_seconds(self) -> float:
+        return time.monotonic() - self.started
+
+
+class _HeldProtocol(asyncio.Protocol):
+    __slots__ = ("tarpit", "entry")
+
+    def __init__(self, tarpit: "Tarpit", entry: Held):
+        self.tarpit = tarpit
+        self.entry = entry
+
+    def data_received(self, data: bytes) -> None:
+        self.entry.bytes_received += len(data)
+        if self.entry.bytes_received >= _READ_BUDGET:
+            self.entry.transport.pause_reading()
+
+    def eof_received(self):
+        return False  # close our side too
+
+    def connection_lost(self, exc) -> None:
+        self.tarpit._finish(self.entry)
+
+
+class Tarpit:
+    def __init__(self, tick: float = 0.1, wheel_size: int = 1024, write_limit: int = 4096):
+        """
+        tick - wheel resolution in seconds (hold times are rounded up to it)
+        wheel_size - slots; entries further out than wheel_size * tick wait extra rounds
+        write_limit - a client with this much unsent data is skipped for that drip
+        """
+        self.tick = tick
+        self.wheel_size = wheel_size
+        self.write_limit = write_limit
+        self._slots: List[List[Held]] = [[] for _ in range(wheel_size)]
+        self._tick_no = 0
+        self._origin = 0.0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self.held = 0
+        self.stats = {"held": 0, "released": 0, "bytes_sent": 0}
+
+    def hold(
+        self,
+        writer: asyncio.StreamWriter,
+        seconds: float,
+        drip: Optional[Callable[[], bytes]] = None,
+        interval: float = 10.0,
+        prelude: bytes = b"",
+        final: bytes = b"",
+        on_close: Optional[Callable[[Held], None]] = None,
+    ) -> Held:
+        """
+        Takes over the connection behind writer (the caller must not use it again).
+        Writes prelude now, then drip() every interval seconds if drip is given, and after
+        `seconds` writes final and closes. on_close runs once the connection is gone,
+        whether we closed it or the client did.
+        """
+        loop = asyncio.get_running_loop()
+        entry = Held(writer, time.monotonic() + seconds, drip, interval, final, on_close)
+        transport = entry.transport
+        transport.set_protocol(_HeldProtocol(self, entry))
+        self.held += 1
+        self.stats["held"] += 1
+        if transport.is_closing():
+            self._finish(entry)
+            return entry
+        if prelude:
+            self._write(entry, prelude)
+        if self._timer is None:
+            # the wheel only runs while it holds something
+            self._origin = loop.time() - self._tick_no * self.tick
+            self._timer = loop.call_at(self._origin + (self._tick_no + 1) * self.tick, self._advance)
+        self._schedule(entry, min(interval, seconds) if drip is not None else seconds)
+        return entry
+
+    def close(self) -> None:
+        """Closes every held connection (shutdown)."""
+        for slot in self._slots:
+            for entry in slot:
+                if not entry.closed:
+                    entry.transport.abort()
+            slot.clear()
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def _schedule(self, entry: Held, delay: float) -> None:
+        entry.due_tick = self._tick_no + max(1, math.ceil(delay / self.tick))
+        self._slots[entry.due_tick % self.wheel_size].append(entry)
+
+    def _write(self, entry: Held, data: bytes) -> None:
+        entry.transport.write(data)
+        entry.bytes_sent += len(data)
+        self.stats["bytes_sent"] += len(data)
+
+    def _advance(self) -> None:
+        loop = asyncio.get_running_loop()
+        # catch up on ticks missed while the loop was busy
+        now_tick = int((loop.time() - self._origin) / self.tick)
+        while self._tick_no < now_tick:
+            self._tick_no += 1
+            self._fire(self._tick_no)
+        if self.held:
+            self._timer = loop.call_at(self._origin + (self._tick_no + 1) * self.tick, self._advance)
+        else:
+            self._timer = None
+
+    def _fire(self, tick_no: int) -> None:
+        index = tick_no % self.wheel_size
+        slot = self._slots[index]
+        if not slot:
+            return
+        # entries rescheduled below may land in this same slot again
+        self._slots[index] = later = []
+        now = time.monotonic()
+        for entry in slot:
+            if entry.closed or entry.transport.is_closing():
+                continue
+            if entry.due_tick > tick_no:
+                later.append(entry)  # due in a later round of the wheel
+                continue
+            if now >= entry.deadline - self.tick / 2:
+                if entry.final:
+                    self._write(entry, entry.final)
+                entry.transport.close()
+                continue
+            if entry.drip is not None and entry.transport.get_write_buffer_size() < self.write_limit:
+                self._write(entry, entry.drip())
+            self._schedule(entry, min(entry.interval, entry.deadline - now))
+
+    def _finish(self, entry: Held) -> None:
+        if entry.closed:
+            return
+        entry.closed = True
+        entry.writer = None
+        self.held -= 1
+        self.stats["released"] += 1
+        if entry.on_close is not None:
+            entry.on_close(entry)